@@ -124,6 +124,7 @@ def api():
 
 
 def init_settings(settings):
+    import os
     from collections import defaultdict
 
     ######################################################################
@@ -149,6 +150,12 @@ def init_settings(settings):
     settings.CONNECTION_SCREEN_MODULE = "athanor.connection_screens"
     settings.CMD_IGNORE_PREFIXES = ""
 
+    # Matches input against a prefix trie cached on each merged cmdset.
+    settings.COMMAND_PARSER = "athanor.utils.cmdparser.cmdparser"
+
+    # Produces the "Maybe you meant" suggestions for input that matched no command.
+    settings.COMMAND_SUGGESTIONS = "athanor.utils.cmdparser.suggestions"
+
     # The Styler is an object that generates commonly-used formatting, like
     # headers and tables.
     settings.STYLER_CLASS = "athanor.utils.styling.Styler"
@@ -164,6 +171,43 @@ def init_settings(settings):
     # different entities.
     settings.CMDSETS = defaultdict(list)
 
+    # Merged cmdsets are cached per combination of CmdSetHandler stacks. This is
+    # the maximum number of merges kept before the least recently used are evicted.
+    settings.CMDSET_MERGE_CACHE_SIZE = 1000
+
+    # Per-stage command timings are recorded into histograms, viewable with @cmdstats.
+    # Commands slower than SLOW_COMMAND_THRESHOLD seconds are logged with their input
+    # and stage breakdown. Set the threshold to 0 to disable the log.
+    settings.COMMAND_TIMING_ENABLED = True
+    settings.SLOW_COMMAND_THRESHOLD = 0.25
+
+    # Fraction of commands (0 to 1) traced span by span, viewable with @cmdtrace. The last
+    # COMMAND_TRACE_BUFFER traces are kept in memory. If COMMAND_TRACE_FILE is a path,
+    # traces are also appended to it as JSON lines.
+    settings.COMMAND_TRACE_RATE = 0.0
+    settings.COMMAND_TRACE_BUFFER = 1000
+    settings.COMMAND_TRACE_FILE = None
+
+    # Client input is queued per Session and executed round-robin, at most INPUT_TICK_BUDGET
+    # lines per reactor tick. INPUT_QUEUE_POLICY decides what happens to input beyond
+    # INPUT_QUEUE_DEPTH: 'drop' discards it, 'slow' keeps it and asks the client to slow down.
+    settings.INPUT_QUEUE_DEPTH = 50
+    settings.INPUT_TICK_BUDGET = 20
+    settings.INPUT_QUEUE_POLICY = 'drop'
+
+    # If set, a line of input containing this string is split into several commands,
+    # executed in order as a batch. For example ' || '. None disables splitting.
+    settings.INPUT_COMMAND_SEPARATOR = None
+
+    # How many threads the blocking calls of AthanorCommands may use between them.
+    settings.COMMAND_THREAD_POOL_SIZE = 4
+
+    # Channel broadcasts, TemplateMessages and system messages are buffered per recipient
+    # and sent as one msg() at the end of each reactor tick, or once OUTPUT_COALESCE_MAX
+    # characters are waiting.
+    settings.OUTPUT_COALESCE = True
+    settings.OUTPUT_COALESCE_MAX = 4096
+
     # Taking control of initial setup. No more screwy godcharacter nonsense.
     settings.INITIAL_SETUP_MODULE = "athanor.initial_setup"
 
@@ -200,8 +244,18 @@ def init_settings(settings):
 
     settings.CONTROLLER_MANAGER_CLASS = "athanor.utils.controllers.ControllerManager"
     settings.BASE_CONTROLLER_CLASS = "athanor.utils.controllers.AthanorController"
+    settings.BASE_CONTROLLER_BACKEND_CLASS = "athanor.utils.controllers.AthanorControllerBackend"
     settings.CONTROLLERS = dict()
 
+    # Controllers marked load_in_thread may load in up to this many worker threads while
+    # the rest load on the main thread. 1 loads everything on the main thread.
+    settings.CONTROLLER_LOAD_THREADS = 1
+
+    # Records call counts, latency, errors and ORM queries for every public controller
+    # method, viewable with @ctrlstats. True instruments all controllers, a list of
+    # controller keys only those. @ctrlstats/on and /off change it at runtime.
+    settings.CONTROLLER_INSTRUMENTATION = False
+
 
     ######################################################################
     # Grid/Map/Rooms Options
@@ -247,7 +301,10 @@ def init_settings(settings):
     # Account Options
     ######################################################################
     settings.BASE_ACCOUNT_TYPECLASS = "athanor.accounts.typeclasses.AthanorAccount"
-    settings.CONTROLLERS['account'] = 'athanor.accounts.controller.AthanorAccountController'
+    settings.CONTROLLERS['account'] = {
+        'class': 'athanor.accounts.controller.AthanorAccountController',
+        'backend': 'athanor.accounts.controller.AthanorAccountControllerBackend'
+    }
 
     # Command set for accounts with or without a character (ooc)
     settings.CMDSET_ACCOUNT = "athanor.accounts.cmdsets.AccountCmdSet"
@@ -265,6 +322,13 @@ def init_settings(settings):
     settings.RESTRICTED_ACCOUNT_EMAIL = False
     settings.RESTRICTED_ACCOUNT_PASSWORD = False
 
+    # The Account controller builds its caches by streaming Accounts and permission tags
+    # from the database this many rows at a time.
+    settings.ACCOUNT_CACHE_CHUNK_SIZE = 2000
+
+    # How many Accounts @account/list shows per page.
+    settings.ACCOUNT_LIST_PAGE_SIZE = 50
+
     settings.EXAMINE_HOOKS['account'] = ['account', 'access', 'commands', 'tags', 'attributes', 'puppets']
 
     ######################################################################
@@ -297,6 +361,16 @@ def init_settings(settings):
     settings.BASE_PLAY_SESSION_TYPECLASS = "athanor.playsessions.playsessions.DefaultPlaySession"
     settings.CMDSET_PLAYSESSION = "athanor.playsessions.cmdsets.AthanorPlaySessionCmdSet"
 
+    ######################################################################
+    # Channels
+    ######################################################################
+    # Every Channel keeps its last CHANNEL_HISTORY_BUFFER messages in memory and all of
+    # them in CHANNEL_HISTORY_DIR/<channel id>, in segment files of
+    # CHANNEL_HISTORY_SEGMENT_LINES lines each.
+    settings.CHANNEL_HISTORY_DIR = os.path.join(settings.LOG_DIR, 'channels')
+    settings.CHANNEL_HISTORY_BUFFER = 200
+    settings.CHANNEL_HISTORY_SEGMENT_LINES = 10000
+
     ######################################################################
     # Permissions
     ######################################################################
@@ -0,0 +1,112 @@
+"""
+Expiry of Account bans.
+
+Bans are stored as the 'ban' Attribute (category 'system') on each Account. The Account
+controller's backend loads every one of them in a single query at startup and keeps
+them in a BanScheduler, which answers BanHandler.get_state() from memory and expires
+bans when they run out, instead of waiting for the banned Account to try logging in.
+
+The scheduler keeps a min-heap of (until, account id) and a single reactor timer for
+the earliest entry. Entries made stale by an unban or a new ban are skipped when they
+reach the top of the heap rather than searched for and removed.
+"""
+import heapq
+
+from twisted.internet import reactor
+from twisted.python.threadable import isInIOThread
+
+from evennia.utils import logger
+
+from athanor.utils.time import utcnow
+
+
+class BanScheduler:
+    """
+    Args:
+        on_expire (callable): Called with (account id, ban state) when a ban runs out.
+    """
+
+    def __init__(self, on_expire):
+        self.on_expire = on_expire
+        self.bans = dict()
+        self.heap = list()
+        self.timer = None
+
+    def load(self, bans):
+        """
+        Replace everything with the given bans.
+
+        Args:
+            bans (iterable): (account id, ban state) pairs. Those already expired are
+                expired on the next reactor tick.
+        """
+        self.bans = {account_id: state for account_id, state in bans if state and state.get('until', None)}
+        self.heap = [(state['until'], account_id) for account_id, state in self.bans.items()]
+        heapq.heapify(self.heap)
+        self.reschedule()
+
+    def get(self, account_id):
+        return self.bans.get(account_id, None)
+
+    def active(self):
+        """
+        Returns:
+            account_ids (set): Accounts whose ban hasn't run out yet.
+        """
+        now = utcnow()
+        return {account_id for account_id, state in self.bans.items() if state['until'] > now}
+
+    def set(self, account_id, state):
+        self.set_many({account_id: state})
+
+    def set_many(self, states):
+        """
+        Args:
+            states (dict): Account ids to their new ban states.
+        """
+        for account_id, state in states.items():
+            self.bans[account_id] = state
+            heapq.heappush(self.heap, (state['until'], account_id))
+        self.reschedule()
+
+    def clear(self, account_id):
+        self.clear_many((account_id,))
+
+    def clear_many(self, account_ids):
+        removed = [account_id for account_id in account_ids if self.bans.pop(account_id, None) is not None]
+        if removed:
+            self.reschedule()
+
+    def reschedule(self):
+        # bans can be set from command threads, but the reactor's timers aren't thread-safe.
+        if not isInIOThread():
+            reactor.callFromThread(self.reschedule)
+            return
+        self._prune()
+        if self.timer and self.timer.active():
+            self.timer.cancel()
+        self.timer = None
+        if self.heap:
+            delay = (self.heap[0][0] - utcnow()).total_seconds()
+            self.timer = reactor.callLater(max(0.0, delay), self.expire)
+
+    def _prune(self):
+        while self.heap:
+            until, account_id = self.heap[0]
+            if (state := self.bans.get(account_id, None)) is not None and state['until'] == until:
+                return
+            heapq.heappop(self.heap)
+
+    def expire(self):
+        self.timer = None
+        now = utcnow()
+        while self.heap and self.heap[0][0] <= now:
+            until, account_id = heapq.heappop(self.heap)
+            if (state := self.bans.get(account_id, None)) is None or state['until'] != until:
+                continue
+            del self.bans[account_id]
+            try:
+                self.on_expire(account_id, state)
+            except Exception:
+                logger.log_trace(f"Could not expire the ban on Account #{account_id}")
+        self.reschedule()
@@ -3,6 +3,7 @@ from evennia.commands.cmdset import CmdSet
 from evennia.commands.default import help, comms, admin, system
 from evennia.commands.default import building, account, general
 from athanor.accounts import commands as athcmds
+from athanor.diagnostics import commands as diagcmds
 
 
 class AccountCmdSet(CmdSet):
@@ -31,6 +32,16 @@ class AccountCmdSet(CmdSet):
         self.add(system.CmdShutdown)
         self.add(system.CmdPy)
 
+        # administration
+        self.add(athcmds.CmdAccount)
+        self.add(athcmds.CmdAccountBulk)
+        self.add(athcmds.CmdAccess)
+
         self.add(athcmds.CmdAddAcl)
         self.add(athcmds.CmdGetAcl)
         self.add(athcmds.CmdRemAcl)
+
+        # diagnostics
+        self.add(diagcmds.CmdCommandStats)
+        self.add(diagcmds.CmdCommandTrace)
+        self.add(diagcmds.CmdControllerStats)
@@ -2,6 +2,7 @@ from evennia.contrib.unixcommand import UnixCommand
 
 import athanor
 from athanor.utils.command import AthanorCommand
+from athanor.utils.time import duration_from_string, utcnow
 
 
 class AdministrationCommand(AthanorCommand):
@@ -20,8 +21,17 @@ class CmdAccount(AdministrationCommand):
             Display a breakdown of information all about an Account.
             Your own, if not targeted.
 
-        @account/list
-            Show all accounts in the system.
+        @account/list [<filter>,<filter>...]
+            Show accounts in the system, a page at a time. Filters are:
+                perm=<permission>   Holders of a Permission.
+                disabled, enabled   Accounts that are/aren't disabled.
+                banned, unbanned    Accounts that are/aren't banned.
+                after=<duration>    Logged in within <duration>, such as 2w.
+                before=<duration>   Not logged in within <duration>.
+
+        @account/page [<page>]
+            Show another page of the last @account/list. The next one, if
+            no page is given.
 
         @account/create <username>,<email>,<password>
             Create a new account.
@@ -52,9 +62,12 @@ class CmdAccount(AdministrationCommand):
     """
     key = '@account'
     locks = "cmd:pperm(Helper)"
-    switch_options = ('list', 'create', 'disable', 'enable', 'rename', 'ban', 'unban', 'password', 'email', 'boot')
+    switch_options = ('list', 'page', 'create', 'disable', 'enable', 'rename', 'ban', 'unban', 'password', 'email',
+                      'boot')
     args_delim = ','
     switch_syntax = {
+        'list': "[<filter>,<filter>...]",
+        'page': "[<page>]",
         'create': "<username>,<email>,<password>",
         'disable': '<account>=<reason>',
         'enable': '<account>',
@@ -73,8 +86,44 @@ class CmdAccount(AdministrationCommand):
             self.args = self.account
         self.msg(self.controller.examine_account(self.session, self.args))
 
+    def list_filters(self):
+        filters = dict()
+        for arg in self.argslist:
+            name, _, value = (part.strip() for part in arg.partition('='))
+            name = name.lower()
+            if name in ('disabled', 'enabled'):
+                filters['disabled'] = name == 'disabled'
+            elif name in ('banned', 'unbanned'):
+                filters['banned'] = name == 'banned'
+            elif name == 'perm' and value:
+                filters['permission'] = value
+            elif name in ('after', 'before') and value:
+                if not (duration := duration_from_string(value)):
+                    raise ValueError(f"Could not understand the duration '{value}'.")
+                filters[f"login_{name}"] = utcnow() - duration
+            else:
+                self.syntax_error()
+        return filters
+
+    def show_listing(self, filters, page):
+        for chunk in self.controller.list_accounts(self.session, page=page, **filters):
+            self.msg(chunk)
+        self.session.ndb.account_listing = (filters, page)
+
     def switch_list(self):
-        self.msg(self.controller.list_accounts(self.session))
+        self.show_listing(self.list_filters(), 1)
+
+    def switch_page(self):
+        if not (listing := self.session.ndb.account_listing):
+            raise ValueError("Use @account/list first.")
+        filters, page = listing
+        if not self.args:
+            page += 1
+        elif not self.args.isdigit():
+            self.syntax_error()
+        else:
+            page = int(self.args)
+        self.show_listing(filters, page)
 
     def switch_create(self):
         if not len(self.argslist) == 3:
@@ -98,6 +147,94 @@ class CmdAccount(AdministrationCommand):
         self.controller.disconnect_account(self.session, self.lhs, self.rhs)
 
 
+class CmdAccountBulk(AdministrationCommand):
+    """
+    Manage many Accounts at once, such as when cleaning up after a raid. Each
+    switch makes all of its changes together and sends staff a single summary.
+
+    <selector> is a comma-separated list of any of:
+        <name>              An Account, by username, email or #dbref.
+        <pattern>           Usernames matching a pattern with * or ?.
+        ip:<pattern>        Accounts connected from a matching address.
+        after:<duration>    Accounts created within <duration>, such as 2d.
+        before:<duration>   Accounts created longer ago than <duration>.
+    Every term given must match. Several names or patterns match any of them.
+
+    Usage:
+        @accounts <selector>
+            Show which Accounts a selector picks, without changing anything.
+
+        @accounts/disable <selector>=<reason>
+        @accounts/enable <selector>
+
+        @accounts/ban <selector>=<duration>,<reason>
+        @accounts/unban <selector>
+
+        @accounts/grant <selector>=<permission>
+        @accounts/revoke <selector>=<permission>
+    """
+    key = '@accounts'
+    locks = "cmd:pperm(Helper)"
+    switch_options = ('disable', 'enable', 'ban', 'unban', 'grant', 'revoke')
+    switch_syntax = {
+        'main': '<selector>',
+        'disable': '<selector>=<reason>',
+        'enable': '<selector>',
+        'ban': '<selector>=<duration>,<reason>',
+        'unban': '<selector>',
+        'grant': '<selector>=<permission>',
+        'revoke': '<selector>=<permission>'
+    }
+
+    def selector(self):
+        if not self.lhslist:
+            self.syntax_error()
+        names, patterns, selector = list(), list(), dict()
+        for term in self.lhslist:
+            kind, _, value = term.partition(':')
+            kind = kind.strip().lower()
+            if kind == 'ip' and value:
+                selector['ip'] = value.strip()
+            elif kind in ('after', 'before') and value:
+                if not (duration := duration_from_string(value.strip())):
+                    raise ValueError(f"Could not understand the duration '{value.strip()}'.")
+                selector[f"created_{kind}"] = utcnow() - duration
+            elif '*' in term or '?' in term:
+                patterns.append(term)
+            else:
+                names.append(term)
+        if names:
+            selector['names'] = names
+        if patterns:
+            selector['patterns'] = patterns
+        return selector
+
+    def switch_main(self):
+        accounts = self.controller.select_accounts(**self.selector())
+        self.msg(f"Selects {len(accounts)} Accounts: {', '.join(str(acc) for acc in accounts)}")
+
+    def switch_disable(self):
+        self.controller.bulk_disable(self.session, self.selector(), self.rhs)
+
+    def switch_enable(self):
+        self.controller.bulk_enable(self.session, self.selector())
+
+    def switch_ban(self):
+        if len(self.rhslist) != 2:
+            self.syntax_error()
+        duration, reason = self.rhslist
+        self.controller.bulk_ban(self.session, self.selector(), duration, reason)
+
+    def switch_unban(self):
+        self.controller.bulk_unban(self.session, self.selector())
+
+    def switch_grant(self):
+        self.controller.bulk_grant(self.session, self.selector(), self.rhs)
+
+    def switch_revoke(self):
+        self.controller.bulk_revoke(self.session, self.selector(), self.rhs)
+
+
 class CmdAccess(AdministrationCommand):
     """
     Displays and manages information about Account access permissions.
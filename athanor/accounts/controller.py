@@ -1,24 +1,44 @@
-import re
+from bisect import bisect_left, insort
 from collections import defaultdict
+from fnmatch import fnmatchcase
 
+from django.apps import apps
 from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Prefetch
+from django.db.models.signals import class_prepared, m2m_changed, post_delete, post_save
 
+from evennia.accounts.models import AccountDB
+from evennia.typeclasses.attributes import Attribute
+from evennia.typeclasses.tags import Tag
+
+from evennia.utils.dbserialize import to_pickle
 from evennia.utils.utils import make_iter, time_format
 from evennia.utils.search import search_account
 
 from athanor.utils.controllers import AthanorController, AthanorControllerBackend
+from athanor.utils.namematcher import NameMatcher
+from athanor.utils.online import sessions as online_sessions
 from athanor.accounts.typeclasses import AthanorAccount
 from athanor.accounts import messages as amsg
+from athanor.accounts.bans import BanScheduler
+from athanor.accounts.handlers import BanHandler
 from athanor.utils.text import partial_match, iter_to_string
 from athanor.utils.time import utcnow, duration_from_string
 
 
 class AthanorAccountController(AthanorController):
     system_name = 'ACCOUNTS'
+    # list_accounts sends its page this many Accounts at a time.
+    list_chunk_size = 10
+
+    @property
+    def reg_names(self):
+        return self.backend.reg_names
 
-    def __init__(self, key, manager, backend):
-        super().__init__(key, manager, backend)
-        self.load()
+    @property
+    def name_map(self):
+        return self.backend.name_map
 
     def create_account(self, session, username, email, password, typeclass=None, login_screen=False):
         enactor = None
@@ -91,8 +111,7 @@ class AthanorAccountController(AthanorController):
         ban_date = utcnow() + duration
         if not reason:
             raise ValueError("Must include a reason!")
-        account.db._banned = ban_date
-        account.db._ban_reason = reason
+        account.ban.set(enactor, ban_date, reason)
         entities = {'enactor': enactor, 'account': account}
         amsg.BanMessage(entities, duration=time_format(duration.total_seconds(), style=2),
                         ban_date=ban_date.strftime('%c'), reason=reason).send()
@@ -102,10 +121,9 @@ class AthanorAccountController(AthanorController):
         if not (enactor := session.get_account()) or not enactor.check_lock("pperm(Moderator)"):
             raise ValueError("Permission denied.")
         account = self.find_account(account)
-        if not ((banned := account.db._banned) and banned > utcnow()):
+        if not account.ban.get_state():
             raise ValueError("Account is not banned!")
-        del account.db._banned
-        del account.db._ban_reason
+        account.ban.clear()
         entities = {'enactor': enactor, 'account': account}
         amsg.UnBanMessage(entities).send()
 
@@ -135,6 +153,92 @@ class AthanorAccountController(AthanorController):
         amsg.ForceDisconnect(entities, reason=reason).send()
         account.force_disconnect(reason=reason)
 
+    def select_accounts(self, names=None, patterns=None, ip=None, created_after=None, created_before=None):
+        return self.backend.select_accounts(names=names, patterns=patterns, ip=ip, created_after=created_after,
+                                            created_before=created_before)
+
+    def _bulk_targets(self, session, lock, selector, keep=None):
+        """
+        Common start of the bulk_* methods.
+
+        Args:
+            session (ServerSession): The session asking.
+            lock (str): Lock the enactor must pass.
+            selector (dict): Keyword arguments for select_accounts.
+            keep (callable, optional): Only Accounts for which this returns True are kept.
+
+        Returns:
+            enactor, accounts (tuple)
+        """
+        if not (enactor := session.get_account()) or not enactor.check_lock(lock):
+            raise ValueError("Permission denied.")
+        accounts = self.select_accounts(**selector)
+        if keep:
+            accounts = [acc for acc in accounts if keep(acc)]
+        if not accounts:
+            raise ValueError("No Accounts to affect!")
+        return enactor, accounts
+
+    def _bulk_report(self, enactor, action, accounts, detail=''):
+        amsg.BulkMessage({'enactor': enactor}, action=action, count=len(accounts), detail=detail,
+                         accounts=iter_to_string(accounts)).send()
+
+    def bulk_disable(self, session, selector, reason):
+        """
+        Disable every selected Account that isn't already, in one transaction.
+        The bulk_* methods all take a selector dict of select_accounts arguments and
+        send a single summary to staff.
+        """
+        if not reason:
+            raise ValueError("Must include a reason!")
+        enactor, accounts = self._bulk_targets(session, "pperm(Admin)", selector,
+                                               keep=lambda acc: not acc.db._disabled)
+        self.backend.bulk_set_attribute(accounts, '_disabled', None, reason)
+        self._bulk_report(enactor, "disabled", accounts, detail=f" for: {reason}")
+        for acc in accounts:
+            acc.force_disconnect(reason)
+
+    def bulk_enable(self, session, selector):
+        enactor, accounts = self._bulk_targets(session, "pperm(Admin)", selector,
+                                               keep=lambda acc: acc.db._disabled)
+        self.backend.bulk_remove_attribute(accounts, '_disabled', None)
+        self._bulk_report(enactor, "enabled", accounts)
+
+    def bulk_ban(self, session, selector, duration, reason):
+        if not reason:
+            raise ValueError("Must include a reason!")
+        duration = duration_from_string(duration)
+        enactor, accounts = self._bulk_targets(session, "pperm(Moderator)", selector)
+        self.backend.bulk_ban(accounts, enactor, utcnow() + duration, reason)
+        self._bulk_report(enactor, "banned", accounts,
+                          detail=f" for {time_format(duration.total_seconds(), style=2)} due to: {reason}")
+        for acc in accounts:
+            acc.force_disconnect(reason)
+
+    def bulk_unban(self, session, selector):
+        enactor, accounts = self._bulk_targets(session, "pperm(Moderator)", selector,
+                                               keep=lambda acc: acc.ban.get_state())
+        self.backend.bulk_unban(accounts)
+        self._bulk_report(enactor, "un-banned", accounts)
+
+    def bulk_grant(self, session, selector, perm):
+        perm = self.find_permission(perm)
+        holders = self.backend.permissions.get(perm.lower(), set())
+        enactor, accounts = self._bulk_targets(session, "pperm(Helper)", selector,
+                                               keep=lambda acc: acc not in holders)
+        self.check_permission_lock(enactor, perm)
+        self.backend.bulk_permission(accounts, perm, grant=True)
+        self._bulk_report(enactor, "granted", accounts, detail=f" the Permission |w{perm}|n")
+
+    def bulk_revoke(self, session, selector, perm):
+        perm = self.find_permission(perm)
+        holders = self.backend.permissions.get(perm.lower(), set())
+        enactor, accounts = self._bulk_targets(session, "pperm(Helper)", selector,
+                                               keep=lambda acc: acc in holders)
+        self.check_permission_lock(enactor, perm)
+        self.backend.bulk_permission(accounts, perm, grant=False)
+        self._bulk_report(enactor, "revoked", accounts, detail=f"' use of the Permission |w{perm}|n")
+
     def find_permission(self, perm):
         if not perm:
             raise ValueError("No permission entered!")
@@ -142,11 +246,7 @@ class AthanorAccountController(AthanorController):
             raise ValueError("Permission not found!")
         return found
 
-    def grant_permission(self, session, account, perm):
-        if not (enactor := session.get_account()):
-            raise ValueError("Permission denied.")
-        account = self.find_account(account)
-        perm = self.find_permission(perm)
+    def check_permission_lock(self, enactor, perm):
         perm_data = settings.PERMISSIONS.get(perm, dict())
         perm_lock = perm_data.get("permission", None)
         if not perm_lock:
@@ -159,10 +259,17 @@ class AthanorAccountController(AthanorController):
                     break
             if not passed:
                 raise ValueError(f"Permission denied. Requires {perm_lock} or better.")
+
+    def grant_permission(self, session, account, perm):
+        if not (enactor := session.get_account()):
+            raise ValueError("Permission denied.")
+        account = self.find_account(account)
+        perm = self.find_permission(perm)
+        self.check_permission_lock(enactor, perm)
         if perm.lower() in account.permissions.all():
             raise ValueError(f"{account} already has that Permission!")
+        # the backend's signal handlers update its permissions directory.
         account.permissions.add(perm)
-        self.permissions[perm.lower()].add(account)
         entities = {'enactor': enactor, 'account': account}
         amsg.GrantMessage(entities, perm=perm).send()
 
@@ -171,22 +278,10 @@ class AthanorAccountController(AthanorController):
             raise ValueError("Permission denied.")
         account = self.find_account(account)
         perm = self.find_permission(perm)
-        perm_data = settings.PERMISSIONS.get(perm, dict())
-        perm_lock = perm_data.get("permission", None)
-        if not perm_lock:
-            if not enactor.is_superuser:
-                raise ValueError("Permission denied. Only a Superuser can grant this.")
-        if perm_lock:
-            passed = False
-            for lock in make_iter(perm_lock):
-                if (passed := enactor.check_lock(f"pperm({lock})")):
-                    break
-            if not passed:
-                raise ValueError(f"Permission denied. Requires {perm_lock} or better.")
+        self.check_permission_lock(enactor, perm)
         if perm.lower() not in account.permissions.all():
             raise ValueError(f"{account} does not have that Permission!")
         account.permissions.remove(perm)
-        self.permissions[perm.lower()].remove(account)
         entities = {'enactor': enactor, 'account': account}
         amsg.RevokeMessage(entities, perm=perm).send()
 
@@ -203,10 +298,6 @@ class AthanorAccountController(AthanorController):
             amsg.GrantSuperMessage(entities).send()
         account.is_superuser = reverse
         account.save(update_fields=['is_superuser'])
-        if reverse:
-            self.permissions["_super"].add(account)
-        else:
-            self.permissions["_super"].remove(account)
         return reverse
 
     def access_account(self, session, account):
@@ -226,7 +317,7 @@ class AthanorAccountController(AthanorController):
             raise ValueError("Permission denied.")
         # Create a COPY of the permissions since we're going to mutilate it a lot...
 
-        perms = dict(self.permissions)
+        perms = {perm: set(holders) for perm, holders in self.backend.permissions.items()}
         message = list()
         styling = enactor.styler
         message.append(styling.styled_header("Permissions Hierarchy"))
@@ -257,19 +348,55 @@ class AthanorAccountController(AthanorController):
         message.append(styling.blank_footer)
         return '\n'.join(str(l) for l in message)
 
-    def list_accounts(self, session):
+    def list_accounts(self, session, page=1, permission=None, disabled=None, banned=None, login_after=None,
+                      login_before=None):
+        """
+        Render one page of the Account listing. Only the requested page is loaded, and
+        its permissions and characters are fetched in bulk.
+
+        Args:
+            session (ServerSession): The session asking.
+            page (int): Which page to show, starting at 1.
+            permission (str): Only list holders of this Permission.
+            disabled (bool): If set, only list Accounts that are (True) or aren't (False) disabled.
+            banned (bool): If set, only list Accounts that are (True) or aren't (False) banned.
+            login_after (datetime): Only list Accounts that last logged in after this.
+            login_before (datetime): Only list Accounts that last logged in before this.
+
+        Returns:
+            chunks (generator): Yields the page as strings of at most list_chunk_size
+                Accounts each, to be sent one at a time.
+        """
         if not (enactor := session.get_account()) or not enactor.check_lock("pperm(Admin)"):
             raise ValueError("Permission denied.")
-        if not (accounts := AthanorAccount.objects.filter_family()):
+        if permission:
+            permission = self.find_permission(permission)
+        accounts = self.backend.account_listing(permission=permission, disabled=disabled, banned=banned,
+                                                login_after=login_after, login_before=login_before)
+        if not (total := accounts.count()):
             raise ValueError("No accounts to list!")
+        page_size = settings.ACCOUNT_LIST_PAGE_SIZE
+        pages = (total + page_size - 1) // page_size
+        if not 1 <= page <= pages:
+            raise ValueError(f"There are only {pages} pages!")
+        start = (page - 1) * page_size
+        return self._render_listing(enactor, self.backend.prefetch_listing(accounts[start:start + page_size]),
+                                    page, pages, total)
+
+    def _render_listing(self, enactor, accounts, page, pages, total):
         styling = enactor.styler
-        message = [
-            styling.styled_header(f"Account Listing")
-        ]
-        for acc in accounts:
-            message.extend(acc.render_list_section(enactor, styling))
-        message.append(styling.blank_footer)
-        return '\n'.join(str(l) for l in message)
+        message = [styling.styled_header(f"Account Listing - Page {page}/{pages} ({total} Accounts)")]
+        for count, acc in enumerate(accounts, start=1):
+            message.extend(acc.render_list_section(enactor, styling, permissions=acc.listed_permissions,
+                                                   characters=acc.listed_characters))
+            if not count % self.list_chunk_size:
+                yield '\n'.join(str(l) for l in message)
+                message = list()
+        if page < pages:
+            message.append(styling.styled_footer(f"Use @account/page for page {page + 1}"))
+        else:
+            message.append(styling.blank_footer)
+        yield '\n'.join(str(l) for l in message)
 
     def examine_account(self, session, account):
         if not (enactor := session.get_account()) or not enactor.check_lock("pperm(Admin)"):
@@ -288,16 +415,50 @@ class AthanorAccountControllerBackend(AthanorControllerBackend):
     typeclass_defs = [
         ('account_typeclass', 'BASE_ACCOUNT_TYPECLASS', AthanorAccount)
     ]
+    # Evennia stores permissions as Tags of this tagtype.
+    permission_tagtype = "permission"
 
     def __init__(self, frontend):
         super().__init__(frontend)
         self.id_map = dict()
         self.name_map = dict()
+        # upper-cased usernames, sorted, for prefix searches.
+        self.name_index = list()
+        # normalized email addresses to Accounts.
+        self.email_map = dict()
         self.roles = dict()
-        self.reg_names = None
+        self.reg_names = NameMatcher()
         self.account_typeclass = None
         self.permissions = defaultdict(set)
-        self.load()
+        # permission links about to be cleared, kept from pre_clear until post_clear.
+        self.clearing = dict()
+        self.bans = BanScheduler(self.expire_ban)
+
+    def do_load(self):
+        self.update_cache()
+        self.connect_signals()
+        self.load_bans()
+
+    def load_bans(self):
+        """
+        Load every stored ban into the BanScheduler with one query through the
+        Account-Attribute join table.
+        """
+        links = AccountDB.db_attributes.through.objects.filter(
+            attribute__db_key=BanHandler.attr_key, attribute__db_category=BanHandler.attr_category
+        ).select_related('attribute')
+        self.bans.load((link.accountdb_id, link.attribute.value) for link in links)
+
+    def expire_ban(self, account_id, state):
+        if not (account := self.id_map.get(account_id, None)):
+            account = AccountDB.objects.filter(id=account_id).first()
+        if not account:
+            # the Account is gone, but its ban Attribute may not be.
+            Attribute.objects.filter(accountdb__id=account_id, db_key=BanHandler.attr_key,
+                                     db_category=BanHandler.attr_category).delete()
+            return
+        account.attributes.remove(key=BanHandler.attr_key, category=BanHandler.attr_category)
+        amsg.BanExpiredMessage({'account': account}, reason=state.get('reason', 'none given')).send()
 
     def all(self):
         pass
@@ -305,56 +466,372 @@ class AthanorAccountControllerBackend(AthanorControllerBackend):
     def count(self):
         pass
 
+    def select_accounts(self, names=None, patterns=None, ip=None, created_after=None, created_before=None):
+        """
+        Pick Accounts for the bulk operations. Every criterion given must match.
+
+        Args:
+            names (list): Usernames, emails or #dbrefs, resolved exactly like find_account.
+            patterns (list): Case-insensitive fnmatch patterns for usernames, like 'spam*'.
+            ip (str): An fnmatch pattern for addresses. Matched against connected Sessions.
+            created_after (datetime): Only Accounts created after this.
+            created_before (datetime): Only Accounts created before this.
+
+        Returns:
+            accounts (list): Sorted by id.
+        """
+        if not any((names, patterns, ip, created_after, created_before)):
+            raise ValueError("Must select Accounts by name, pattern, IP or creation time!")
+        if names:
+            accounts = {self.find_account(name, exact=True) for name in names}
+        else:
+            accounts = set(self.id_map.values())
+        if patterns:
+            patterns = [pattern.upper() for pattern in patterns]
+            accounts = {acc for acc in accounts if any(fnmatchcase(acc.username.upper(), pattern)
+                                                       for pattern in patterns)}
+        if ip:
+            accounts &= {acc for sess in online_sessions() if sess.logged_in and fnmatchcase(str(sess.address), ip)
+                         and (acc := sess.get_account())}
+        if created_after:
+            accounts = {acc for acc in accounts if acc.db_date_created >= created_after}
+        if created_before:
+            accounts = {acc for acc in accounts if acc.db_date_created < created_before}
+        return sorted(accounts, key=lambda acc: acc.id)
+
+    def bulk_set_attribute(self, accounts, key, category, value):
+        """
+        Give every Account the same Attribute with one delete, one insert into the Attribute
+        table and one into the Account-Attribute join table, instead of several queries per
+        Account.
+
+        Linking needs the new Attributes' ids. Where the database doesn't return them from a
+        bulk insert, each Attribute is inserted on its own instead.
+        """
+        through = AccountDB.db_attributes.through
+        pickled = to_pickle(value)
+        features = connection.features
+        # renamed in Django 3.0.
+        returns_ids = getattr(features, 'can_return_rows_from_bulk_insert',
+                              getattr(features, 'can_return_ids_from_bulk_insert', False))
+        with transaction.atomic():
+            Attribute.objects.filter(accountdb__in=accounts, db_key=key, db_category=category).delete()
+            created = [Attribute(db_key=key, db_category=category, db_value=pickled, db_strvalue=None,
+                                 db_lock_storage='', db_model='accountdb', db_attrtype=None) for acc in accounts]
+            if returns_ids:
+                created = Attribute.objects.bulk_create(created)
+            else:
+                for attr in created:
+                    attr.save()
+            through.objects.bulk_create([through(accountdb_id=acc.id, attribute_id=attr.id)
+                                         for acc, attr in zip(accounts, created)])
+        for acc in accounts:
+            acc.attributes.reset_cache()
+
+    def bulk_remove_attribute(self, accounts, key, category):
+        with transaction.atomic():
+            Attribute.objects.filter(accountdb__in=accounts, db_key=key, db_category=category).delete()
+        for acc in accounts:
+            acc.attributes.reset_cache()
+
+    def bulk_ban(self, accounts, enactor, until, reason):
+        state = {'account': enactor, 'until': until, 'reason': reason, 'started': utcnow()}
+        self.bulk_set_attribute(accounts, BanHandler.attr_key, BanHandler.attr_category, state)
+        self.bans.set_many({acc.id: state for acc in accounts})
+
+    def bulk_unban(self, accounts):
+        self.bulk_remove_attribute(accounts, BanHandler.attr_key, BanHandler.attr_category)
+        self.bans.clear_many([acc.id for acc in accounts])
+
+    def bulk_permission(self, accounts, perm, grant=True):
+        """
+        Grant or revoke a Permission with a single insert or delete on the Account-Tag
+        join table. Bulk queries don't send m2m_changed, so the directory is updated here.
+        """
+        perm = perm.lower()
+        through = AccountDB.db_tags.through
+        with transaction.atomic():
+            if grant:
+                tag, created = Tag.objects.get_or_create(db_key=perm, db_category=None,
+                                                         db_tagtype=self.permission_tagtype, db_model='accountdb')
+                through.objects.bulk_create([through(accountdb_id=acc.id, tag_id=tag.id) for acc in accounts],
+                                            ignore_conflicts=True)
+            else:
+                through.objects.filter(accountdb__in=accounts, tag__db_key=perm,
+                                       tag__db_tagtype=self.permission_tagtype).delete()
+        for acc in accounts:
+            acc.permissions.reset_cache()
+        if grant:
+            self.permissions[perm].update(accounts)
+        elif (holders := self.permissions.get(perm, None)) is not None:
+            holders.difference_update(accounts)
+        self.permissions_changed(accounts)
+
+    def account_listing(self, permission=None, disabled=None, banned=None, login_after=None, login_before=None):
+        """
+        Build the filtered queryset behind list_accounts. Permission, disabled and last
+        login filters run in the database. Bans come from the BanScheduler.
+
+        Returns:
+            accounts (QuerySet): Ordered by id.
+        """
+        accounts = AthanorAccount.objects.filter_family().order_by('id')
+        if permission:
+            accounts = accounts.filter(db_tags__db_key__iexact=permission,
+                                       db_tags__db_tagtype=self.permission_tagtype)
+        if disabled is not None:
+            marked = {'db_attributes__db_key': '_disabled', 'db_attributes__db_category__isnull': True}
+            accounts = accounts.filter(**marked) if disabled else accounts.exclude(**marked)
+        if login_after:
+            accounts = accounts.filter(last_login__gte=login_after)
+        if login_before:
+            accounts = accounts.filter(last_login__lt=login_before)
+        if banned is not None:
+            banned_ids = self.bans.active()
+            accounts = accounts.filter(id__in=banned_ids) if banned else accounts.exclude(id__in=banned_ids)
+        return accounts.distinct()
+
+    def prefetch_listing(self, accounts):
+        """
+        Load a page of Accounts with their permission tags and characters in one query
+        each, rather than several per Account.
+
+        Returns:
+            accounts (list): Each with listed_permissions and listed_characters set.
+        """
+        accounts = list(accounts.prefetch_related(
+            Prefetch('db_tags', queryset=Tag.objects.filter(db_tagtype=self.permission_tagtype),
+                     to_attr='prefetched_permissions'),
+            'player_character_components'))
+        for acc in accounts:
+            acc.listed_permissions = [tag.db_key for tag in acc.prefetched_permissions]
+            acc.listed_characters = [char for char in acc.player_character_components.all() if char.db_is_active]
+        return accounts
+
     def create_account(self, username, email, password, typeclass=None):
         if typeclass is None:
             typeclass = self.account_typeclass
         new_account = typeclass.create_account(username=username, email=email, password=password)
         self.id_map[new_account.id] = new_account
-        self.name_map[new_account.username.upper()] = new_account
-        self.update_regex()
-        for perm in new_account.permissions.all():
-            self.permissions[perm].add(new_account)
+        self.index_name(new_account, new_account.username)
+        self.index_email(new_account, new_account.email)
+        # its permission tags were added through the signal handlers already.
         return new_account
 
-    def update_regex(self):
-        escape_names = [re.escape(name) for name in self.name_map.keys()]
-        self.reg_names = re.compile(r"(?i)\b(?P<found>%s)\b" % '|'.join(escape_names))
-
     def update_cache(self):
-        accounts = AthanorAccount.objects.filter_family()
-        self.id_map = {acc.id: acc for acc in accounts}
-        self.name_map = {acc.username.upper(): acc for acc in accounts}
-        self.update_regex()
-        self.permissions = defaultdict(set)
-        for acc in accounts:
-            for perm in acc.permissions.all():
-                self.permissions[perm].add(acc)
+        """
+        Build every index from the database in a fixed number of queries: one streaming
+        over all Accounts, one streaming over all permission tags through the
+        Account-Tag join table. Both are read in ACCOUNT_CACHE_CHUNK_SIZE chunks.
+        """
+        chunk_size = settings.ACCOUNT_CACHE_CHUNK_SIZE
+        id_map, name_map, email_map, permissions = dict(), dict(), dict(), defaultdict(set)
+        for acc in AthanorAccount.objects.filter_family().order_by('id').iterator(chunk_size=chunk_size):
+            id_map[acc.id] = acc
+            name_map[acc.username.upper()] = acc
+            if acc.email:
+                email_map.setdefault(self.normalize_email(acc.email), acc)
             if acc.is_superuser:
-                self.permissions["_super"].add(acc)
+                permissions["_super"].add(acc)
+
+        tag_links = AccountDB.db_tags.through.objects.filter(tag__db_tagtype=self.permission_tagtype)
+        for account_id, perm in tag_links.values_list('accountdb_id', 'tag__db_key').iterator(chunk_size=chunk_size):
+            if (acc := id_map.get(account_id, None)):
+                permissions[perm].add(acc)
+
+        self.id_map = id_map
+        self.name_map = name_map
+        self.name_index = sorted(name_map.keys())
+        self.email_map = email_map
+        self.permissions = permissions
+        self.reg_names = NameMatcher({acc.username: acc for acc in id_map.values()})
+
+    def connect_signals(self):
+        """
+        Keep the permissions directory current however tags or superuser status change,
+        not just through grant_permission and revoke_permission.
+
+        Django sends post_save and post_delete with the saved instance's own class as
+        sender, which for Accounts is their typeclass, a proxy of AccountDB. Each of those
+        is connected, including typeclasses imported later.
+        """
+        m2m_changed.connect(self.at_account_tags_changed, sender=AccountDB.db_tags.through, weak=False,
+                            dispatch_uid="athanor_account_permissions")
+        for model in apps.get_models():
+            self.connect_account_model(model)
+        class_prepared.connect(self.at_model_prepared, weak=False, dispatch_uid="athanor_account_models")
+
+    def connect_account_model(self, model):
+        if not issubclass(model, AccountDB):
+            return
+        post_save.connect(self.at_account_saved, sender=model, weak=False,
+                          dispatch_uid=f"athanor_account_superuser_{model._meta.label}")
+        post_delete.connect(self.at_account_deleted, sender=model, weak=False,
+                            dispatch_uid=f"athanor_account_deleted_{model._meta.label}")
+
+    def at_model_prepared(self, sender, **kwargs):
+        self.connect_account_model(sender)
+
+    def at_account_tags_changed(self, sender, instance, action, reverse, model, pk_set, **kwargs):
+        if action == "pre_clear":
+            # post_clear doesn't say which links went, so note the permission ones now.
+            if not reverse:
+                perms = instance.db_tags.filter(db_tagtype=self.permission_tagtype)
+                self.clearing[(reverse, instance.pk)] = [(instance, perm) for perm in
+                                                         perms.values_list('db_key', flat=True)]
+            elif instance.db_tagtype == self.permission_tagtype:
+                holders = instance.accountdb_set.values_list('id', flat=True)
+                self.clearing[(reverse, instance.pk)] = [(self.id_map.get(pk, None), instance.db_key)
+                                                         for pk in holders]
+            return
+        if action == "post_clear":
+            links = self.clearing.pop((reverse, instance.pk), ())
+            for account, perm in links:
+                if (holders := self.permissions.get(perm, None)) is not None:
+                    holders.discard(account)
+            self.permissions_changed({account for account, perm in links})
+            return
+        if action not in ("post_add", "post_remove") or not pk_set:
+            return
+        if reverse:
+            # tag.accountdb_set.add(...): instance is the Tag, pk_set the Accounts.
+            if instance.db_tagtype != self.permission_tagtype:
+                return
+            links = [(self.id_map.get(pk, None), instance.db_key) for pk in pk_set]
+        else:
+            perms = Tag.objects.filter(id__in=pk_set, db_tagtype=self.permission_tagtype)
+            links = [(instance, perm) for perm in perms.values_list('db_key', flat=True)]
+        for account, perm in links:
+            if account is None:
+                continue
+            if action == "post_add":
+                self.permissions[perm].add(account)
+            elif (holders := self.permissions.get(perm, None)) is not None:
+                holders.discard(account)
+        self.permissions_changed({account for account, perm in links})
+
+    def at_account_saved(self, sender, instance, update_fields=None, **kwargs):
+        if update_fields and 'is_superuser' not in update_fields:
+            return
+        if instance.is_superuser == (instance in self.permissions["_super"]):
+            return
+        if instance.is_superuser:
+            self.permissions["_super"].add(instance)
+        else:
+            self.permissions["_super"].discard(instance)
+        self.permissions_changed((instance,))
+
+    @staticmethod
+    def permissions_changed(accounts):
+        for account in accounts:
+            if (hook := getattr(account, 'at_permissions_change', None)) is not None:
+                hook()
+
+    def at_account_deleted(self, sender, instance, **kwargs):
+        for holders in self.permissions.values():
+            holders.discard(instance)
+
+    @staticmethod
+    def normalize_email(email):
+        return email.strip().lower()
+
+    def index_name(self, account, username):
+        upper = username.upper()
+        if upper not in self.name_map:
+            insort(self.name_index, upper)
+        self.name_map[upper] = account
+        self.reg_names.add(username, account)
+
+    def unindex_name(self, username):
+        upper = username.upper()
+        if self.name_map.pop(upper, None) is None:
+            return
+        if (position := bisect_left(self.name_index, upper)) < len(self.name_index) and \
+                self.name_index[position] == upper:
+            del self.name_index[position]
+        self.reg_names.remove(username)
+
+    def index_email(self, account, email):
+        if email:
+            self.email_map.setdefault(self.normalize_email(email), account)
+
+    def unindex_email(self, account, email):
+        if email and self.email_map.get(normalized := self.normalize_email(email), None) is account:
+            del self.email_map[normalized]
 
     def rename_account(self, account, new_name):
         old_name = str(account)
         new_name = account.rename(new_name)
+        self.unindex_name(old_name)
+        self.index_name(account, new_name)
         return old_name, new_name
 
     def change_email(self, account, new_email):
         old_email = account.email
         new_email = account.set_email(new_email)
+        self.unindex_email(account, old_email)
+        self.index_email(account, new_email)
         return old_email, new_email
 
+    def prefix_matches(self, upper):
+        """
+        Retrieve every Account whose upper-cased username starts with the given text.
+        """
+        found = list()
+        for position in range(bisect_left(self.name_index, upper), len(self.name_index)):
+            if not (name := self.name_index[position]).startswith(upper):
+                break
+            found.append(self.name_map[name])
+        return found
+
     def find_account(self, search_text, exact=False):
+        """
+        Locate an Account from memory, falling back to the database only for what the
+        indexes can't answer (aliases, or Accounts this backend hasn't seen).
+
+        Resolution order: an email address, a #dbref, the exact username, then (unless
+        exact) a username prefix, then a username substring. Several matches at the
+        first step that finds any is an error.
+
+        Args:
+            search_text (str or AthanorAccount): What to search for.
+            exact (bool): Only accept exact usernames.
+
+        Returns:
+            account (AthanorAccount)
+
+        Raises:
+            ValueError: If nothing, or more than one Account, matched.
+        """
         if not search_text:
             raise ValueError("No account entered to search for!")
         if isinstance(search_text, AthanorAccount):
             return search_text
+        search_text = search_text.strip()
         if '@' in search_text:
+            if (found := self.email_map.get(self.normalize_email(search_text), None)):
+                return found
             found = AthanorAccount.objects.get_account_from_email(search_text).first()
             if found:
+                self.index_email(found, found.email)
                 return found
             raise ValueError(f"Cannot find a user with email address: {search_text}")
+        if search_text.startswith('#') and search_text[1:].isdigit():
+            if (found := self.id_map.get(int(search_text[1:]), None)):
+                return found
+        upper = search_text.upper()
+        if (found := self.name_map.get(upper, None)):
+            return found
+        if not exact:
+            if not (candidates := self.prefix_matches(upper)):
+                candidates = [acc for name, acc in self.name_map.items() if upper in name]
+            if len(candidates) == 1:
+                return candidates[0]
+            if candidates:
+                raise ValueError(f"That matched multiple accounts: {iter_to_string(candidates)}")
         found = search_account(search_text, exact=exact)
         if len(found) == 1:
             return found[0]
         if not found:
             raise ValueError(f"Cannot find a user named {search_text}!")
-        raise ValueError(f"That matched multiple accounts: {found}")
+        raise ValueError(f"That matched multiple accounts: {iter_to_string(found)}")
@@ -5,6 +5,8 @@ import time
 from django.utils import timezone
 from django.conf import settings
 from evennia import MONITOR_HANDLER
+
+import athanor
 from athanor.utils.time import utcnow
 from athanor.utils.link import EntitySessionHandler
 from athanor.utils.cmdsethandler import AthanorCmdSetHandler
@@ -13,14 +15,23 @@ from athanor.utils.appearance import AppearanceHandler
 
 
 class BanHandler:
+    """
+    Bans are kept in memory by the Account controller's BanScheduler, so checking one
+    never loads the Attribute. Changes are written to the Attribute and the scheduler.
+    """
+    attr_key = 'ban'
+    attr_category = 'system'
 
     def __init__(self, account):
         self.account = account
-        self.state = None
-        self.load()
 
-    def load(self):
-        self.state = self.account.attributes.get(key='ban', category='system', default=dict())
+    @property
+    def scheduler(self):
+        return athanor.api().get('controller_manager').get('account').backend.bans
+
+    @property
+    def state(self):
+        return self.scheduler.get(self.account.id) or dict()
 
     def get_state(self):
         """
@@ -34,13 +45,11 @@ class BanHandler:
                 'reason': self.state.get('reason', 'none given'),
                 'until': banned_until
             }
-        if banned_until and banned_until < now:
-            self.clear()
         return False
 
     def clear(self):
-        self.account.attributes.remove(key='ban', category='system')
-        self.load()
+        self.account.attributes.remove(key=self.attr_key, category=self.attr_category)
+        self.scheduler.clear(self.account.id)
 
     def set(self, account, until, reason):
         new_ban = {
@@ -49,8 +58,8 @@ class BanHandler:
             'reason': reason,
             'started': utcnow()
         }
-        self.account.attributes.add(key='ban', category='system', value=new_ban)
-        self.load()
+        self.account.attributes.add(key=self.attr_key, category=self.attr_category, value=new_ban)
+        self.scheduler.set(self.account.id, new_ban)
 
 
 class AccountSessionHandler(EntitySessionHandler):
@@ -67,6 +67,13 @@ class UnBanMessage(AccountMessage):
     }
 
 
+class BanExpiredMessage(AccountMessage):
+    messages = {
+        'account': "The ban on your Account has expired.",
+        'admin': "The ban on Account |w{account_name}|n has expired. It was for: {reason}"
+    }
+
+
 class PasswordMessagePrivate(AccountMessage):
     messages = {
         'enactor': "Successfully changed your password!",
@@ -114,6 +121,14 @@ class RevokeSuperMessage(AccountMessage):
     }
 
 
+class BulkMessage(AccountMessage):
+    targets = ['enactor', 'admin']
+    messages = {
+        'enactor': "Successfully {action} {count} Accounts{detail}: {accounts}",
+        'admin': "|w{enactor_name}|n {action} {count} Accounts{detail}: {accounts}"
+    }
+
+
 class ForceDisconnect(AccountMessage):
     messages = {
         'enactor': "Successfully booted Account: |w{account_name}|n under reasoning: {reason}",
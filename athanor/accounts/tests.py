@@ -0,0 +1,251 @@
+from datetime import datetime, timedelta, timezone
+from unittest import TestCase, mock
+
+from twisted.internet import task
+
+from athanor.accounts.bans import BanScheduler
+from athanor.accounts.controller import AthanorAccountControllerBackend
+
+
+class StubAccount:
+
+    def __init__(self, account_id, username, email=None):
+        self.id = account_id
+        self.username = username
+        self.email = email
+
+    def __str__(self):
+        return self.username
+
+    def rename(self, new_name):
+        self.username = new_name
+        return new_name
+
+    def set_email(self, new_email):
+        self.email = new_email
+        return new_email
+
+
+class TestFindAccount(TestCase):
+
+    def setUp(self):
+        self.backend = AthanorAccountControllerBackend(mock.Mock(system_name='ACCOUNTS'))
+        self.accounts = dict()
+        for account_id, username, email in ((1, "Alice", "alice@example.com"), (2, "Alan", None),
+                                            (3, "Bob", "Bob@Example.com"), (4, "Roberta", None)):
+            account = StubAccount(account_id, username, email)
+            self.accounts[username] = account
+            self.backend.id_map[account_id] = account
+            self.backend.index_name(account, username)
+            self.backend.index_email(account, email)
+        # anything the indexes can't answer falls back to searching the database.
+        patcher = mock.patch("athanor.accounts.controller.search_account", return_value=[])
+        self.search_account = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def find(self, search_text, exact=False):
+        return self.backend.find_account(search_text, exact=exact)
+
+    def test_exact(self):
+        self.assertIs(self.find("bob"), self.accounts["Bob"])
+        self.assertIs(self.find(" ALICE ", exact=True), self.accounts["Alice"])
+        self.assertIs(self.find("#4"), self.accounts["Roberta"])
+        self.assertIs(self.find("BOB@example.COM"), self.accounts["Bob"])
+        self.search_account.assert_not_called()
+
+    def test_prefix(self):
+        self.assertIs(self.find("ali"), self.accounts["Alice"])
+        self.assertIs(self.find("rob"), self.accounts["Roberta"])
+        # a prefix match wins over names that merely contain the text.
+        self.assertIs(self.find("bo"), self.accounts["Bob"])
+        with self.assertRaises(ValueError):
+            self.find("ali", exact=True)
+        self.search_account.assert_called_once_with("ali", exact=True)
+
+    def test_substring(self):
+        self.assertIs(self.find("bert"), self.accounts["Roberta"])
+        self.assertIs(self.find("lic"), self.accounts["Alice"])
+
+    def test_ambiguous(self):
+        with self.assertRaises(ValueError) as raised:
+            self.find("al")
+        self.assertIn("Alan", str(raised.exception))
+        self.assertIn("Alice", str(raised.exception))
+        with self.assertRaises(ValueError):
+            # 'Bob' and 'Roberta'.
+            self.find("ob")
+        self.search_account.assert_not_called()
+
+    def test_not_found(self):
+        with self.assertRaises(ValueError):
+            self.find("zed")
+        with self.assertRaises(ValueError):
+            self.find("")
+
+    def test_rename(self):
+        bob = self.accounts["Bob"]
+        self.assertEqual(self.backend.rename_account(bob, "Alfred"), ("Bob", "Alfred"))
+        self.assertEqual(self.backend.name_index, ["ALAN", "ALFRED", "ALICE", "ROBERTA"])
+        self.assertIs(self.find("alf"), bob)
+        self.assertIs(self.backend.reg_names.get("alfred"), bob)
+        self.assertNotIn("Bob", self.backend.reg_names)
+        with self.assertRaises(ValueError):
+            self.find("bob", exact=True)
+        with self.assertRaises(ValueError):
+            # now 'Alan', 'Alfred' and 'Alice'.
+            self.find("al")
+
+    def test_change_email(self):
+        bob = self.accounts["Bob"]
+        self.assertEqual(self.backend.change_email(bob, "robert@example.com"),
+                         ("Bob@Example.com", "robert@example.com"))
+        self.assertIs(self.find("Robert@example.com"), bob)
+        self.assertNotIn("bob@example.com", self.backend.email_map)
+        # another Account's address is never unindexed on its behalf.
+        self.backend.unindex_email(bob, "alice@example.com")
+        self.assertIs(self.find("alice@example.com"), self.accounts["Alice"])
+
+
+class TestPermissionSignals(TestCase):
+
+    def setUp(self):
+        self.backend = AthanorAccountControllerBackend(mock.Mock(system_name='ACCOUNTS'))
+        self.alice, self.bob = StubAccount(1, "Alice"), StubAccount(2, "Bob")
+        self.backend.id_map = {1: self.alice, 2: self.bob}
+        for perm, holders in (("Admin", (self.alice, self.bob)), ("Builder", (self.alice,)),
+                              ("_super", (self.alice,))):
+            self.backend.permissions[perm].update(holders)
+
+    def changed(self, instance, action, reverse=False):
+        self.backend.at_account_tags_changed(None, instance, action, reverse, None, None)
+
+    def test_clear_account(self):
+        # alice.db_tags.clear() with only her Builder permission stored as a tag.
+        self.alice.db_tags = mock.Mock()
+        self.alice.db_tags.filter.return_value.values_list.return_value = ["Builder"]
+        self.alice.pk = 1
+        self.changed(self.alice, "pre_clear")
+        self.assertIn(self.alice, self.backend.permissions["Builder"])
+        self.changed(self.alice, "post_clear")
+        self.assertEqual(self.backend.permissions["Builder"], set())
+        self.assertEqual(self.backend.permissions["Admin"], {self.alice, self.bob})
+        self.assertEqual(self.backend.permissions["_super"], {self.alice})
+        self.assertEqual(self.backend.clearing, dict())
+
+    def test_clear_tag(self):
+        # the Admin tag's accountdb_set.clear(), when only Bob holds that Tag object.
+        tag = mock.Mock(pk=7, db_key="Admin", db_tagtype="permission")
+        tag.accountdb_set.values_list.return_value = [2]
+        self.changed(tag, "pre_clear", reverse=True)
+        self.changed(tag, "post_clear", reverse=True)
+        self.assertEqual(self.backend.permissions["Admin"], {self.alice})
+        self.assertEqual(self.backend.permissions["Builder"], {self.alice})
+
+
+class ThreadedClock(task.Clock):
+    """
+    A task.Clock that also queues callFromThread() calls, run by run_queued().
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.queued = list()
+
+    def callFromThread(self, func, *args, **kwargs):
+        self.queued.append((func, args, kwargs))
+
+    def run_queued(self):
+        queued, self.queued = self.queued, list()
+        for func, args, kwargs in queued:
+            func(*args, **kwargs)
+
+
+class TestBanScheduler(TestCase):
+
+    def setUp(self):
+        self.clock = ThreadedClock()
+        self.start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+        self.in_io_thread = True
+        for target, replacement in (("reactor", self.clock), ("utcnow", self.now),
+                                    ("isInIOThread", lambda: self.in_io_thread)):
+            patcher = mock.patch(f"athanor.accounts.bans.{target}", replacement)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.expired = list()
+        self.scheduler = BanScheduler(lambda account_id, state: self.expired.append(account_id))
+
+    def now(self):
+        return self.start + timedelta(seconds=self.clock.seconds())
+
+    def ban(self, seconds):
+        return {'until': self.start + timedelta(seconds=seconds), 'reason': 'testing'}
+
+    def timer_at(self):
+        calls = self.clock.getDelayedCalls()
+        self.assertEqual(len(calls), 1)
+        return calls[0].getTime()
+
+    def test_load(self):
+        self.scheduler.load([(1, self.ban(30)), (2, self.ban(-5)), (3, self.ban(10)), (4, None), (5, dict())])
+        self.assertEqual(set(self.scheduler.bans.keys()), {1, 2, 3})
+        self.assertEqual(self.scheduler.active(), {1, 3})
+        self.clock.advance(0)
+        self.assertEqual(self.expired, [2])
+        self.assertEqual(self.timer_at(), 10)
+        self.clock.advance(10)
+        self.assertEqual(self.timer_at(), 30)
+        self.clock.advance(20)
+        self.assertEqual(self.expired, [2, 3, 1])
+        self.assertFalse(self.clock.getDelayedCalls())
+        self.assertEqual(self.scheduler.heap, [])
+
+    def test_reschedule(self):
+        self.scheduler.set(1, self.ban(60))
+        self.assertEqual(self.timer_at(), 60)
+        self.scheduler.set(2, self.ban(20))
+        self.assertEqual(self.timer_at(), 20)
+        # a new ban for the same Account replaces the old one's heap entry.
+        self.scheduler.set(2, self.ban(90))
+        self.assertEqual(self.timer_at(), 60)
+        self.scheduler.clear(1)
+        self.assertEqual(self.timer_at(), 90)
+        self.assertEqual(self.scheduler.heap, [(self.start + timedelta(seconds=90), 2)])
+        self.clock.advance(60)
+        self.assertEqual(self.expired, [])
+        self.clock.advance(30)
+        self.assertEqual(self.expired, [2])
+        self.assertIsNone(self.scheduler.get(2))
+
+    def test_many(self):
+        self.scheduler.set_many({number: self.ban(number * 10) for number in range(1, 5)})
+        self.assertEqual(self.timer_at(), 10)
+        self.scheduler.clear_many((1, 3, 99))
+        self.assertEqual(self.timer_at(), 20)
+        self.clock.advance(40)
+        self.assertEqual(self.expired, [2, 4])
+        self.assertEqual(self.scheduler.bans, dict())
+
+    def test_expire_errors(self):
+        def on_expire(account_id, state):
+            self.expired.append(account_id)
+            if account_id == 1:
+                raise KeyError("broken")
+        self.scheduler.on_expire = on_expire
+        self.scheduler.set_many({1: self.ban(5), 2: self.ban(5)})
+        with mock.patch("athanor.accounts.bans.logger") as logger:
+            self.clock.advance(5)
+        logger.log_trace.assert_called_once()
+        self.assertEqual(sorted(self.expired), [1, 2])
+
+    def test_off_reactor_thread(self):
+        self.in_io_thread = False
+        self.scheduler.set(1, self.ban(10))
+        # the state is kept at once, but timers are only touched from the reactor thread.
+        self.assertTrue(self.scheduler.get(1))
+        self.assertFalse(self.clock.getDelayedCalls())
+        self.assertEqual(len(self.clock.queued), 1)
+        self.in_io_thread = True
+        self.clock.run_queued()
+        self.assertEqual(self.timer_at(), 10)
+        self.clock.advance(10)
+        self.assertEqual(self.expired, [1])
@@ -4,10 +4,12 @@ from evennia.utils.utils import time_format
 
 import athanor
 from athanor.accounts.handlers import AccountCmdSetHandler
+from athanor.utils.coalesce import OUTPUT
+from athanor.utils.mixins import HasCoalescedOutput
 from athanor.accounts.handlers import BanHandler, AccountCmdHandler, AccountAppearanceHandler
 
 
-class AthanorAccount(DefaultAccount):
+class AthanorAccount(HasCoalescedOutput, DefaultAccount):
     """
     AthanorAccount adds the EventEmitter to DefaultAccount and supports Mixins.
     Please read Evennia's documentation for its normal API.
@@ -82,22 +84,28 @@ class AthanorAccount(DefaultAccount):
         sysmsg_border = self.options.sys_msg_border
         sysmsg_text = self.options.sys_msg_text
         formatted_text = f"|{sysmsg_border}-=<|n|{sysmsg_text}{system_name.upper()}|n|{sysmsg_border}>=-|n {text}"
-        self.msg(text=formatted_text, system_name=system_name, original_text=text)
+        OUTPUT.send(self, text=formatted_text, system_name=system_name, original_text=text)
 
     def receive_template_message(self, text, msgobj, target):
         self.system_msg(text=text, system_name=msgobj.system_name)
 
-    def render_list_section(self, enactor, styling):
+    def render_list_section(self, enactor, styling, permissions=None, characters=None):
         """
         Called by AccountController's list_accounts method. Renders this account
-        on the list.
+        on the list. The controller passes permissions and characters it already
+        fetched in bulk. If they are not given, they are queried here.
         """
+        if permissions is None:
+            permissions = self.permissions.all()
+        if characters is None:
+            characters = self.characters()
+        last_login = self.last_login.strftime('%c') if self.last_login else "Never"
         return [
             styling.styled_separator(self.username),
             f"|wEmail|n: {self.email}",
-            f"|wLast Login|n: Last login here!",
-            f"|wPermissions|n: {', '.join(self.permissions.all())} (Superuser: {self.is_superuser})",
-            f"|wCharacters|n: {', '.join(str(c) for c in self.characters())}"
+            f"|wLast Login|n: {last_login}",
+            f"|wPermissions|n: {', '.join(permissions)} (Superuser: {self.is_superuser})",
+            f"|wCharacters|n: {', '.join(str(c) for c in characters)}"
         ]
 
     def __str__(self):
@@ -115,6 +123,28 @@ class AthanorAccount(DefaultAccount):
         else:
             raise ValueError(errors)
 
+    def at_post_login(self, session=None, **kwargs):
+        super().at_post_login(session=session, **kwargs)
+        if (channels := getattr(self, 'channels', None)) is not None:
+            channels.at_online()
+
+    def at_post_disconnect(self, **kwargs):
+        """
+        Unlike at_disconnect, this runs after is_connected says whether any Sessions
+        remain.
+        """
+        super().at_post_disconnect(**kwargs)
+        if not self.is_connected and (channels := getattr(self, 'channels', None)) is not None:
+            channels.at_offline()
+
+    def at_permissions_change(self):
+        """
+        Called by the Account controller whenever this Account's Permissions or superuser
+        status change, however that happened.
+        """
+        if (channels := getattr(self, 'channels', None)) is not None:
+            channels.at_permissions_change()
+
     def rename(self, new_name):
         new_name = self.normalize_username(new_name)
         self.username = new_name
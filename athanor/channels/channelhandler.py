@@ -1,4 +1,5 @@
-from django.db.models import Q
+
+from weakref import WeakValueDictionary
 
 from evennia.utils.ansi import ANSIString
 
@@ -8,36 +9,89 @@ from athanor_channels.models import AbstractChannelSubscription
 
 
 class AbstractChannelHandler(object):
+    # Bumped whenever any Channel's locks change, since alias commands carry them.
+    lock_generation = 0
 
     def __init__(self, owner):
         self.owner = owner
         self._cached = False
-        self._cached_cmdset = None
-        self.update_cache()
+        # lower-cased alias names to Subscriptions.
+        self._subscriptions = dict()
+        self._signature = None
+        self._generation = None
+        # the shared cmdset for the current signature, kept alive by its owners.
+        self._cmdset = None
 
     def system_msg(self, message):
         self.owner.msg(message, system_name=f"{self.namespace} Channels")
 
+    @classmethod
+    def locks_changed(cls):
+        AbstractChannelHandler.lock_generation += 1
+
     def update_cache(self):
+        """
+        Load every Subscription together with its Channel in one query. After this, add()
+        and leave() only add or remove their own Subscription.
+        """
+        self._subscriptions = {sub.db_name.lower(): sub for sub in self.subscriptions.select_related('db_channel')}
+        self._cached = True
+        self.changed()
+
+    def changed(self):
+        self._signature = None
+        self._cmdset = None
+        if (handler := getattr(self.owner, 'cmdset', None)) and hasattr(handler, 'invalidate'):
+            handler.invalidate()
+
+    def add_command(self, subscription):
+        if not self._cached:
+            return
+        self._subscriptions[subscription.db_name.lower()] = subscription
+        self.changed()
+
+    def remove_command(self, subscription):
+        if not self._cached or self._subscriptions.pop(subscription.db_name.lower(), None) is None:
+            return
+        self.changed()
+
+    def subscription_for(self, alias):
+        """
+        Resolve an alias command to this owner's Subscription. Alias commands are shared
+        between owners, so they look this up each time they run.
+        """
+        if not self._cached:
+            self.update_cache()
+        return self._subscriptions.get(alias.lower(), None)
+
+    def signature(self):
+        """
+        Everything the alias cmdset is built from. Owners with equal signatures get the
+        same cmdset.
+        """
+        if not self._cached:
+            self.update_cache()
+        if self._signature is None or self._generation != self.lock_generation:
+            self._generation = self.lock_generation
+            self._signature = tuple(sorted(
+                (sub.db_name, sub.db_channel.id, str(sub.db_channel.locks), sub.db_channel.system.ndb.command_class)
+                for sub in self._subscriptions.values()))
+        return self._signature
+
+    def build_cmdset(self, signature):
         cmdset = AthanorCmdSet()
         cmdset.key = "ChannelCmdSet"
         cmdset.priority = 101
         cmdset.duplicates = True
-        for subscription in self.subscriptions.all():
-            system = subscription.db_channel.system
-            cmd = system.ndb.command_class(
-                key=subscription.db_name,
-                locks="cmd:all();%s" % subscription.db_channel.locks,
-                subscription=subscription
-            )
-            cmdset.add(cmd)
-        self._cached_cmdset = cmdset
-        self._cached = True
+        for alias, channel_id, locks, command_class in signature:
+            cmdset.add(command_class(key=alias, locks="cmd:all();%s" % locks))
+        return cmdset
 
     def cmdset(self):
-        if not self._cached:
-            self.update_cache()
-        return self._cached_cmdset
+        signature = self.signature()
+        if self._cmdset is None or self._cmdset.signature != signature:
+            self._cmdset = CHANNEL_CMDSETS.get(signature, self.build_cmdset)
+        return self._cmdset
 
     @property
     def subscriptions(self):
@@ -46,8 +100,9 @@ class AbstractChannelHandler(object):
     def add(self, channel, alias):
         if (found := self.subscriptions.filter(db_namespace=self.namespace, db_name=alias).first()):
             raise ValueError(f"That conflicts with an existing alias to {found.db_channel}!")
-        self.subscriptions.create(db_namespace=self.namespace, db_channel=channel, db_name=alias)
-        self.update_cache()
+        subscription = self.subscriptions.create(db_namespace=self.namespace, db_channel=channel, db_name=alias)
+        channel.update_listener(subscription)
+        self.add_command(subscription)
 
     def find_alias(self, alias):
         if isinstance(alias, AbstractChannelSubscription):
@@ -59,8 +114,9 @@ class AbstractChannelHandler(object):
 
     def leave(self, alias):
         found = self.find_alias(alias)
+        found.db_channel.remove_listener(found)
+        self.remove_command(found)
         found.delete()
-        self.update_cache()
 
     def codename(self, alias, codename):
         found = self.find_alias(alias)
@@ -111,24 +167,40 @@ class AbstractChannelHandler(object):
         found.save(update_fields=['db_altname'])
         self.system_msg(f"Altname set to: {altname}")
 
-    def check_listen(self, channel):
-        all_aliases = self.subscriptions.filter(db_channel=channel)
-        listening = True if self.owner in channel.listeners else False
-        # If listening and shouldn't be...
-        permission = channel.is_position(self.owner, 'listener')
-        if listening:
-            if not permission or not all_aliases.filter(Q(db_muted=False) | Q(db_enabled=True)).count():
-                channel.remove_listener(self.owner)
-        else:
-            if permission and all_aliases.filter(Q(db_muted=False) | Q(db_enabled=True)).count():
-                channel.add_listener(self.owner)
+    def check_listen(self, subscription):
+        subscription.db_channel.update_listener(subscription)
+
+    def all_subscriptions(self):
+        if not self._cached:
+            self.update_cache()
+        return list(self._subscriptions.values())
+
+    def at_online(self):
+        """
+        The owner calls this when it comes online, and at_offline when it goes offline,
+        so Channels know who to send broadcasts to.
+        """
+        for subscription in self.all_subscriptions():
+            subscription.db_channel.listener_online(subscription)
+
+    def at_offline(self):
+        for subscription in self.all_subscriptions():
+            subscription.db_channel.listener_offline(subscription)
+
+    def at_permissions_change(self):
+        """
+        The owner calls this after its permissions change, since Channel locks and
+        positions may depend on them.
+        """
+        for subscription in self.all_subscriptions():
+            subscription.db_channel.update_listener(subscription)
 
     def mute(self, alias):
         found = self.find_alias(alias)
         if found.muted:
             raise ValueError("Channel is already muted!")
         found.muted = True
-        self.check_listen(found.db_channel)
+        self.check_listen(found)
         self.system_msg("Muted the channel!")
 
     def unmute(self, alias):
@@ -136,7 +208,7 @@ class AbstractChannelHandler(object):
         if not found.muted:
             raise ValueError("Channel is not muted!")
         found.muted = False
-        self.check_listen(found.db_channel)
+        self.check_listen(found)
         self.system_msg("un-Muted the channel!")
 
     def on(self, alias):
@@ -144,7 +216,7 @@ class AbstractChannelHandler(object):
         if found.enabled:
             raise ValueError("Channel is already on!")
         found.enabled = True
-        self.check_listen(found.db_channel)
+        self.check_listen(found)
         self.system_msg("Turned channel on!")
 
     def off(self, alias):
@@ -152,7 +224,7 @@ class AbstractChannelHandler(object):
         if not found.enabled:
             raise ValueError("Channel is not on!")
         found.enabled = False
-        self.check_listen(found.db_channel)
+        self.check_listen(found)
         self.system_msg("Turned channel on!")
 
 
@@ -164,6 +236,31 @@ class CharacterChannelHandler(AbstractChannelHandler):
     namespace = 'character'
 
 
+class ChannelCmdSetInterner:
+    """
+    Keeps one alias cmdset per distinct subscription signature. Its cmdsets are shared
+    between owners and must never be changed. Each is only kept while some owner's
+    handler holds on to it.
+
+    Sharing saves building the cmdset and its commands for every owner. It doesn't let
+    owners share merged cmdsets: CMDSET_MERGE_CACHE keys on each owner's own
+    CmdSetHandlers, so every owner still has merges of their own.
+    """
+
+    def __init__(self):
+        self.cmdsets = WeakValueDictionary()
+
+    def get(self, signature, builder):
+        if (cmdset := self.cmdsets.get(signature, None)) is None:
+            cmdset = builder(signature)
+            cmdset.signature = signature
+            self.cmdsets[signature] = cmdset
+        return cmdset
+
+
+CHANNEL_CMDSETS = ChannelCmdSetInterner()
+
+
 class GlobalChannelHandler(object):
     """
     This actually replaces the Evennia CHANNEL_HANDLER_CLASS
@@ -171,7 +268,6 @@ class GlobalChannelHandler(object):
 
     def __init__(self):
         self._cached_channel_cmds = {}
-        self._cached_cmdsets = {}
         self._cached_channels = {}
 
     def add(self, channel):
@@ -184,7 +280,8 @@ class GlobalChannelHandler(object):
         pass
 
     def update(self):
-        pass
+        # every owner's alias cmdset is looked up again on next use.
+        AbstractChannelHandler.locks_changed()
 
     def get_cmdset(self, source_object):
         return source_object.channels.cmdset()
@@ -1,10 +1,20 @@
+import os
 import re
+from datetime import datetime
+
+from django.conf import settings
 from django.db.models import Q
 
 from evennia.typeclasses.managers import TypeclassManager
 from evennia.typeclasses.models import TypeclassBase
+from evennia.utils.utils import lazy_property
 from athanor.models import ChannelDB
+from athanor.channels.channelhandler import AbstractChannelHandler
+from athanor.channels.history import ChannelHistory
+from athanor.utils.coalesce import OUTPUT
+from athanor.utils.metrics import METRICS
 from athanor.utils.text import clean_and_ansi
+from athanor.utils.time import utcnow
 
 
 class DefaultChannel(ChannelDB, metaclass=TypeclassBase):
@@ -61,21 +71,142 @@ class DefaultChannel(ChannelDB, metaclass=TypeclassBase):
     def render_prefix(self, recipient, sender):
         return f"<{self.owner.abbreviation}>"
 
+    @lazy_property
+    def history(self):
+        return ChannelHistory(os.path.join(settings.CHANNEL_HISTORY_DIR, str(self.id)),
+                              buffer_size=settings.CHANNEL_HISTORY_BUFFER,
+                              segment_lines=settings.CHANNEL_HISTORY_SEGMENT_LINES)
+
+    def render_history(self, recipient, lines):
+        """
+        Format recalled history lines for a recipient, oldest first.
+        """
+        if not lines:
+            raise ValueError("No messages to show!")
+        prefix = self.render_prefix(recipient, None)
+        return '\n'.join(f"[{datetime.fromtimestamp(when).strftime('%x %X')}] {prefix} {text}"
+                         for number, when, text in lines)
+
+    def render_key(self, recipient, sender, text):
+        """
+        Recipients with equal keys receive identical broadcasts. render_prefix doesn't
+        vary by recipient, so only the text's key matters here. Overrides of
+        render_prefix that do vary should add that to the key.
+        """
+        if (text_key := getattr(text, 'render_key', None)) is None:
+            # no way to tell who sees the same thing.
+            return recipient
+        return text_key(recipient)
+
     def allowed_listeners(self):
         subscriptions = self.subscriptions.exclude(Q(db_muted=True) | Q(db_enabled=False))
-        return {sub for sub in subscriptions if self.check_position(sub.owner, 'listener')}
+        return {sub for sub in subscriptions if self.may_listen(sub.owner)}
 
     def active_listeners(self, allowed=None):
         if allowed is None:
             allowed = self.allowed_listeners()
         return {sub for sub in allowed if sub.owner.sessions.count()}
 
+    def may_listen(self, user):
+        return not self.is_banned(user) and self.check_position(user, 'listener')
+
+    def next_unban(self):
+        """
+        Returns:
+            until (datetime or None): When the next timed ban here runs out.
+        """
+        now = utcnow()
+        return min((until for until in self.banned.values() if until > now), default=None)
+
+    @property
+    def listeners(self):
+        """
+        The Subscriptions that may hear broadcasts: unmuted, turned on and allowed to
+        listen. Built with allowed_listeners() when first needed, then kept current by
+        update_listener() and remove_listener() instead of being recomputed for every
+        message. Rebuilt once the next timed ban runs out, since nothing else marks that.
+        """
+        if (listeners := self.ndb.listeners) is None or \
+                ((until := self.ndb.next_unban) is not None and until <= utcnow()):
+            listeners = self.allowed_listeners()
+            self.ndb.listeners = listeners
+            self.ndb.online_listeners = None
+            self.ndb.next_unban = self.next_unban()
+        return listeners
+
+    @property
+    def online_listeners(self):
+        """
+        The listeners whose owners are online, which broadcast() sends to. Owners report
+        logging in and out through their channel handlers' at_online() and at_offline().
+        """
+        listeners = self.listeners
+        if (online := self.ndb.online_listeners) is None:
+            online = self.active_listeners(listeners)
+            self.ndb.online_listeners = online
+        return online
+
+    def reset_listeners(self):
+        """
+        Forget the listener sets. They are rebuilt on the next broadcast. Used when a
+        change could affect everyone, such as to locks.
+        """
+        self.ndb.listeners = None
+        self.ndb.online_listeners = None
+
+    def update_listener(self, subscription):
+        """
+        Re-check one Subscription, such as after it was muted or its owner's permissions
+        changed.
+        """
+        if self.ndb.listeners is None:
+            return
+        if subscription.db_muted or not subscription.db_enabled or not self.may_listen(subscription.owner):
+            self.remove_listener(subscription)
+            return
+        self.ndb.listeners.add(subscription)
+        if self.ndb.online_listeners is not None and subscription.owner.sessions.count():
+            self.ndb.online_listeners.add(subscription)
+
+    def remove_listener(self, subscription):
+        if self.ndb.listeners is not None:
+            self.ndb.listeners.discard(subscription)
+        if self.ndb.online_listeners is not None:
+            self.ndb.online_listeners.discard(subscription)
+
+    def listener_online(self, subscription):
+        if self.ndb.online_listeners is not None and subscription in self.ndb.listeners:
+            self.ndb.online_listeners.add(subscription)
+
+    def listener_offline(self, subscription):
+        if self.ndb.online_listeners is not None:
+            self.ndb.online_listeners.discard(subscription)
+
+    def at_position_change(self, user):
+        for subscription in user.channel_subscriptions.filter(db_channel=self):
+            self.update_listener(subscription)
+        if self.ndb.listeners is not None:
+            self.ndb.next_unban = self.next_unban()
+
+    def at_lock_change(self):
+        self.reset_listeners()
+        AbstractChannelHandler.locks_changed()
+
     def broadcast(self, text, sending_session=None):
         sender = self.get_sender(sending_session)
-        for subscription in self.active_listeners():
+        rendered = dict()
+        listeners = self.online_listeners
+        for subscription in listeners:
             owner = subscription.owner
-            prefix = self.render_prefix(owner, sender)
-            owner.msg(f"{prefix} {text.render(viewer=owner)}")
+            key = self.render_key(owner, sender, text)
+            if (message := rendered.get(key, None)) is None:
+                message = f"{self.render_prefix(owner, sender)} {text.render(viewer=owner)}"
+                rendered[key] = message
+            OUTPUT.send(owner, message)
+        self.history.add(str(text.render()))
+        METRICS.incr("channels", "renders", len(rendered))
+        METRICS.incr("channels", "renders_saved", len(listeners) - len(rendered))
+        METRICS.gauge("channels", "renders_saved_last", len(listeners) - len(rendered))
 
     def check_access(self, checker, lock):
         return self.access(checker, lock) or self.category.access(checker, lock)
@@ -2,6 +2,8 @@ import re
 
 from athanor.commands.command import AthanorCommand
 from athanor.utils.text import Speech
+from athanor.utils.threads import COMMAND_THREADS
+from athanor.utils.time import duration_from_string, utcnow
 
 
 class HasChannelSystem(AthanorCommand):
@@ -70,19 +72,42 @@ Usage:
     {key}/codename <code name>
         An alternate name you will appear as, on supported channels.
 
+    {key}/last [<count>[,<page>]]
+        Show the last <count> messages, 20 if not given. Pages go back in time.
+
+    {key}/since <duration>[,<page>]
+        Show messages from the last <duration>, such as 2h, 50 per page.
+
     Set /title, /altname, or /codename to None to clear them.
 """
 
 
 class AbstractChannelCommand(HasChannelSystem, AthanorCommand):
-    switch_options = ('who', 'leave', 'title', 'altname', 'mute', 'unmute', 'codename', 'on', 'off')
+    switch_options = ('who', 'leave', 'title', 'altname', 'mute', 'unmute', 'codename', 'on', 'off', 'last',
+                      'since')
+    switch_syntax = {
+        'last': '[<count>[,<page>]]',
+        'since': '<duration>[,<page>]'
+    }
+    args_delim = ','
     controller_key = 'channel'
     user_controller = None
 
+    # Resolved from the caller each time the command runs. The command is shared by
+    # everyone with the same aliases, but the cmdhandler runs a copy of it per call.
+    subscription = None
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.__doc__ = _CHANNEL_DOC.format(key=self.key, system_key=self.system_key)
 
+    def func(self):
+        if not (subscription := self.caller.channels.subscription_for(self.key)):
+            self.msg(f"ERROR: You are not subscribed to a channel as {self.key}.")
+            return
+        self.subscription = subscription
+        return super().func()
+
     def switch_main(self):
         subscrip = self.subscription
         channel = subscrip.db_channel
@@ -122,6 +147,47 @@ class AbstractChannelCommand(HasChannelSystem, AthanorCommand):
     def switch_who(self):
         self.caller.channels.who(self.subscription)
 
+    def recall_numbers(self, defaults):
+        if len(self.argslist) > len(defaults) or not all(arg.isdigit() for arg in self.argslist):
+            self.syntax_error()
+        numbers = [int(arg) for arg in self.argslist] + list(defaults[len(self.argslist):])
+        if not all(numbers):
+            self.syntax_error()
+        return numbers
+
+    def recall(self, channel, method, *args, **kwargs):
+        """
+        Read history in COMMAND_THREADS, since it may have to come from disk, and show it
+        once it arrives. Everything else stays on the reactor thread.
+
+        Returns:
+            deferred (Deferred): Fires once the lines have been shown.
+        """
+        def show(lines):
+            try:
+                self.msg(channel.render_history(self.caller, lines))
+            except ValueError as err:
+                self.msg(f"ERROR: {str(err)}")
+        return COMMAND_THREADS.run(self, method, *args, **kwargs).addCallback(show)
+
+    def switch_last(self):
+        channel = self.subscription.db_channel
+        if not channel.may_listen(self.caller):
+            raise ValueError("Permission denied.")
+        count, page = self.recall_numbers((20, 1))
+        return self.recall(channel, channel.history.last, count, page=page)
+
+    def switch_since(self):
+        channel = self.subscription.db_channel
+        if not channel.may_listen(self.caller):
+            raise ValueError("Permission denied.")
+        if not self.argslist or not (duration := duration_from_string(self.argslist[0])):
+            self.syntax_error()
+        self.argslist = self.argslist[1:]
+        page, = self.recall_numbers((1,))
+        start = utcnow() - duration
+        return self.recall(channel, channel.history.between, start.timestamp(), page=page)
+
 
 _ADMIN_DOC = """
 This command is for administrating the {system_key} Channel System.
@@ -0,0 +1,299 @@
+"""
+Message history for Channels.
+
+Every line a Channel broadcasts is numbered and kept twice: in a ring buffer of the most
+recent lines, and on disk in append-only segment files. Lines are written to disk in
+batches, from a worker thread, every few seconds or as soon as enough are waiting.
+
+Each Channel gets its own directory under CHANNEL_HISTORY_DIR, holding:
+    <first line number>.log: A segment. One JSON [number, time, text] per line. A new
+        segment is started every CHANNEL_HISTORY_SEGMENT_LINES lines.
+    index.jsonl: The sparse index. One JSON [number, time, segment, byte offset] for the
+        first line of every segment and every INDEX_EVERY lines after.
+
+A write that fails part way is undone, so the next attempt starts again from the first
+unwritten line. A line torn by a crash is cut off the end of its file when the history
+is loaded, and skipped if it turns up anywhere else.
+
+The index is small enough to keep in memory. Recalling lines by number or by time
+bisects it and then reads at most INDEX_EVERY lines before the first wanted one, so a
+recall never scans a whole log and never touches the database. Recent lines come
+straight from the ring buffer.
+"""
+import json
+import os
+from bisect import bisect_left, bisect_right
+from collections import deque
+from threading import Lock
+from time import time
+
+from twisted.internet import reactor
+from twisted.internet.task import LoopingCall
+from twisted.internet.threads import deferToThread
+
+from evennia.utils import logger
+
+
+class ChannelHistory:
+    """
+    Args:
+        path (str): Directory for this Channel's segments and index.
+        buffer_size (int): How many recent lines to keep in memory.
+        segment_lines (int): Lines per segment file.
+        interval (float): Seconds between writes.
+        batch (int): Write early once this many lines are waiting.
+    """
+    INDEX_EVERY = 100
+    INDEX_FILE = "index.jsonl"
+
+    def __init__(self, path, buffer_size=200, segment_lines=10000, interval=5.0, batch=100):
+        self.path = path
+        self.segment_lines = segment_lines
+        self.batch = batch
+        self.ring = deque(maxlen=buffer_size)
+        # lines not yet confirmed on disk, oldest first.
+        self.unwritten = deque()
+        self.index = list()
+        self.index_numbers = list()
+        self.index_times = list()
+        self.total = 0
+        self.written = 0
+        # the segment being appended to, and how many lines it has. Only the writer uses these.
+        self.segment = None
+        self.segment_count = 0
+        self.writing = False
+        self.lock = Lock()
+        self.loop = LoopingCall(self.flush)
+        self.interval = interval
+        reactor.addSystemEventTrigger("before", "shutdown", self.flush)
+        self.load()
+
+    def load(self):
+        """
+        Read the index, then the few lines after its last entry, to find where the
+        history left off.
+        """
+        os.makedirs(self.path, exist_ok=True)
+        index_path = os.path.join(self.path, self.INDEX_FILE)
+        if not os.path.exists(index_path):
+            return
+        self.trim_torn(index_path)
+        with open(index_path, "rb") as index_file:
+            entries = [entry for entry in map(self.parse, index_file) if entry]
+        self.add_index(entries)
+        if not entries:
+            return
+        number, timestamp, segment, offset = entries[-1]
+        self.trim_torn(os.path.join(self.path, segment))
+        first = next(entry[0] for entry in entries if entry[2] == segment)
+        last = number - 1
+        for last, timestamp, text in self.read_segment(segment, offset):
+            pass
+        self.total = self.written = last + 1
+        self.segment = segment
+        self.segment_count = self.total - first
+        self.ring.extend(self.read(max(0, self.total - self.ring.maxlen), self.total))
+
+    @staticmethod
+    def parse(line):
+        try:
+            return json.loads(line)
+        except ValueError:
+            return None
+
+    @staticmethod
+    def trim_torn(path):
+        """
+        Cut a partly written last line off the end of a file.
+        """
+        with open(path, "rb+") as handle:
+            size = handle.seek(0, os.SEEK_END)
+            if not size:
+                return
+            handle.seek(size - 1)
+            if handle.read(1) == b'\n':
+                return
+            position = size
+            while position > 0:
+                start = max(0, position - 4096)
+                handle.seek(start)
+                chunk = handle.read(position - start)
+                if (found := chunk.rfind(b'\n')) != -1:
+                    handle.truncate(start + found + 1)
+                    return
+                position = start
+            handle.truncate(0)
+
+    def add_index(self, entries):
+        self.index.extend(entries)
+        self.index_numbers.extend(entry[0] for entry in entries)
+        self.index_times.extend(entry[1] for entry in entries)
+
+    def add(self, text, timestamp=None):
+        """
+        Record a line.
+
+        Returns:
+            number (int): The line's number in this history.
+        """
+        record = (self.total, timestamp or time(), text)
+        self.total += 1
+        self.ring.append(record)
+        self.unwritten.append(record)
+        if len(self.unwritten) >= self.batch:
+            self.flush()
+        elif not self.loop.running:
+            self.loop.start(self.interval, now=False)
+        return record[0]
+
+    def flush(self):
+        if self.writing or not self.unwritten:
+            return None
+        self.writing = True
+        records = list(self.unwritten)
+        return deferToThread(self.append, records).addCallbacks(self.at_written, self.at_write_failed)
+
+    def append(self, records):
+        """
+        Write records to the segment files. Runs in a worker thread.
+
+        Returns:
+            written, entries (tuple): The number after the last line written, and the
+                new index entries.
+        """
+        entries = list()
+        with self.lock:
+            # anything before self.written is already on disk.
+            records = [record for record in records if record[0] >= self.written]
+            if not records:
+                return self.written, entries
+            segment, segment_count = self.segment, self.segment_count
+            # the size of every file touched, before this write.
+            sizes = dict()
+            handle = None
+            try:
+                for number, timestamp, text in records:
+                    if self.segment is None or self.segment_count >= self.segment_lines:
+                        if handle:
+                            handle.close()
+                        self.segment, self.segment_count = f"{number:012d}.log", 0
+                        handle = None
+                    if handle is None:
+                        handle = self.open_append(os.path.join(self.path, self.segment), sizes)
+                    if not self.segment_count % self.INDEX_EVERY:
+                        entries.append([number, timestamp, self.segment, handle.tell()])
+                    handle.write(json.dumps([number, timestamp, text]).encode() + b'\n')
+                    self.segment_count += 1
+                handle.close()
+                if entries:
+                    with self.open_append(os.path.join(self.path, self.INDEX_FILE), sizes) as index_file:
+                        index_file.write(''.join(json.dumps(entry) + '\n' for entry in entries).encode())
+            except Exception:
+                if handle:
+                    handle.close()
+                # undo everything, so the retry starts from self.written again.
+                for path, size in sizes.items():
+                    os.truncate(path, size)
+                self.segment, self.segment_count = segment, segment_count
+                raise
+        return records[-1][0] + 1, entries
+
+    @staticmethod
+    def open_append(path, sizes):
+        handle = open(path, "ab")
+        sizes.setdefault(path, handle.tell())
+        return handle
+
+    def at_written(self, result):
+        written, entries = result
+        self.add_index(entries)
+        self.written = written
+        while self.unwritten and self.unwritten[0][0] < written:
+            self.unwritten.popleft()
+        self.writing = False
+        if len(self.unwritten) >= self.batch:
+            self.flush()
+
+    def at_write_failed(self, failure):
+        # the lines stay unwritten and are tried again on the next interval.
+        self.writing = False
+        logger.log_err(f"Could not write channel history to {self.path}: {failure.getErrorMessage()}")
+
+    def read_segment(self, segment, offset):
+        with open(os.path.join(self.path, segment), "rb") as handle:
+            handle.seek(offset)
+            for line in handle:
+                if (record := self.parse(line)) is not None:
+                    yield record
+
+    def read_disk(self, start, stop):
+        """
+        Read lines start to stop - 1 from the segment files, starting at the index entry
+        at or before start.
+        """
+        if not self.index or start >= stop:
+            return
+        position = max(0, bisect_right(self.index_numbers, start) - 1)
+        segments = list(dict.fromkeys(entry[2] for entry in self.index[position:]))
+        offset = self.index[position][3]
+        for segment in segments:
+            for number, timestamp, text in self.read_segment(segment, offset):
+                if number >= stop:
+                    return
+                if number >= start:
+                    yield number, timestamp, text
+            offset = 0
+
+    def read(self, start, stop):
+        """
+        Returns:
+            lines (list): (number, time, text) of lines start to stop - 1, oldest first.
+        """
+        start, stop = max(0, start), min(stop, self.total)
+        if start >= stop:
+            return list()
+        # copies, since lines keep arriving while a command thread reads.
+        in_memory = [record for record in (list(self.unwritten) + list(self.ring)) if start <= record[0] < stop]
+        lines = {record[0]: record for record in in_memory}
+        if not lines or min(lines) > start:
+            disk_stop = min(lines) if lines else stop
+            lines.update((record[0], tuple(record)) for record in self.read_disk(start, disk_stop))
+        return [lines[number] for number in sorted(lines)]
+
+    def number_at(self, timestamp):
+        """
+        Returns:
+            number (int): The first line recorded at or after timestamp.
+        """
+        memory = sorted(list(self.unwritten) + list(self.ring))
+        if memory and memory[0][1] <= timestamp:
+            return next((number for number, when, text in memory if when >= timestamp), self.total)
+        if not self.index:
+            return memory[0][0] if memory else self.total
+        position = max(0, bisect_left(self.index_times, timestamp) - 1)
+        start = self.index_numbers[position]
+        for number, when, text in self.read_disk(start, self.written):
+            if when >= timestamp:
+                return number
+        return memory[0][0] if memory else self.total
+
+    def last(self, count, page=1):
+        """
+        Page backwards through the history, count lines at a time.
+
+        Returns:
+            lines (list): Oldest first.
+        """
+        stop = self.total - (page - 1) * count
+        return self.read(stop - count, stop)
+
+    def between(self, start_time, end_time=None, count=50, page=1):
+        """
+        Page forwards through the lines recorded between two times.
+
+        Returns:
+            lines (list): Oldest first.
+        """
+        start = self.number_at(start_time) + (page - 1) * count
+        stop = self.number_at(end_time) if end_time else self.total
+        return self.read(start, min(stop, start + count))
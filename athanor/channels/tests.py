@@ -0,0 +1,114 @@
+import json
+import os
+from tempfile import TemporaryDirectory
+from unittest import TestCase, mock
+
+from twisted.internet import task
+from twisted.internet.defer import maybeDeferred
+
+from athanor.channels.history import ChannelHistory
+
+
+class TestChannelHistory(TestCase):
+
+    def setUp(self):
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = directory.name
+        # writes happen at once, on this thread.
+        for target, replacement in (("deferToThread", maybeDeferred), ("reactor", mock.Mock())):
+            patcher = mock.patch(f"athanor.channels.history.{target}", replacement)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def history(self, **kwargs):
+        kwargs.setdefault('buffer_size', 20)
+        kwargs.setdefault('segment_lines', 250)
+        kwargs.setdefault('batch', 1000)
+        history = ChannelHistory(self.path, **kwargs)
+        history.loop.clock = task.Clock()
+        return history
+
+    def fill(self, history, stop):
+        for number in range(history.total, stop):
+            history.add(f"line {number}", timestamp=1000 + number)
+        history.flush()
+        self.assertEqual(history.written, stop)
+
+    def file_path(self, name):
+        return os.path.join(self.path, name)
+
+    def test_rollover(self):
+        history = self.history()
+        self.fill(history, 600)
+        self.assertEqual(sorted(os.listdir(self.path)),
+                         ["000000000000.log", "000000000250.log", "000000000500.log", "index.jsonl"])
+        self.assertEqual(history.index_numbers, [0, 100, 200, 250, 350, 450, 500])
+        with open(self.file_path("000000000250.log")) as segment:
+            self.assertEqual([json.loads(line)[0] for line in segment], list(range(250, 500)))
+        reloaded = self.history()
+        self.assertEqual((reloaded.total, reloaded.segment, reloaded.segment_count), (600, "000000000500.log", 100))
+        self.assertEqual([record[0] for record in reloaded.ring], list(range(580, 600)))
+        self.fill(reloaded, 800)
+        # the last segment fills up before the next starts.
+        self.assertIn("000000000750.log", os.listdir(self.path))
+        self.assertEqual([record[0] for record in self.history().read(0, 800)], list(range(800)))
+
+    def test_index_seeks(self):
+        history = self.history()
+        self.fill(history, 600)
+        with mock.patch.object(history, 'read_segment', wraps=history.read_segment) as read_segment:
+            lines = history.read(420, 430)
+        self.assertEqual([number for number, when, text in lines], list(range(420, 430)))
+        self.assertEqual(lines[0][2], "line 420")
+        # starts at the index entry for line 350, partway through the second segment.
+        offset = history.index[history.index_numbers.index(350)][3]
+        read_segment.assert_called_once_with("000000000250.log", offset)
+        self.assertEqual(history.number_at(1000 + 333), 333)
+        self.assertEqual(history.number_at(0), 0)
+        self.assertEqual([number for number, when, text in history.last(5, page=3)], list(range(585, 590)))
+        self.assertEqual([number for number, when, text in history.between(1000 + 240, 1000 + 260, count=8, page=2)],
+                         list(range(248, 256)))
+
+    def test_torn_lines(self):
+        history = self.history()
+        self.fill(history, 300)
+        with open(self.file_path(history.segment), "ab") as segment:
+            segment.write(b'[300, 1300, "li')
+        with open(self.file_path(ChannelHistory.INDEX_FILE), "ab") as index:
+            index.write(b'[300, 13')
+        reloaded = self.history()
+        self.assertEqual(reloaded.total, 300)
+        for name in (reloaded.segment, ChannelHistory.INDEX_FILE):
+            with open(self.file_path(name), "rb") as handle:
+                self.assertTrue(handle.read().endswith(b'\n'))
+        self.fill(reloaded, 320)
+        self.assertEqual([record[0] for record in self.history().read(0, 320)], list(range(320)))
+
+    def test_failed_write(self):
+        history = self.history()
+        self.fill(history, 240)
+        sizes = {name: os.path.getsize(self.file_path(name)) for name in os.listdir(self.path)}
+        real_dumps, calls = json.dumps, list()
+
+        def dumps(obj, *args, **kwargs):
+            # fails after starting a new segment.
+            calls.append(obj)
+            if len(calls) == 30:
+                raise OSError("disk full")
+            return real_dumps(obj, *args, **kwargs)
+
+        for number in range(240, 300):
+            history.add(f"line {number}", timestamp=1000 + number)
+        with mock.patch("athanor.channels.history.json.dumps", dumps), \
+                mock.patch("athanor.channels.history.logger") as logger:
+            history.flush()
+        logger.log_err.assert_called_once()
+        self.assertEqual((history.written, len(history.unwritten), history.writing), (240, 60, False))
+        self.assertEqual((history.segment, history.segment_count), ("000000000000.log", 240))
+        # the new segment stays, emptied.
+        self.assertEqual({name: os.path.getsize(self.file_path(name)) for name in os.listdir(self.path)},
+                         dict(sizes, **{"000000000250.log": 0}))
+        history.flush()
+        self.assertEqual(history.written, 300)
+        self.assertEqual([record[0] for record in self.history().read(0, 300)], list(range(300)))
@@ -0,0 +1,174 @@
+from athanor.utils.command import AthanorCommand
+from athanor.utils.metrics import METRICS
+from athanor.utils.tracing import TRACER
+
+
+def _ms(seconds):
+    return f"{seconds * 1000:.2f}"
+
+
+class CmdCommandStats(AthanorCommand):
+    """
+    Displays command latency statistics, for finding commands that stall the server.
+    All times are in milliseconds.
+
+    Usage:
+        @cmdstats [<filter>]
+            List every command that has run since the last reset, slowest first
+            by p99. <filter> limits it to command paths containing that text.
+
+        @cmdstats/stages [<filter>]
+            Break latency down by stage: gather, merge, match, suggest, pre,
+            parse, func and post.
+
+        @cmdstats/reset
+            Clear all recorded command statistics.
+    """
+    key = "@cmdstats"
+    locks = "cmd:pperm(Developer)"
+    help_category = "System"
+    switch_options = ('stages', 'reset')
+
+    def gather(self):
+        by_command = dict()
+        for (cmd_path, stage), histogram in METRICS.histograms.get("command", dict()).items():
+            if self.args and self.args.lower() not in cmd_path.lower():
+                continue
+            by_command.setdefault(cmd_path, dict())[stage] = histogram
+        if not by_command:
+            raise ValueError("No command statistics recorded!")
+        return sorted(by_command.items(), key=lambda item: item[1]["total"].percentile(99), reverse=True)
+
+    def switch_main(self):
+        table = self.styled_table("Command", "Calls", "p50", "p95", "p99", "Max")
+        for cmd_path, stages in self.gather():
+            total = stages["total"]
+            table.add_row(cmd_path, total.count, _ms(total.percentile(50)), _ms(total.percentile(95)),
+                          _ms(total.percentile(99)), _ms(total.max))
+        self.msg(str(table))
+
+    def switch_stages(self):
+        table = self.styled_table("Command", "Stage", "p50", "p95", "p99", "Max")
+        for cmd_path, stages in self.gather():
+            for stage, histogram in stages.items():
+                table.add_row(cmd_path, stage, _ms(histogram.percentile(50)), _ms(histogram.percentile(95)),
+                              _ms(histogram.percentile(99)), _ms(histogram.max))
+        self.msg(str(table))
+
+    def switch_reset(self):
+        METRICS.reset("command")
+        self.msg("Command statistics cleared.")
+
+
+class CmdCommandTrace(AthanorCommand):
+    """
+    Captures span-by-span traces of a sample of commands. All times are in
+    milliseconds.
+
+    Usage:
+        @cmdtrace [<number>]
+            Show the most recent traces, 10 by default.
+
+        @cmdtrace/rate <fraction>
+            Trace this fraction of all commands, from 0 (off) to 1 (every
+            command). Tracing starts and stops immediately.
+
+        @cmdtrace/clear
+            Forget all captured traces.
+    """
+    key = "@cmdtrace"
+    locks = "cmd:pperm(Developer)"
+    help_category = "System"
+    switch_options = ('rate', 'clear')
+
+    def switch_main(self):
+        if self.args and not self.args.isdigit():
+            raise ValueError("Usage: @cmdtrace [<number>]")
+        if not TRACER.traces:
+            raise ValueError(f"No traces captured! The sample rate is {TRACER.rate}.")
+        count = int(self.args) if self.args else 10
+        message = list()
+        for trace in list(TRACER.traces)[-count:]:
+            message.append(f"{trace['caller']} '{trace['input']}' -> {trace['command']} ({trace['total_ms']:.2f})")
+            message.append('  ' + ' '.join(f"{span['name']}@{span['start_ms']:.2f}+{span['ms']:.2f}"
+                                           for span in trace['spans']))
+        self.msg('\n'.join(message))
+
+    def switch_rate(self):
+        try:
+            rate = float(self.args)
+        except ValueError:
+            raise ValueError("Usage: @cmdtrace/rate <fraction>")
+        TRACER.set_rate(rate)
+        self.msg(f"Command trace sample rate set to {rate}.")
+
+    def switch_clear(self):
+        TRACER.traces.clear()
+        self.msg("Command traces cleared.")
+
+
+class CmdControllerStats(AthanorCommand):
+    """
+    Displays statistics on controller operations, such as account bans or channel
+    creation. Controllers are only measured while instrumented. All times are in
+    milliseconds. Query counts include those of nested controller calls.
+
+    Usage:
+        @ctrlstats [<filter>]
+            List every instrumented controller method that has been called, slowest
+            first by p99. <filter> limits it to controllers or methods containing that
+            text.
+
+        @ctrlstats/on [<controller>]
+        @ctrlstats/off [<controller>]
+            Start or stop instrumenting a controller, or all of them.
+
+        @ctrlstats/export
+            Show every controller statistic as plain text, one per line, for saving.
+
+        @ctrlstats/reset
+            Clear all recorded controller statistics.
+    """
+    key = "@ctrlstats"
+    locks = "cmd:pperm(Developer)"
+    help_category = "System"
+    switch_options = ('on', 'off', 'export', 'reset')
+
+    def switch_main(self):
+        histograms = METRICS.histograms.get("controller", dict())
+        counters = METRICS.counters.get("controller", dict())
+        rows = [(key, histogram) for key, histogram in histograms.items()
+                if not self.args or self.args.lower() in '.'.join(key).lower()]
+        if not rows:
+            raise ValueError("No controller statistics recorded!")
+        table = self.styled_table("Controller", "Method", "Calls", "Rejected", "Errors", "Queries", "p50", "p99")
+        for (con_key, method), histogram in sorted(rows, key=lambda row: row[1].percentile(99), reverse=True):
+            table.add_row(con_key, method, histogram.count, counters.get((con_key, method, 'rejected'), 0),
+                          counters.get((con_key, method, 'errors'), 0),
+                          counters.get((con_key, method, 'queries'), 0),
+                          _ms(histogram.percentile(50)), _ms(histogram.percentile(99)))
+        self.msg(str(table))
+
+    def choose_controllers(self):
+        if not self.args:
+            return list(self.controllers.controllers.values())
+        return [self.controllers.get(self.args)]
+
+    def switch_on(self):
+        for controller in self.choose_controllers():
+            controller.instrument()
+        self.msg("Controller instrumentation enabled.")
+
+    def switch_off(self):
+        for controller in self.choose_controllers():
+            controller.uninstrument()
+        self.msg("Controller instrumentation disabled.")
+
+    def switch_export(self):
+        if not (text := METRICS.export_text("controller")):
+            raise ValueError("No controller statistics recorded!")
+        self.msg(text)
+
+    def switch_reset(self):
+        METRICS.reset("controller")
+        self.msg("Controller statistics cleared.")
@@ -1,5 +1,6 @@
 from athanor.identities.acl import ACLMixin
+from athanor.utils.mixins import HasCoalescedOutput
 
 
-class AthanorBaseObjectMixin(ACLMixin):
+class AthanorBaseObjectMixin(HasCoalescedOutput, ACLMixin):
     pass
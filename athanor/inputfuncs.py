@@ -1,6 +1,11 @@
 """"""
+from django.conf import settings
 from evennia.server.inputfuncs import _IDLE_COMMAND
 
+from athanor.utils.scheduler import INPUT_SCHEDULER
+
+_SEPARATOR = settings.INPUT_COMMAND_SEPARATOR
+
 
 # Renamed to text2 to 'disable' it for the moment.
 def text2(session, *args, **kwargs):
@@ -29,9 +34,17 @@ def text2(session, *args, **kwargs):
         session.update_session_counters(idle=True)
         return
 
+    kwargs.pop("options", None)
+    if _SEPARATOR and _SEPARATOR in txt:
+        # several commands on one line; they run as a batch against one merged cmdset.
+        batch = [session.cmd_nick_replace(part) for part in txt.split(_SEPARATOR) if part.strip()]
+        if batch:
+            INPUT_SCHEDULER.enqueue(session, batch, **kwargs)
+        session.update_session_counters()
+        return
+
     txt = session.cmd_nick_replace(txt)
 
-    kwargs.pop("options", None)
-    # This is the only change - call the session.cmd.execute() instead of cmdhandler(session...)
-    session.cmd.execute(txt, session=session, **kwargs)
+    # Queue it for session.cmd.execute() instead of calling cmdhandler(session...) right away.
+    INPUT_SCHEDULER.enqueue(session, txt, **kwargs)
     session.update_session_counters()
@@ -5,9 +5,12 @@ from evennia.server.serversession import ServerSession
 
 import athanor
 from athanor.serversessions.handlers import ServerSessionCmdHandler, ServerSessionCmdSetHandler
+from athanor.utils.coalesce import OUTPUT
+from athanor.utils.mixins import HasCoalescedOutput
+from athanor.utils.scheduler import INPUT_SCHEDULER
 
 
-class AthanorServerSession(ServerSession):
+class AthanorServerSession(HasCoalescedOutput, ServerSession):
     # The Session is always the first thing to matter when parsing commands.
     _cmd_sort = -1000
 
@@ -27,6 +30,10 @@ class AthanorServerSession(ServerSession):
             return self.account.colorizer
         return dict()
 
+    def at_disconnect(self, reason=None):
+        INPUT_SCHEDULER.discard(self)
+        super().at_disconnect(reason=reason)
+
     def generate_substitutions(self, viewer):
         return {
             "name": str(self),
@@ -37,7 +44,7 @@ class AthanorServerSession(ServerSession):
         sysmsg_border = settings.OPTIONS_ACCOUNT_DEFAULT.get('sys_msg_border')[2]
         sysmsg_text = settings.OPTIONS_ACCOUNT_DEFAULT.get('sys_msg_text')[2]
         formatted_text = f"|{sysmsg_border}-=<|n|{sysmsg_text}{system_name.upper()}|n|{sysmsg_border}>=-|n {text}"
-        self.msg(text=formatted_text, system_name=system_name, original_text=text)
+        OUTPUT.send(self, text=formatted_text, system_name=system_name, original_text=text)
 
     def receive_template_message(self, text, msgobj, target):
         self.system_msg(text=text, system_name=msgobj.system_name)
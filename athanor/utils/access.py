@@ -265,10 +265,6 @@ class BasicSubjectSystem(ACLSubjectSystem):
 
 class AccessController(AthanorController):
 
-    def __init__(self, key, manager, backend):
-        super().__init__(key, manager, backend)
-        self.load()
-
     def find_resource(self, enactor, res_str):
         """
 
@@ -286,6 +282,8 @@ class AccessController(AthanorController):
 
 
 class AccessControllerBackend(AthanorControllerBackend):
+    # Identities and resources are looked up by Account name.
+    dependencies = ('account',)
 
     def __init__(self, frontend):
         super().__init__(frontend)
@@ -92,9 +92,8 @@ class PluginAssetLoader:
 
 class AssetController(AthanorController):
     system_name = 'ASSETS'
-
-    def __init__(self, key, manager, backend):
-        super().__init__(key, manager, backend)
+    # only reads plugin files.
+    load_in_thread = True
 
     def get_definition(self, path):
         return self.backend.get_definition(path)
@@ -113,7 +112,6 @@ class AssetControllerBackend(AthanorControllerBackend):
         self.asset_loader_class = None
         self.plugins_sorted = list()
         self.plugins = dict()
-        self.load()
 
     def do_load(self):
         self.load_plugins()
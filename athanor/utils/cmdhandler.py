@@ -30,31 +30,36 @@ command line. The processing of a command works as follows:
    will be available to the command coder at run-time.
 12. We have a unique cmdobject, primed for use. Call all hooks:
    `at_pre_cmd()`, `cmdobj.parse()`, `cmdobj.func()` and finally `at_post_cmd()`.
-13. Return deferred that will fire with the return from `cmdobj.func()` (unused by default).
+13. Return a Deferred firing with the return from `cmdobj.func()` (unused by default). The
+   pipeline runs synchronously, so that Deferred has usually fired already; it only has to
+   wait if a hook returned an un-fired Deferred.
 """
 
-from collections import defaultdict
-from weakref import WeakValueDictionary
+from collections import defaultdict, OrderedDict
 from traceback import format_exc
 from copy import copy
 import types
 from twisted.internet import reactor
 from twisted.internet.task import deferLater
-from twisted.internet.defer import inlineCallbacks, returnValue
 from django.conf import settings
 from evennia.commands.command import InterruptCommand
 from evennia.comms.channelhandler import CHANNELHANDLER
 from evennia.utils import logger, utils
-from evennia.utils.utils import string_suggestions, class_from_module
+from evennia.utils.utils import class_from_module
+
+from athanor.utils.fastpath import maybe_inline_callbacks, fast_inline_callbacks
+from athanor.utils.metrics import METRICS, StageTimer
+from athanor.utils.tracing import TRACER, Trace
 
 
 from django.utils.translation import gettext as _
 
 _IN_GAME_ERRORS = settings.IN_GAME_ERRORS
+_COMMAND_TIMING = settings.COMMAND_TIMING_ENABLED
+_SLOW_COMMAND_THRESHOLD = settings.SLOW_COMMAND_THRESHOLD
 
 __all__ = ("cmdhandler", "InterruptCommand")
 _GA = object.__getattribute__
-_CMDSET_MERGE_CACHE = WeakValueDictionary()
 
 # tracks recursive calls by each caller
 # to avoid infinite loops (commands calling themselves)
@@ -64,6 +69,7 @@ _COMMAND_RECURSION_LIMIT = 10
 # This decides which command parser is to be used.
 # You have to restart the server for changes to take effect.
 _COMMAND_PARSER = utils.variable_from_module(*settings.COMMAND_PARSER.rsplit(".", 1))
+_SUGGESTIONS = utils.variable_from_module(*settings.COMMAND_SUGGESTIONS.rsplit(".", 1))
 
 # System command names - import these variables rather than trying to
 # remember the actual string constants. If not defined, Evennia
@@ -162,6 +168,96 @@ class ErrorReported(Exception):
         self.raw_string = raw_string
 
 
+class CmdSetMergeCache:
+    """
+    Bounded LRU cache of merged cmdsets.
+
+    Entries are keyed by the identity and version of every CmdSetHandler that contributed
+    to a merge, plus the identity and version of every gathered cmdset. The contributors
+    are kept alongside the merged result so that a recycled id() can never return a stale
+    merge. AthanorCmdSetHandler calls invalidate() whenever its stack changes.
+    """
+
+    def __init__(self, maxsize=1000):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.handler_keys = defaultdict(set)
+
+    def make_key(self, handlers, cmdsets):
+        """
+        Generate the cache key for a merge.
+
+        Args:
+            handlers (list): The CmdSetHandlers of the ordered cmdobjects.
+            cmdsets (list): The gathered cmdsets that are about to be merged.
+
+        Returns:
+            key (tuple)
+        """
+        return (tuple([(id(handler), getattr(handler, "version", None)) for handler in handlers]),
+                tuple([(id(cmdset), getattr(cmdset, "version", 0)) for cmdset in cmdsets]))
+
+    def get(self, key, handlers, cmdsets):
+        """
+        Retrieve a cached merge, marking it as recently used.
+
+        Returns:
+            cmdset (CmdSet or None): The merged cmdset, if one is cached.
+        """
+        if not (found := self.entries.get(key, None)):
+            return None
+        cached_handlers, cached_cmdsets, merged = found
+        if not (self._same(cached_handlers, handlers) and self._same(cached_cmdsets, cmdsets)):
+            # An id() was recycled by a different object. This entry can never match again.
+            self.discard(key)
+            return None
+        self.entries.move_to_end(key)
+        return merged
+
+    def set(self, key, handlers, cmdsets, merged):
+        self.entries[key] = (tuple(handlers), tuple(cmdsets), merged)
+        self.entries.move_to_end(key)
+        for handler in handlers:
+            self.handler_keys[id(handler)].add(key)
+        while len(self.entries) > self.maxsize:
+            self.discard(next(iter(self.entries)))
+
+    def discard(self, key):
+        if not (found := self.entries.pop(key, None)):
+            return
+        for handler in found[0]:
+            if (keys := self.handler_keys.get(id(handler), None)) is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.handler_keys[id(handler)]
+
+    def invalidate(self, handler):
+        """
+        Drop every merge that the given CmdSetHandler contributed to.
+
+        Args:
+            handler (CmdSetHandler): The handler whose stack changed.
+        """
+        for key in list(self.handler_keys.get(id(handler), ())):
+            self.discard(key)
+
+    def clear(self):
+        self.entries.clear()
+        self.handler_keys.clear()
+
+    @staticmethod
+    def _same(first, second):
+        if len(first) != len(second):
+            return False
+        for a, b in zip(first, second):
+            if a is not b:
+                return False
+        return True
+
+
+CMDSET_MERGE_CACHE = CmdSetMergeCache(settings.CMDSET_MERGE_CACHE_SIZE)
+
+
 # helper functions
 class CmdHandler:
 
@@ -261,7 +357,7 @@ class CmdHandler:
         deferLater(reactor, 0, self._progressive_cmd_run, cmd, generator, response=result)
         return False
 
-    @inlineCallbacks
+    @maybe_inline_callbacks
     def _get_channel_cmdset(self, caller, account_or_obj, raw_string):
         """
         Helper-method; Get channel-cmdsets
@@ -269,12 +365,12 @@ class CmdHandler:
         # Create cmdset for all account's available channels
         try:
             channel_cmdset = yield CHANNELHANDLER.get_cmdset(account_or_obj)
-            returnValue([channel_cmdset])
+            return [channel_cmdset]
         except Exception:
             self._msg_err(caller, _ERROR_CMDSETS)
             raise ErrorReported(raw_string)
 
-    @inlineCallbacks
+    @maybe_inline_callbacks
     def get_cmdsets(self, caller, raw_string, merged_current=None, merged_stack=None):
         """
         Helper method; Get cmdset while making sure to trigger all
@@ -295,7 +391,7 @@ class CmdHandler:
             merged_stack = stack
         else:
             merged_stack.extend(stack)
-        returnValue((merged_current, merged_stack))
+        return (merged_current, merged_stack)
 
     def get_extra_cmdsets(self, caller, merged_current):
         """
@@ -310,8 +406,8 @@ class CmdHandler:
         """
         return []
 
-    @inlineCallbacks
-    def get_and_merge_cmdsets(self, caller, ordered_objects, raw_string, error_to):
+    @maybe_inline_callbacks
+    def get_and_merge_cmdsets(self, caller, ordered_objects, raw_string, error_to, timer=None):
         """
         Gather all relevant cmdsets and merge them.
 
@@ -327,10 +423,11 @@ class CmdHandler:
                 merging, but is preserved from CmdHandler.execute()
             raw_string (str): The input string. This is only used for error reporting.
             error_to (obj): An Evennia object that implements .msg(). For error reporting.
+            timer (StageTimer, optional): Marked with "gather" once the cmdsets are gathered.
 
         Returns:
-            cmdset (Deferred): This deferred fires with the merged cmdset
-            result once merger finishes.
+            cmdset (CmdSet or Deferred): The merged cmdset. This is only a Deferred
+            (firing with the merged cmdset) if a hook along the way had to wait.
 
         Notes:
             The cdmsets are merged in order or generality, so that the
@@ -342,6 +439,8 @@ class CmdHandler:
             current, cmdsets = None, list()
             for obj in ordered_objects:
                 current, cmdsets = yield obj.cmd.get_cmdsets(caller, raw_string, current, cmdsets)
+            if timer:
+                timer.mark("gather")
 
             # weed out all non-found sets
             cmdsets = yield [cmdset for cmdset in cmdsets if cmdset and cmdset.key != "_EMPTY_CMDSET"]
@@ -351,12 +450,11 @@ class CmdHandler:
             ]
 
             if cmdsets:
-                # faster to do tuple on list than to build tuple directly
-                mergehash = tuple([id(cmdset) for cmdset in cmdsets])
-                if mergehash in _CMDSET_MERGE_CACHE:
-                    # cached merge exist; use that
-                    cmdset = _CMDSET_MERGE_CACHE[mergehash]
-                else:
+                handlers = [obj.cmdset for obj in ordered_objects]
+                mergekey = CMDSET_MERGE_CACHE.make_key(handlers, cmdsets)
+                cmdset = CMDSET_MERGE_CACHE.get(mergekey, handlers, cmdsets)
+                if cmdset is None:
+                    gathered = list(cmdsets)
                     # we group and merge all same-prio cmdsets separately (this avoids
                     # order-dependent clashes in certain cases, such as
                     # when duplicates=True)
@@ -379,13 +477,13 @@ class CmdHandler:
                     # store the full sets for diagnosis
                     cmdset.merged_from = cmdsets
                     # cache
-                    _CMDSET_MERGE_CACHE[mergehash] = cmdset
+                    CMDSET_MERGE_CACHE.set(mergekey, handlers, gathered, cmdset)
             else:
                 cmdset = None
             local_obj_cmdsets = [cset for cset in cmdsets if cset.cmdsetobj not in ordered_objects and cset.object_cmdset]
             for cset in (cset for cset in local_obj_cmdsets if cset):
                 cset.duplicates = cset.old_duplicates
-            returnValue(cmdset)
+            return cmdset
         except ErrorReported:
             raise
         except Exception:
@@ -393,9 +491,9 @@ class CmdHandler:
             raise
             # raise ErrorReported
 
-    @inlineCallbacks
+    @fast_inline_callbacks
     def _run_command(self, caller, cmd, cmdname, args, raw_cmdname, cmdset, cmdobjects, raw_string,
-                     unformatted_raw_string, testing, **kwargs):
+                     unformatted_raw_string, testing, timer=None, **kwargs):
         """
         Helper function: This initializes and runs the Command
         instance once the parser has identified it as either a normal
@@ -412,10 +510,10 @@ class CmdHandler:
             cmdset (CmdSet): Command sert the command belongs to (if any)..
             session (Connection): Connection of caller (if any).
             account (Account): Account of caller (if any).
+            timer (StageTimer, optional): Collects per-stage timings for this command.
 
         Returns:
-            deferred (Deferred): this will fire with the return of the
-                command's `func` method.
+            deferred (Deferred): Fires with the return of the command's `func` method.
 
         Raises:
             RuntimeError: If command recursion limit was reached.
@@ -423,6 +521,10 @@ class CmdHandler:
         """
         global _COMMAND_NESTING
 
+        # The same Command instance can be matched by several callers (channel aliases are
+        # shared between everyone with the same subscriptions) and can outlive this call
+        # while waiting on a Deferred, so every call assigns its state to its own copy.
+        cmd = copy(cmd)
         try:
             # Assign useful variables to the instance
             cmd.caller = caller
@@ -447,7 +549,7 @@ class CmdHandler:
 
             if testing:
                 # only return the command instance
-                returnValue(cmd)
+                return cmd
 
             # assign custom kwargs to found cmd object
             for key, val in kwargs.items():
@@ -464,12 +566,16 @@ class CmdHandler:
 
             # pre-command hook
             abort = yield cmd.at_pre_cmd()
+            if timer:
+                timer.mark("pre")
             if abort:
                 # abort sequence
-                returnValue(abort)
+                return abort
 
             # Parse and execute
             yield cmd.parse()
+            if timer:
+                timer.mark("parse")
 
             # main command code
             # (return value is normally None)
@@ -480,9 +586,13 @@ class CmdHandler:
                 yield None
             else:
                 ret = yield ret
+            if timer:
+                timer.mark("func")
 
             # post-command hook
             yield cmd.at_post_cmd()
+            if timer:
+                timer.mark("post")
 
             if cmd.save_for_next:
                 # store a reference to this command, possibly
@@ -492,7 +602,7 @@ class CmdHandler:
                 caller.ndb.last_cmd = None
 
             # return result to the deferred
-            returnValue(ret)
+            return ret
 
         except InterruptCommand:
             # Do nothing, clean exit
@@ -502,6 +612,36 @@ class CmdHandler:
             raise ErrorReported(raw_string)
         finally:
             _COMMAND_NESTING[caller] -= 1
+            if timer and not testing:
+                self._record_timings(caller, cmd, unformatted_raw_string, timer)
+
+    def _record_timings(self, caller, cmd, raw_string, timer):
+        """
+        Record a finished command's stage timings into the 'command' metrics, keyed by the
+        command's class, and log it if it was slower than SLOW_COMMAND_THRESHOLD. If the
+        command was sampled for tracing, the trace is finished here too.
+
+        Args:
+            caller (cmdobj): Who ran the command.
+            cmd (Command): The command that ran.
+            raw_string (str): The input, as entered.
+            timer (StageTimer or Trace): The timings.
+        """
+        try:
+            cmd_path = f"{cmd.__class__.__module__}.{cmd.__class__.__name__}"
+            if isinstance(timer, Trace):
+                TRACER.finish(timer, caller, cmd_path)
+            if not _COMMAND_TIMING:
+                return
+            for stage, duration in timer.stages.items():
+                METRICS.observe("command", (cmd_path, stage), duration)
+            total = timer.total
+            METRICS.observe("command", (cmd_path, "total"), total)
+            if _SLOW_COMMAND_THRESHOLD and total >= _SLOW_COMMAND_THRESHOLD:
+                logger.log_warn(f"Slow command {cmd_path} ({total * 1000:.1f}ms) by {caller}: "
+                                f"'{raw_string}' - {timer.breakdown()}")
+        except Exception:
+            logger.log_trace()
 
     def sort_cmdobjects(self, cmdobjects):
         return sorted([val for key, val in cmdobjects.items() if val], key=lambda obj: obj._cmd_sort)
@@ -524,8 +664,35 @@ class CmdHandler:
             session = self.session
         return {'session': session}
 
+    @fast_inline_callbacks
+    def execute_batch(self, raw_strings, session=None, **kwargs):
+        """
+        Execute several command strings in order, such as a line of input split on
+        INPUT_COMMAND_SEPARATOR.
+
+        Each command runs exactly as it would through execute(). They still gather their
+        cmdsets one at a time, so anything the previous one changed is seen, but unless
+        it changed a cmdset they all get the same merge back from CMDSET_MERGE_CACHE. If
+        one has to wait on a Deferred, the rest wait with it.
+
+        Args:
+            raw_strings (list of str): The command strings.
+            session (Connection, optional): As for execute().
+
+        Kwargs:
+            kwargs (any): Passed on to execute().
+
+        Returns:
+            deferred (Deferred): Fires with the return values of execute(), in order.
+        """
+        results = list()
+        for raw_string in raw_strings:
+            ret = yield self.execute(raw_string, session=session, **kwargs)
+            results.append(ret)
+        return results
+
     # Main command-handler function
-    @inlineCallbacks
+    @fast_inline_callbacks
     def execute(self, raw_string, testing=False, cmdclass=None, cmdclass_key=None, error_to=None, session=None, **kwargs):
         """
         This is the main mechanism that handles any string sent to the engine.
@@ -560,21 +727,21 @@ class CmdHandler:
                 special operating conditions for a command as it executes.
 
         Returns:
-            deferred (Deferred): This deferred is fired with the return
-            value of the command's `func` method.  This is not used in
-            default Evennia.
+            deferred (Deferred): Fires with the return value of the command's `func` method.
+            This has already fired unless a hook returned a Deferred that had not fired yet.
+            This is not used in default Evennia.
 
         """
         cmdobjects = self.get_cmdobjects(session)
+        # a sampled Trace is also a StageTimer, so it rides along the same marks.
+        timer = TRACER.sample(raw_string) if TRACER.rate else None
+        if timer is None and _COMMAND_TIMING:
+            timer = StageTimer()
 
         # The first element in this list will probably be a ServerConnection. The last, in default Evennia,
         # would be a Connection, Account, or Puppet. The 'last' is used for Error reporting, to preserve
         # character mirroring.
         ordered_objects = self.sort_cmdobjects(cmdobjects)
-        for obj in ordered_objects:
-            print(obj.cmdset)
-            print(obj.cmdset_storage)
-        print(f"ORDERED: {ordered_objects}")
         if error_to is None:
             error_to = self.error_cmdobjects(ordered_objects)
             if error_to is None:
@@ -600,12 +767,13 @@ class CmdHandler:
                 else:
                     # no explicit cmdobject given, figure it out
                     cmdset = yield self.get_and_merge_cmdsets(
-                        caller, ordered_objects, raw_string, error_to
+                        caller, ordered_objects, raw_string, error_to, timer=timer
                     )
                     if not cmdset:
                         # this is bad and shouldn't happen.
                         raise NoCmdSets
-                    print(f"MERGGED CMDSET: {cmdset}")
+                    if timer:
+                        timer.mark("merge")
                     # store the completely unmodified raw string - including
                     # whitespace and eventual prefixes-to-be-stripped.
                     unformatted_raw_string = raw_string
@@ -619,6 +787,8 @@ class CmdHandler:
                     # This also checks for permissions, so all commands in match
                     # are commands the caller is allowed to call.
                     matches = yield _COMMAND_PARSER(raw_string, cmdset, caller)
+                    if timer:
+                        timer.mark("match")
                     # Deal with matches
 
                     if len(matches) > 1:
@@ -650,18 +820,15 @@ class CmdHandler:
                         else:
                             # fallback to default error text
                             sysarg = _("Command '%s' is not available.") % raw_string
-                            suggestions = string_suggestions(
-                                raw_string,
-                                cmdset.get_all_cmd_keys_and_aliases(caller),
-                                cutoff=0.7,
-                                maxnum=3,
-                            )
+                            suggestions = _SUGGESTIONS(raw_string, cmdset, caller, cutoff=0.7, maxnum=3)
                             if suggestions:
                                 sysarg += _(" Maybe you meant %s?") % utils.list_to_string(
                                     suggestions, _("or"), addquote=True
                                 )
                             else:
                                 sysarg += _(' Type "help" for help.')
+                            if timer:
+                                timer.mark("suggest")
                         raise ExecSystemCommand(syscmd, sysarg)
 
                     # Check if this is a Channel-cmd match.
@@ -675,11 +842,10 @@ class CmdHandler:
                         cmd.session = session
                         sysarg = "%s:%s" % (cmdname, args)
                         raise ExecSystemCommand(cmd, sysarg)
-                print(f"CMD FOUND: {cmd}")
                 # A normal command.
                 ret = yield self._run_command(caller, cmd, cmdname, args, raw_cmdname, cmdset, cmdobjects, raw_string,
-                                              unformatted_raw_string, testing, **kwargs)
-                returnValue(ret)
+                                              unformatted_raw_string, testing, timer=timer, **kwargs)
+                return ret
 
             except ErrorReported as exc:
                 # this error was already reported, so we
@@ -695,9 +861,9 @@ class CmdHandler:
                 if syscmd:
                     ret = yield self._run_command(
                         caller, syscmd, syscmd.key, sysarg, unformatted_raw_string, cmdset, cmdobjects, raw_string,
-                                              unformatted_raw_string, testing, **kwargs
+                                              unformatted_raw_string, testing, timer=timer, **kwargs
                     )
-                    returnValue(ret)
+                    return ret
                 elif sysarg:
                     # return system arg
                     error_to.msg(exc.sysarg)
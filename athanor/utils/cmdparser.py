@@ -0,0 +1,286 @@
+"""
+Command parser
+
+Replacement for Evennia's cmdparser. Instead of scanning every key and alias of the merged
+cmdset for each line of input, the cmdset carries a CmdPrefixTrie built the first time it
+is matched against. Since merged cmdsets are cached by the CmdHandler, the trie is built
+once per merge and matching costs O(len(input)) no matter how large the cmdset is.
+
+Match results (and their order) are identical to evennia.commands.cmdparser.cmdparser.
+
+The merged cmdset also carries a CmdSuggestionIndex, built the first time input fails to
+match, which produces the "Maybe you meant" suggestions.
+"""
+from math import sqrt
+
+from django.conf import settings
+
+from evennia.commands.cmdparser import create_match, try_num_prefixes
+from evennia.utils.logger import log_trace
+from evennia.utils.utils import string_suggestions
+
+_CMD_IGNORE_PREFIXES = settings.CMD_IGNORE_PREFIXES
+
+
+class CmdPrefixTrie:
+    """
+    A character trie over the lower-cased keys and aliases of a cmdset.
+
+    Two tries are kept: one over the names as written, and one over names with
+    CMD_IGNORE_PREFIXES stripped (such as the @ or + on AthanorCommand keys). Each entry
+    remembers its position in the cmdset so results come out in the same order a linear
+    scan would produce.
+    """
+
+    def __init__(self, cmdset):
+        self.version = getattr(cmdset, "version", 0)
+        self.size = len(cmdset.commands)
+        self.full = (dict(), list())
+        self.stripped = (dict(), list())
+        sequence = 0
+        for cmd in cmdset:
+            for raw_cmdname in [cmd.key] + cmd.aliases:
+                sequence += 1
+                if not raw_cmdname:
+                    continue
+                self.insert(self.full, raw_cmdname, (sequence, raw_cmdname, raw_cmdname, cmd))
+                if not _CMD_IGNORE_PREFIXES:
+                    continue
+                cmdname = raw_cmdname.lstrip(_CMD_IGNORE_PREFIXES) if len(raw_cmdname) > 1 else raw_cmdname
+                if cmdname:
+                    self.insert(self.stripped, cmdname, (sequence, cmdname, raw_cmdname, cmd))
+
+    def is_current(self, cmdset):
+        return self.version == getattr(cmdset, "version", 0) and self.size == len(cmdset.commands)
+
+    @staticmethod
+    def insert(root, name, entry):
+        node = root
+        for char in name.lower():
+            node = node[0].setdefault(char, (dict(), list()))
+        node[1].append(entry)
+
+    @staticmethod
+    def walk(root, l_raw_string):
+        """
+        Yield every entry whose name is a prefix of the given lower-cased string.
+        """
+        node = root
+        for char in l_raw_string:
+            if (node := node[0].get(char, None)) is None:
+                return
+            yield from node[1]
+
+    def build_matches(self, raw_string, include_prefixes=False):
+        """
+        Trie-backed equivalent of evennia.commands.cmdparser.build_matches.
+
+        Args:
+            raw_string (str): The input string.
+            include_prefixes (bool): If False, CMD_IGNORE_PREFIXES are stripped from both
+                the input and the command names before matching.
+
+        Returns:
+            matches (list): Match tuples as made by create_match().
+        """
+        if include_prefixes:
+            root = self.full
+        else:
+            root = self.stripped
+            raw_string = raw_string.lstrip(_CMD_IGNORE_PREFIXES) if len(raw_string) > 1 else raw_string
+        l_raw_string = raw_string.lower()
+        found = list()
+        for sequence, cmdname, raw_cmdname, cmd in self.walk(root, l_raw_string):
+            if not cmd.arg_regex or cmd.arg_regex.match(l_raw_string[len(cmdname):]):
+                found.append((sequence, cmdname, raw_cmdname, cmd))
+        found.sort(key=lambda entry: entry[0])
+        return [create_match(cmdname, raw_string, cmd, raw_cmdname) for _, cmdname, raw_cmdname, cmd in found]
+
+
+def get_prefix_trie(cmdset):
+    """
+    Retrieve the CmdPrefixTrie of a cmdset, building it if it is missing or stale.
+    """
+    trie = getattr(cmdset, "prefix_trie", None)
+    if trie is None or not trie.is_current(cmdset):
+        trie = CmdPrefixTrie(cmdset)
+        cmdset.prefix_trie = trie
+    return trie
+
+
+class CmdSuggestionIndex:
+    """
+    An inverted character index over the keys and aliases of a cmdset.
+
+    evennia.utils.utils.string_suggestions scores every name by the cosine similarity of
+    its character counts with the input. A name sharing no characters with the input
+    scores 0, so only names reached through the index for the input's characters need
+    scoring. Scores are computed exactly as string_similarity() does, so the suggestions
+    (and their order) are the same.
+
+    Access checks only happen for names that pass the cutoff, at most once per command
+    per call.
+    """
+
+    def __init__(self, cmdset):
+        self.version = getattr(cmdset, "version", 0)
+        self.size = len(cmdset.commands)
+        self.commands = list(cmdset.commands)
+        self.names = list()
+        self.norms = list()
+        self.chars = dict()
+        for cmd_index, cmd in enumerate(self.commands):
+            for name in cmd._keyaliases:
+                position = len(self.names)
+                self.names.append((name, cmd_index))
+                counts = dict()
+                for char in name:
+                    counts[char] = counts.get(char, 0) + 1
+                self.norms.append(sqrt(sum(count * count for count in counts.values())))
+                for char, count in counts.items():
+                    self.chars.setdefault(char, list()).append((position, count))
+
+    def is_current(self, cmdset):
+        return self.version == getattr(cmdset, "version", 0) and self.size == len(cmdset.commands)
+
+    def suggest(self, string, caller=None, cutoff=0.6, maxnum=3):
+        """
+        Indexed equivalent of string_suggestions(string, cmdset.get_all_cmd_keys_and_aliases(caller)).
+
+        Args:
+            string (str): The unmatched input.
+            caller (Session, Account or Object, optional): Only suggest what this may use.
+            cutoff (float): Minimum similarity, above 0.
+            maxnum (int): Maximum number of suggestions.
+
+        Returns:
+            suggestions (list): Names, best first.
+        """
+        counts = dict()
+        for char in string:
+            counts[char] = counts.get(char, 0) + 1
+        if not counts:
+            # string_similarity() scores an empty string 0 against everything.
+            return list()
+        query_norm = sqrt(sum(count * count for count in counts.values()))
+        dots = dict()
+        for char, count in counts.items():
+            for position, name_count in self.chars.get(char, ()):
+                dots[position] = dots.get(position, 0) + count * name_count
+        scored = list()
+        for position, dot in dots.items():
+            if (score := float(dot) / (query_norm * self.norms[position])) >= cutoff:
+                scored.append((-score, position))
+        scored.sort()
+        suggestions = list()
+        checked = dict()
+        for _, position in scored:
+            name, cmd_index = self.names[position]
+            if caller:
+                if (allowed := checked.get(cmd_index, None)) is None:
+                    allowed = checked[cmd_index] = bool(self.commands[cmd_index].access(caller))
+                if not allowed:
+                    continue
+            suggestions.append(name)
+            if len(suggestions) >= maxnum:
+                break
+        return suggestions
+
+
+def get_suggestion_index(cmdset):
+    """
+    Retrieve the CmdSuggestionIndex of a cmdset, building it if it is missing or stale.
+    """
+    index = getattr(cmdset, "suggestion_index", None)
+    if index is None or not index.is_current(cmdset):
+        index = CmdSuggestionIndex(cmdset)
+        cmdset.suggestion_index = index
+    return index
+
+
+def suggestions(raw_string, cmdset, caller, cutoff=0.7, maxnum=3):
+    """
+    Suggest the keys and aliases of the cmdset most similar to input that matched nothing.
+    """
+    if cutoff <= 0:
+        # everything qualifies, even names sharing no characters; the index can't help.
+        return string_suggestions(raw_string, cmdset.get_all_cmd_keys_and_aliases(caller),
+                                  cutoff=cutoff, maxnum=maxnum)
+    return get_suggestion_index(cmdset).suggest(raw_string, caller, cutoff=cutoff, maxnum=maxnum)
+
+
+def build_matches(raw_string, cmdset, include_prefixes=False):
+    try:
+        return get_prefix_trie(cmdset).build_matches(raw_string, include_prefixes=include_prefixes)
+    except Exception:
+        log_trace("cmdhandler error. raw_input:%s" % raw_string)
+    return []
+
+
+def cmdparser(raw_string, cmdset, caller, match_index=None):
+    """
+    This function is called by the cmdhandler once it has
+    gathered and merged all valid cmdsets valid for this particular parsing.
+
+    Args:
+        raw_string (str): The unparsed text entered by the caller.
+        cmdset (CmdSet): The merged, currently valid cmdset
+        caller (Session, Account or Object): The caller triggering this parsing.
+        match_index (int, optional): Index to pick a given match in a
+            list of same-named command matches. If this is given, it suggests
+            this is not the first time this function was called: normally
+            the first run resulted in a multimatch, and the index is given
+            to select between the results for the second run.
+
+    Returns:
+        matches (list): This is a list of match-tuples as returned by `create_match`.
+            If no matches were found, this is an empty list.
+    """
+    if not raw_string:
+        return []
+
+    # find matches, first using the full name
+    matches = build_matches(raw_string, cmdset, include_prefixes=True)
+
+    if not matches:
+        # try to match a number 1-cmdname, 2-cmdname etc
+        mindex, new_raw_string = try_num_prefixes(raw_string)
+        if mindex is not None:
+            return cmdparser(new_raw_string, cmdset, caller, match_index=int(mindex))
+        if _CMD_IGNORE_PREFIXES:
+            # still no match. Try to strip prefixes
+            raw_string = raw_string.lstrip(_CMD_IGNORE_PREFIXES) if len(raw_string) > 1 else raw_string
+            matches = build_matches(raw_string, cmdset, include_prefixes=False)
+
+    # only select command matches we are actually allowed to call.
+    matches = [match for match in matches if match[2].access(caller, "cmd")]
+
+    # try to bring the number of matches down to 1
+    if len(matches) > 1:
+        # See if it helps to analyze the match with preserved case but only if
+        # it leaves at least one match.
+        trimmed = [match for match in matches if raw_string.startswith(match[0])]
+        if trimmed:
+            matches = trimmed
+
+    if len(matches) > 1:
+        # we still have multiple matches. Sort them by count quality.
+        matches = sorted(matches, key=lambda m: m[3])
+        # only pick the matches with highest count quality
+        quality = [mat[3] for mat in matches]
+        matches = matches[-quality.count(quality[-1]):]
+
+    if len(matches) > 1:
+        # still multiple matches. Fall back to ratio-based quality.
+        matches = sorted(matches, key=lambda m: m[4])
+        # only pick the highest rated ratio match
+        quality = [mat[4] for mat in matches]
+        matches = matches[-quality.count(quality[-1]):]
+
+    if len(matches) > 1 and match_index is not None and 0 < match_index <= len(matches):
+        # We couldn't separate match by quality, but we have an
+        # index argument to tell us which match to use.
+        matches = [matches[match_index - 1]]
+
+    # no matter what we have at this point, we have to return it.
+    return matches
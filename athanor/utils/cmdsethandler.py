@@ -1,7 +1,59 @@
 from evennia.commands.cmdsethandler import CmdSetHandler
 
+from athanor.utils.cmdhandler import CMDSET_MERGE_CACHE
+
 
 class AthanorCmdSetHandler(CmdSetHandler):
+    """
+    CmdSetHandler that keeps a version counter of its stack. Any change to the stack bumps
+    the version and invalidates merged cmdsets that this handler contributed to.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.version = 0
+        super().__init__(*args, **kwargs)
+
+    def invalidate(self):
+        """
+        Bump the stack version and drop all cached merges this handler took part in.
+        Call this whenever something gather() returns changes.
+        """
+        self.version += 1
+        CMDSET_MERGE_CACHE.invalidate(self)
+
+    def update(self, *args, **kwargs):
+        try:
+            return super().update(*args, **kwargs)
+        finally:
+            self.invalidate()
+
+    def add(self, *args, **kwargs):
+        try:
+            return super().add(*args, **kwargs)
+        finally:
+            self.invalidate()
+
+    def remove(self, *args, **kwargs):
+        try:
+            return super().remove(*args, **kwargs)
+        finally:
+            self.invalidate()
+
+    delete = remove
+
+    def remove_default(self, *args, **kwargs):
+        try:
+            return super().remove_default(*args, **kwargs)
+        finally:
+            self.invalidate()
+
+    delete_default = remove_default
+
+    def clear(self, *args, **kwargs):
+        try:
+            return super().clear(*args, **kwargs)
+        finally:
+            self.invalidate()
 
     def gather(self, caller, merged_current):
         """
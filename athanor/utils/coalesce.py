@@ -0,0 +1,103 @@
+"""
+Coalescing of fanout output.
+
+Channel broadcasts, TemplateMessages and system messages each call msg() once per line
+per recipient, and every one of those calls makes its own trip through the session
+handler and the AMP connection to the Portal. OutputCoalescer buffers such output per
+recipient until the end of the current reactor tick, then sends each recipient all of
+it in one msg() call.
+
+Buffered lines are joined with newlines. Only lines sent with the same extra msg()
+keywords are joined. The 'text' and 'original_text' keywords are joined and all other
+keywords must match, so a line with different keywords starts a new send.
+
+A recipient's buffer is flushed early once it holds OUTPUT_COALESCE_MAX characters.
+Anything sent with immediate=True, or with a prompt, flushes the buffer first and then
+goes out at once, so it can never arrive before earlier output. So does anything sent
+straight to msg() of a typeclass using HasCoalescedOutput.
+
+Order is only kept per target. A player's Account, Sessions and puppets each have their
+own buffer, so output sent to one of them can still arrive before output buffered
+earlier for another, such as a direct Session.msg() overtaking lines buffered for the
+Account.
+"""
+from django.conf import settings
+from twisted.internet import reactor
+from twisted.python.threadable import isInIOThread
+
+from evennia.utils import logger
+
+from athanor.utils.metrics import METRICS
+
+
+class OutputCoalescer:
+    # msg() keywords whose values are joined instead of having to match.
+    joined = ('text', 'original_text')
+
+    def __init__(self, enabled=True, max_size=4096):
+        self.enabled = enabled
+        self.max_size = max_size
+        self.buffers = dict()
+        self.sizes = dict()
+        self.scheduled = None
+
+    def send(self, target, text=None, immediate=False, **kwargs):
+        """
+        Send output to a target at the end of this reactor tick.
+
+        Args:
+            target (Account, Object or ServerSession): Anything with msg().
+            text (str): The output.
+            immediate (bool): Send now, after anything already buffered for target.
+            **kwargs: Passed on to target.msg().
+        """
+        if not isInIOThread():
+            reactor.callFromThread(self.send, target, text, immediate=immediate, **kwargs)
+            return
+        if not self.enabled:
+            target.msg(text=text, **kwargs)
+            return
+        if immediate or 'prompt' in kwargs or not isinstance(text, str):
+            self.flush_target(target)
+            target.msg(text=text, **kwargs)
+            return
+        METRICS.incr("output", "buffered")
+        kwargs['text'] = text
+        pending = self.buffers.setdefault(target, list())
+        if pending and self.mergeable(pending[-1], kwargs):
+            for key in self.joined:
+                if key in kwargs:
+                    pending[-1][key] = f"{pending[-1][key]}\n{kwargs[key]}"
+        else:
+            pending.append(kwargs)
+        self.sizes[target] = self.sizes.get(target, 0) + len(text)
+        if self.sizes[target] >= self.max_size:
+            self.flush_target(target)
+        elif self.scheduled is None:
+            self.scheduled = reactor.callLater(0, self.flush)
+
+    def mergeable(self, previous, current):
+        if previous.keys() != current.keys():
+            return False
+        return all(isinstance(value, str) and isinstance(previous[key], str) if key in self.joined
+                   else previous[key] == value for key, value in current.items())
+
+    def flush_target(self, target):
+        if target not in self.buffers:
+            return
+        self.sizes.pop(target, None)
+        # popped before sending, so msg() flushing again finds nothing.
+        for kwargs in self.buffers.pop(target):
+            METRICS.incr("output", "sent")
+            target.msg(**kwargs)
+
+    def flush(self):
+        self.scheduled = None
+        for target in list(self.buffers.keys()):
+            try:
+                self.flush_target(target)
+            except Exception:
+                logger.log_trace()
+
+
+OUTPUT = OutputCoalescer(enabled=settings.OUTPUT_COALESCE, max_size=settings.OUTPUT_COALESCE_MAX)
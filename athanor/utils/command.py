@@ -7,6 +7,47 @@ import athanor
 from athanor.utils.text import partial_match
 
 
+class SwitchTable:
+    """
+    Maps every prefix of a command's switch_options to the switch it selects.
+
+    Options are entered shortest first and a prefix keeps the first option it was seen
+    for, so lookups give exactly what partial_match() would: the shortest option that
+    starts with the text, the earliest listed among equal lengths.
+    """
+    __slots__ = ("source", "options", "prefixes")
+
+    def __init__(self, cmd_class, source):
+        self.source = source
+        self.options = tuple(opt.lower() for raw in (source or ()) if (opt := raw.strip()))
+        self.prefixes = dict()
+        for option in sorted(self.options, key=len):
+            entry = (option, getattr(cmd_class, f"switch_{option}", None))
+            for end in range(1, len(option) + 1):
+                self.prefixes.setdefault(option[:end], entry)
+
+    def get(self, text):
+        """
+        Returns:
+            entry (tuple or None): (switch name, unbound switch_* method or None).
+        """
+        return self.prefixes.get(text.lower(), None)
+
+
+class Splitter:
+    """
+    Splits text on a delimiter, or on any of a list of delimiters.
+    """
+    __slots__ = ("delim", "split")
+
+    def __init__(self, delim):
+        self.delim = delim
+        if isinstance(delim, str):
+            self.split = lambda text: text.split(delim)
+        else:
+            self.split = re.compile('|'.join(re.escape(d) for d in delim)).split
+
+
 class AthanorCommand(MuxCommand):
     locks = 'cmd:all();admin:perm(Admin)'
     system_name = None
@@ -19,6 +60,9 @@ class AthanorCommand(MuxCommand):
     controller_key = None
     switch_options = []
 
+    # How many blocking calls of this command may run in COMMAND_THREADS at once.
+    thread_limit = 1
+
     @lazy_property
     def controller(self):
         return self.controllers.get(self.controller_key)
@@ -66,20 +110,67 @@ class AthanorCommand(MuxCommand):
     def switch_main(self):
         pass
 
+    def switch_table(self):
+        """
+        Retrieve the SwitchTable for this command's switch_options. It is built once per
+        class and kept in the class's own __dict__, so subclasses get their own. An
+        instance given its own switch_options gets an uncached table.
+        """
+        cmd_class = self.__class__
+        options = self.switch_options
+        if (table := cmd_class.__dict__.get('_switch_table', None)) is not None and table.source is options:
+            return table
+        table = SwitchTable(cmd_class, options)
+        if options is getattr(cmd_class, 'switch_options', None):
+            cmd_class._switch_table = table
+        return table
+
+    def splitter(self, thing):
+        """
+        Retrieve the Splitter for args_delim, lhs_delim or rhs_delim, cached per class.
+
+        Args:
+            thing (str): 'args', 'lhs' or 'rhs'.
+        """
+        cmd_class = self.__class__
+        delim = getattr(self, f"{thing}_delim")
+        if (splitters := cmd_class.__dict__.get('_splitters', None)) is None:
+            splitters = dict()
+            cmd_class._splitters = splitters
+        if (found := splitters.get(thing, None)) is not None and found.delim == delim:
+            return found
+        found = Splitter(delim)
+        if delim == getattr(cmd_class, f"{thing}_delim"):
+            splitters[thing] = found
+        return found
+
+    def select_switch(self):
+        """
+        Work out which switch_* method the entered switches call for.
+
+        Returns:
+            switch (str): The switch name, or 'main' if none was entered.
+            method (callable): The unbound switch_* method.
+
+        Raises:
+            ValueError: If the switches are invalid.
+        """
+        if not self.switches:
+            return 'main', self.__class__.switch_main
+        if len(self.switches) > 1:
+            raise ValueError(f"{self.key} does not support multiple simultaneous switches!")
+        if not (found := self.switch_table().get(self.switches[0])):
+            raise ValueError(f"{self.key} does not support switch '{self.switches[0]}`")
+        switch, method = found
+        if not method:
+            raise ValueError(f"Command does not support switch {switch}")
+        return switch, method
+
     def func(self):
         self.chosen_switch = None
         try:
-            if self.switches:
-                if len(self.switches) > 1:
-                    raise ValueError(f"{self.key} does not support multiple simultaneous switches!")
-                if not (switch := partial_match(self.switches[0], self.switch_options)):
-                    raise ValueError(f"{self.key} does not support switch '{self.switches[0]}`")
-                if not (found := getattr(self, f"switch_{switch}", None)):
-                    raise ValueError(f"Command does not support switch {switch}")
-                self.chosen_switch = switch
-                return found()
-            self.chosen_switch = 'main'
-            return self.switch_main()
+            self.chosen_switch, method = self.select_switch()
+            return method(self)
         except ValueError as err:
             self.msg(f"ERROR: {str(err)}")
             return
@@ -99,9 +190,9 @@ class AthanorCommand(MuxCommand):
         rhs_split is not used. It will always be an = for AthanorCommand.
 
         This method supports the following class property options:
-            lhs_delim (list of str): Used to generate .split() data from lhs args. results go to lhslist
-            rhs_delim (list of str): Used to generate .split() data from rhs args. results go to rhslist
-            args_delim (list of str): Used to generate .split() data from all args. results go to argslist
+            lhs_delim (str or list of str): Used to generate .split() data from lhs args. results go to lhslist
+            rhs_delim (str or list of str): Used to generate .split() data from rhs args. results go to rhslist
+            args_delim (str or list of str): Used to generate .split() data from all args. results go to argslist
 
         Returns:
             None
@@ -127,18 +218,16 @@ class AthanorCommand(MuxCommand):
 
         # Process all delimiters.
         for thing in ('args', 'lhs', 'rhs'):
-            delim = getattr(self, f"{thing}_delim")
             if (text := getattr(self, thing)) is not None:
-                setattr(self, f"{thing}list", [stripped for clean in text.split(delim) if (stripped := clean.strip())])
+                setattr(self, f"{thing}list", [stripped for clean in self.splitter(thing).split(text)
+                                               if (stripped := clean.strip())])
             else:
                 setattr(self, f"{thing}list", list())
 
         # split out switches, strip out empty switches, clean not-empty ones.
+        # They are matched against switch_options through switch_table(), which lower-cases them.
         self.switches = [switch.strip() for raw in self.parsed.get('switches', '').split('/') if (switch := raw.strip())]
 
-        if self.switch_options:
-            self.switch_options = [opt.lower() for raw in self.switch_options if (opt := raw.strip())]
-
         # if the class has the account_caller property set on itself, we make
         # sure that self.caller is always the account if possible. We also create
         # a special property "character" for the puppeted object, if any. This
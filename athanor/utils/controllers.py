@@ -1,22 +1,133 @@
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from functools import wraps
+from threading import RLock
+from time import perf_counter
+
 from django.conf import settings
+from django.db import connection
 
+from evennia.utils import logger
 from evennia.utils.logger import log_trace
 from evennia.utils.utils import class_from_module
+from athanor.utils.metrics import METRICS
 from athanor.utils.online import admin_accounts
 
 
 class ControllerManager:
+    """
+    Creates every controller in settings.CONTROLLERS, then warms them up.
+
+    Controllers (and their backends) may list the keys of other controllers in
+    `dependencies`. Warmups run in dependency order on the main thread. How long each took
+    is kept in load_times.
+
+    Typeclasses, the idmapper caches and Attribute/Tag handlers aren't thread-safe, so
+    only controllers with `load_in_thread` set, whose loading never touches the ORM, may
+    warm up in one of CONTROLLER_LOAD_THREADS worker threads, overlapping the rest.
+    """
 
     def __init__(self):
         self.loaded = False
         self.controllers = dict()
+        self.load_times = dict()
 
     def load(self):
         for controller_key, controller_def in settings.CONTROLLERS.items():
-            con_class = class_from_module(controller_def.get("class", settings.BASE_CONTROLLER_CLASS))
-            backend = class_from_module(controller_def.get('backend'))
-            self.controllers[controller_key] = con_class(controller_key, self, backend)
+            if isinstance(controller_def, str):
+                controller_def = {'class': controller_def}
+            try:
+                con_class = class_from_module(controller_def.get("class", settings.BASE_CONTROLLER_CLASS))
+                backend = class_from_module(controller_def.get('backend', settings.BASE_CONTROLLER_BACKEND_CLASS))
+                self.controllers[controller_key] = con_class(controller_key, self, backend)
+            except Exception:
+                log_trace(f"Could not create controller '{controller_key}'")
         self.loaded = True
+        self.warmup()
+
+    def dependency_graph(self):
+        """
+        Returns:
+            graph (dict): Each controller key to the set of controller keys it waits for.
+
+        Raises:
+            ValueError: If a dependency cycle exists.
+        """
+        graph = dict()
+        for key, controller in self.controllers.items():
+            wanted = set(controller.dependencies) | set(controller.backend.dependencies)
+            if (missing := wanted - set(self.controllers.keys())):
+                logger.log_warn(f"Controller '{key}' depends on unknown controllers: {', '.join(sorted(missing))}")
+            graph[key] = wanted & set(self.controllers.keys())
+
+        # Kahn's algorithm, only to detect cycles before anything starts.
+        remaining = {key: set(deps) for key, deps in graph.items()}
+        ready = [key for key, deps in remaining.items() if not deps]
+        while ready:
+            done = ready.pop()
+            for deps in remaining.values():
+                deps.discard(done)
+            del remaining[done]
+            ready.extend(key for key, deps in remaining.items() if not deps and key not in ready)
+        if remaining:
+            raise ValueError(f"Controller dependency cycle among: {', '.join(sorted(remaining.keys()))}")
+        return graph
+
+    def warmup(self):
+        """
+        Load every controller, respecting dependencies.
+        """
+        graph = self.dependency_graph()
+        started = perf_counter()
+        workers = max(1, settings.CONTROLLER_LOAD_THREADS)
+        if workers == 1:
+            self._warmup_serial(graph)
+        else:
+            self._warmup_parallel(graph, workers)
+        total = perf_counter() - started
+        report = ', '.join(f"{key}={duration * 1000:.0f}ms" for key, duration in
+                           sorted(self.load_times.items(), key=lambda item: item[1], reverse=True))
+        logger.log_info(f"Controllers loaded in {total * 1000:.0f}ms: {report}")
+
+    def _warmup_serial(self, graph):
+        done = set()
+        while len(done) < len(graph):
+            for key in [key for key, deps in graph.items() if key not in done and deps <= done]:
+                self._timed_load(key)
+                done.add(key)
+
+    def _warmup_parallel(self, graph, workers):
+        done, running = set(), dict()
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ControllerWarmup") as executor:
+            while len(done) < len(graph):
+                ready = [key for key, deps in graph.items()
+                         if key not in done and key not in running.values() and deps <= done]
+                for key in [key for key in ready if self.controllers[key].load_in_thread]:
+                    running[executor.submit(self._threaded_load, key)] = key
+                for key in [key for key in ready if not self.controllers[key].load_in_thread]:
+                    self._timed_load(key)
+                    done.add(key)
+                if not running:
+                    continue
+                finished, _ = wait(running.keys(), return_when=FIRST_COMPLETED)
+                for future in finished:
+                    done.add(running.pop(future))
+
+    def _threaded_load(self, key):
+        try:
+            self._timed_load(key)
+        finally:
+            # every worker thread opened its own connection; don't leak it.
+            connection.close()
+
+    def _timed_load(self, key):
+        started = perf_counter()
+        try:
+            self.controllers[key].load()
+        except Exception:
+            log_trace(f"Could not load controller '{key}'")
+        duration = perf_counter() - started
+        self.load_times[key] = duration
+        METRICS.gauge("controllers", key, duration)
 
     def get(self, con_key):
         if not self.loaded:
@@ -30,12 +141,77 @@ class ControllerManager:
 
 class AthanorController:
     system_name = None
+    # Keys of other controllers that must finish loading before this one starts.
+    dependencies = ()
+    # Set only if loading this controller and its backend never touches the ORM or
+    # typeclassed objects, so it may warm up in a worker thread.
+    load_in_thread = False
+    # Public methods that are plumbing rather than game operations, never instrumented.
+    uninstrumented = ('load', 'do_load', 'alert', 'msg_target', 'instrument', 'uninstrument')
 
     def __init__(self, key, manager, backend):
         self.key = key
         self.manager = manager
         self.loaded = False
+        self.load_lock = RLock()
+        self.instrumented = list()
         self.backend = backend(self)
+        if (wanted := settings.CONTROLLER_INSTRUMENTATION) is True or (wanted and key in wanted):
+            self.instrument()
+
+    def instrument(self):
+        """
+        Wrap every public method of this controller so each call records, under the
+        'controller' metrics group:
+            (key, method): A latency histogram.
+            (key, method, 'calls'): Number of calls.
+            (key, method, 'rejected'): Calls that raised ValueError, which is how
+                controllers refuse an operation.
+            (key, method, 'errors'): Calls that raised anything else.
+            (key, method, 'queries'): ORM queries run during calls, including those
+                of nested controller calls.
+        """
+        if self.instrumented:
+            return
+        for name in dir(self.__class__):
+            if name.startswith('_') or name in self.uninstrumented:
+                continue
+            # checked on the class so properties aren't evaluated.
+            if not callable(getattr(self.__class__, name, None)):
+                continue
+            setattr(self, name, self._instrumented(name, getattr(self, name)))
+            self.instrumented.append(name)
+
+    def uninstrument(self):
+        for name in self.instrumented:
+            delattr(self, name)
+        self.instrumented = list()
+
+    def _instrumented(self, name, method):
+        key = (self.key, name)
+        calls, rejected, errors, queries = (self.key, name, 'calls'), (self.key, name, 'rejected'), \
+                                           (self.key, name, 'errors'), (self.key, name, 'queries')
+
+        def count_query(execute, sql, params, many, context):
+            METRICS.incr("controller", queries)
+            return execute(sql, params, many, context)
+
+        @wraps(method)
+        def wrapper(*args, **kwargs):
+            started = perf_counter()
+            try:
+                with connection.execute_wrapper(count_query):
+                    return method(*args, **kwargs)
+            except ValueError:
+                METRICS.incr("controller", rejected)
+                raise
+            except Exception:
+                METRICS.incr("controller", errors)
+                raise
+            finally:
+                METRICS.incr("controller", calls)
+                METRICS.observe("controller", key, perf_counter() - started)
+        return wrapper
 
     def alert(self, message, enactor=None):
         for acc in admin_accounts():
@@ -46,15 +222,19 @@ class AthanorController:
 
     def load(self):
         """
-        This is a wrapper around do_load that prevents it from being called twice.
+        This is a wrapper around do_load that prevents it from being called twice. The
+        backend is loaded first.
 
         Returns:
             None
         """
-        if self.loaded:
-            return
-        self.do_load()
-        self.loaded = True
+        # Some controllers warm up in worker threads. A get() from another thread waits here.
+        with self.load_lock:
+            if self.loaded:
+                return
+            self.backend.load()
+            self.do_load()
+            self.loaded = True
 
     def do_load(self):
         """
@@ -65,6 +245,8 @@ class AthanorController:
 
 class AthanorControllerBackend:
     typeclass_defs = list()
+    # Keys of controllers whose loading this backend needs, on top of the frontend's.
+    dependencies = ()
 
     def __init__(self, frontend):
         self.frontend = frontend
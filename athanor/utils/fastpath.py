@@ -0,0 +1,127 @@
+"""
+A synchronous fast path for inlineCallbacks-style generators.
+
+Twisted's inlineCallbacks allocates a Deferred for every call and routes every yielded
+value through it, even when nothing ever waits. The command pipeline yields plain values
+far more often than Deferreds, so it uses maybe_inline_callbacks instead: the generator is
+run to completion synchronously and only falls back to Deferred machinery if a yielded
+value is a Deferred that has not fired yet.
+
+maybe_inline_callbacks may return a plain value, so it is only meant for internal steps of
+the pipeline. Entry points that promise a Deferred, like CmdHandler.execute(), use
+fast_inline_callbacks, which runs the same way but always returns a Deferred.
+
+Unlike inlineCallbacks, returnValue() is not supported. Use return.
+"""
+from functools import wraps
+from types import GeneratorType
+
+from twisted.internet.defer import Deferred, succeed, fail
+from twisted.python.failure import Failure
+
+
+def maybe_inline_callbacks(f):
+    """
+    Decorator that works like twisted's inlineCallbacks, with one difference: if the
+    generator finishes without ever waiting on an un-fired Deferred, the decorated
+    function returns its result directly (or raises its exception directly) instead of
+    returning a Deferred.
+
+    Callers that need a Deferred either way should use fast_inline_callbacks instead.
+    Generators decorated with this may freely yield the results of one another; nested
+    calls stay synchronous until something genuinely has to wait.
+
+    Args:
+        f (callable): A generator function.
+
+    Returns:
+        wrapper (callable): Returns a plain value or a Deferred.
+    """
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        gen = f(*args, **kwargs)
+        if not isinstance(gen, GeneratorType):
+            return gen
+        return _drive(gen, None, None)
+    return wrapper
+
+
+def fast_inline_callbacks(f):
+    """
+    Decorator that runs a generator like maybe_inline_callbacks, but always returns a
+    Deferred, as inlineCallbacks does. If the generator finished synchronously, the
+    Deferred has already fired with its result or its exception.
+
+    Args:
+        f (callable): A generator function.
+
+    Returns:
+        wrapper (callable): Returns a Deferred.
+    """
+    run = maybe_inline_callbacks(f)
+
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        try:
+            result = run(*args, **kwargs)
+        except Exception:
+            return fail()
+        if isinstance(result, Deferred):
+            return result
+        return succeed(result)
+    return wrapper
+
+
+def _drive(gen, result, deferred):
+    """
+    Step the generator until it finishes or blocks on an un-fired Deferred.
+
+    Args:
+        gen (GeneratorType): The generator being driven.
+        result (any): The value (or Failure) to send into the generator next.
+        deferred (Deferred or None): The Deferred handed to our caller, if we have
+            already fallen back to asynchronous operation.
+
+    Returns:
+        The generator's return value if still synchronous, otherwise `deferred`.
+    """
+    while True:
+        try:
+            if isinstance(result, Failure):
+                result = result.throwExceptionIntoGenerator(gen)
+            else:
+                result = gen.send(result)
+        except StopIteration as stop:
+            if deferred is None:
+                return stop.value
+            deferred.callback(stop.value)
+            return deferred
+        except Exception:
+            if deferred is None:
+                raise
+            deferred.errback()
+            return deferred
+
+        if not isinstance(result, Deferred):
+            continue
+
+        # waiting[0] is True until we either got the result synchronously or gave up
+        # waiting for it; waiting[1] holds a result that arrived synchronously.
+        waiting = [True, None]
+
+        def got_result(value):
+            if waiting[0]:
+                waiting[0] = False
+                waiting[1] = value
+            else:
+                _drive(gen, value, deferred)
+
+        result.addBoth(got_result)
+        if waiting[0]:
+            # Nothing yet. Hand a Deferred to our caller and resume later.
+            waiting[0] = False
+            if deferred is None:
+                deferred = Deferred()
+            return deferred
+
+        result = waiting[1]
@@ -1,3 +1,4 @@
+from athanor.utils.coalesce import OUTPUT
 from athanor.utils.online import admin_accounts
 from evennia.utils.utils import make_iter, time_format
 import athanor
@@ -80,7 +81,7 @@ class TemplateMessage(object):
         if hasattr(entity, 'receive_template_message'):
             entity.receive_template_message(text=text, msgobj=self, target=target)
         if hasattr(entity, 'msg'):
-            entity.msg(text)
+            OUTPUT.send(entity, text)
 
     def generate_perspective(self, viewer):
         packvars = dict(self.extra)
@@ -0,0 +1,170 @@
+"""
+Lightweight in-process metrics.
+
+Histograms use fixed buckets so recording a value is a bisect and two additions, cheap
+enough to do for every command. Percentiles are estimated from the buckets.
+
+Everything is recorded into the METRICS registry, grouped by subsystem (for example
+'command'), where admin commands can read it back.
+"""
+from bisect import bisect_left
+from collections import defaultdict
+from time import perf_counter
+
+# Bucket upper bounds, in seconds.
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+                   2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """
+    A fixed-bucket histogram of durations.
+    """
+    __slots__ = ("buckets", "counts", "count", "total", "max")
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, pct):
+        """
+        Estimate a percentile.
+
+        Args:
+            pct (float): The percentile, from 0 to 100.
+
+        Returns:
+            value (float): The upper bound of the bucket holding that percentile. Values
+                beyond the last bucket report the largest value seen.
+        """
+        if not self.count:
+            return 0.0
+        threshold = self.count * pct / 100.0
+        running = 0
+        for index, bucket_count in enumerate(self.counts):
+            running += bucket_count
+            if running >= threshold and bucket_count:
+                if index >= len(self.buckets):
+                    return self.max
+                return min(self.buckets[index], self.max)
+        return self.max
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+
+class MetricRegistry:
+    """
+    Holds histograms, counters and gauges, grouped by subsystem.
+    """
+
+    def __init__(self):
+        self.histograms = defaultdict(dict)
+        self.counters = defaultdict(lambda: defaultdict(int))
+        self.gauges = defaultdict(dict)
+
+    def histogram(self, group, key):
+        """
+        Retrieve a histogram, creating it if it does not exist.
+
+        Args:
+            group (str): The subsystem, such as 'command'.
+            key (hashable): What is being measured within the group.
+
+        Returns:
+            Histogram
+        """
+        if (found := self.histograms[group].get(key, None)) is None:
+            found = Histogram()
+            self.histograms[group][key] = found
+        return found
+
+    def observe(self, group, key, value):
+        self.histogram(group, key).record(value)
+
+    def incr(self, group, key, amount=1):
+        self.counters[group][key] += amount
+
+    def gauge(self, group, key, value):
+        self.gauges[group][key] = value
+
+    def reset(self, group=None):
+        if group is None:
+            self.histograms.clear()
+            self.counters.clear()
+            self.gauges.clear()
+            return
+        self.histograms.pop(group, None)
+        self.counters.pop(group, None)
+        self.gauges.pop(group, None)
+
+    def export_text(self, group=None):
+        """
+        Render metrics as plain text, one per line, for saving or diffing between runs.
+        Tuple keys are joined with '/'. Durations are in milliseconds.
+
+        Args:
+            group (str, optional): Only export this group.
+
+        Returns:
+            text (str)
+        """
+        def name(key):
+            return '/'.join(str(part) for part in key) if isinstance(key, tuple) else str(key)
+
+        groups = [group] if group else sorted(set(self.histograms) | set(self.counters) | set(self.gauges))
+        lines = list()
+        for found in groups:
+            for key, histogram in sorted(self.histograms.get(found, dict()).items(), key=lambda item: name(item[0])):
+                lines.append(f"{found} {name(key)} count={histogram.count} mean={histogram.mean * 1000:.3f} "
+                             f"p50={histogram.percentile(50) * 1000:.3f} p95={histogram.percentile(95) * 1000:.3f} "
+                             f"p99={histogram.percentile(99) * 1000:.3f} max={histogram.max * 1000:.3f}")
+            for key, value in sorted(self.counters.get(found, dict()).items(), key=lambda item: name(item[0])):
+                lines.append(f"{found} {name(key)} {value}")
+            for key, value in sorted(self.gauges.get(found, dict()).items(), key=lambda item: name(item[0])):
+                lines.append(f"{found} {name(key)} {value}")
+        return '\n'.join(lines)
+
+
+METRICS = MetricRegistry()
+
+
+class StageTimer:
+    """
+    Splits the wall time of an operation into named stages.
+
+    Call mark(stage) at the end of every stage. Time since the previous mark (or creation)
+    is added to that stage.
+    """
+    __slots__ = ("start", "last", "stages")
+
+    def __init__(self):
+        self.start = self.last = perf_counter()
+        self.stages = dict()
+
+    def mark(self, stage):
+        now = perf_counter()
+        self.stages[stage] = self.stages.get(stage, 0.0) + (now - self.last)
+        self.last = now
+
+    @property
+    def total(self):
+        return self.last - self.start
+
+    def breakdown(self):
+        """
+        Returns:
+            text (str): The stages and their durations in milliseconds.
+        """
+        return ' '.join(f"{stage}={duration * 1000:.1f}ms" for stage, duration in self.stages.items())
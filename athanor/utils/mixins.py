@@ -1,10 +1,13 @@
 from django.conf import settings
+from twisted.python.threadable import isInIOThread
 
 from evennia.locks.lockhandler import LockHandler
 from evennia.utils.utils import lazy_property
 from evennia.commands.cmdsethandler import CmdSetHandler
 from evennia.utils.optionhandler import OptionHandler
 
+from athanor.utils.coalesce import OUTPUT
+
 
 _PERMISSION_HIERARCHY = [p.lower() for p in settings.PERMISSION_HIERARCHY]
 
@@ -210,9 +213,22 @@ class HasOps(HasAttributeGetCreate):
     def gt_position(self, check, against):
         return self.access_hierarchy.index(check) > self.access_hierarchy.index(against)
 
+    def at_position_change(self, user):
+        """
+        Called after a user is granted, revoked, banned or un-banned here.
+        """
+        pass
+
+    def at_lock_change(self):
+        """
+        Called after this entity's locks change.
+        """
+        pass
+
     def add_position(self, enactor, user, position, attr=None):
         granted = self.granted
         granted[user] = position
+        self.at_position_change(user)
         entities = {'enactor': enactor, 'user': user, 'target': self}
         if self.grant_msg:
             self.grant_msg(entities, status=position).send()
@@ -222,6 +238,7 @@ class HasOps(HasAttributeGetCreate):
         if user not in granted:
             raise ValueError("User has no position to remove!")
         del granted[user]
+        self.at_position_change(user)
         entities = {'enactor': enactor, 'user': user, 'target': self}
         if self.revoke_msg:
             self.revoke_msg(entities, status=position).send()
@@ -255,6 +272,7 @@ class HasOps(HasAttributeGetCreate):
         duration = duration_from_string(duration)
         new_ban = now + duration
         self.banned[user] = new_ban
+        self.at_position_change(user)
         entities = {'enactor': enactor, 'user': user, 'target': self, 'datetime': DateTime(new_ban),
                     'duration': Duration(duration)}
         if self.ban_msg:
@@ -268,6 +286,8 @@ class HasOps(HasAttributeGetCreate):
         if (banned := self.banned.get(user, None)) and banned < now:
             banned.pop(user)
             raise ValueError(f"{user}'s ban has already expired.")
+        self.banned.pop(user, None)
+        self.at_position_change(user)
         entities = {'enactor': enactor, 'user': user, 'target': self}
         if self.unban_msg:
             self.unban_msg(entities).send()
@@ -277,6 +297,7 @@ class HasOps(HasAttributeGetCreate):
             raise ValueError("Permission denied.")
         lock_data = validate_lock(lock_data, access_options=self.lock_options)
         self.locks.add(lock_data)
+        self.at_lock_change()
         entities = {'enactor': enactor, 'target': self}
         if self.lock_msg:
             self.lock_msg(entities, lock_string=lock_data).send()
@@ -287,3 +308,15 @@ class HasOps(HasAttributeGetCreate):
         entities = {'enactor': enactor, 'target': self}
         if self.config_msg:
             self.config_msg(entities, config_op=config_op, config_val=config_val).send()
+
+
+class HasCoalescedOutput:
+    """
+    For anything OUTPUT buffers messages for. Whatever is sent straight to msg() would
+    otherwise overtake the lines still waiting in the buffer.
+    """
+
+    def msg(self, *args, **kwargs):
+        if isInIOThread():
+            OUTPUT.flush_target(self)
+        return super().msg(*args, **kwargs)
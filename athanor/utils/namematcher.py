@@ -0,0 +1,197 @@
+"""
+Finds known names, such as Account usernames, in free text.
+
+This replaces a single (?i)\b(?P<found>name1|name2|...)\b regex. That regex had to be
+recompiled whenever a name was added, which gets slow with tens of thousands of names.
+NameMatcher keeps the names in a case-insensitive character trie instead, so adding,
+removing or renaming one name only touches that name's path.
+
+A name can only match where the regex's \b would allow it: starting and ending on a word
+boundary. Text is therefore only walked through the trie from boundary positions, and
+matching costs about one short trie walk per word. Matches don't overlap and are found
+left to right. Where several names could match at one position, the longest is taken.
+"""
+
+
+def _is_word(char):
+    return char.isalnum() or char == '_'
+
+
+def _fold(text):
+    # per-character lower-casing that never changes the length, so trie positions line
+    # up with positions in the original text.
+    return ''.join(low if len(low := char.lower()) == 1 else char for char in text)
+
+
+class NameMatch:
+    """
+    One name found in a text. Quacks like an re.Match for sub() callbacks:
+    group(), group('found'), start(), end() and span() work.
+    """
+    __slots__ = ("string", "_start", "_end", "name", "value")
+
+    def __init__(self, string, start, end, name, value):
+        self.string = string
+        self._start = start
+        self._end = end
+        self.name = name
+        self.value = value
+
+    def group(self, which=0):
+        if which in (0, 1, 'found'):
+            return self.string[self._start:self._end]
+        raise IndexError("no such group")
+
+    def __getitem__(self, which):
+        return self.group(which)
+
+    def start(self, which=0):
+        return self._start
+
+    def end(self, which=0):
+        return self._end
+
+    def span(self, which=0):
+        return self._start, self._end
+
+    def __repr__(self):
+        return f"<NameMatch span={self.span()} match={self.group()!r}>"
+
+
+class NameMatcher:
+    """
+    A case-insensitive set of names, each with an associated value, that can be searched
+    for in text.
+
+    Args:
+        names (dict, optional): Initial names mapped to their values.
+    """
+    # Key used inside trie nodes for the (name, value) ending there. Node keys are
+    # otherwise single characters, so it can't collide.
+    _END = ''
+
+    def __init__(self, names=None):
+        self.root = dict()
+        self.size = 0
+        if names:
+            for name, value in names.items():
+                self.add(name, value)
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, name):
+        return self._node(name) is not None
+
+    def _node(self, name):
+        node = self.root
+        for char in _fold(name):
+            if (node := node.get(char, None)) is None:
+                return None
+        return node if self._END in node else None
+
+    def get(self, name, default=None):
+        if (node := self._node(name)) is None:
+            return default
+        return node[self._END][1]
+
+    def add(self, name, value=None):
+        """
+        Add a name, or replace the value of one already present.
+        """
+        if not name:
+            return
+        node = self.root
+        for char in _fold(name):
+            node = node.setdefault(char, dict())
+        if self._END not in node:
+            self.size += 1
+        node[self._END] = (name, value)
+
+    def remove(self, name):
+        """
+        Remove a name, pruning trie nodes that no longer lead anywhere.
+
+        Returns:
+            removed (bool): False if the name wasn't present.
+        """
+        path = [self.root]
+        for char in _fold(name):
+            if (node := path[-1].get(char, None)) is None:
+                return False
+            path.append(node)
+        if path[-1].pop(self._END, None) is None:
+            return False
+        self.size -= 1
+        folded = _fold(name)
+        for depth in range(len(folded), 0, -1):
+            if path[depth]:
+                break
+            del path[depth - 1][folded[depth - 1]]
+        return True
+
+    def rename(self, old_name, new_name, value=None):
+        """
+        Move a name's entry to a new name. If no value is given, the old one is kept.
+        """
+        if value is None:
+            value = self.get(old_name)
+        self.remove(old_name)
+        self.add(new_name, value)
+
+    def finditer(self, string):
+        """
+        Yield a NameMatch for every name in the string, left to right.
+        """
+        folded = _fold(string)
+        length = len(string)
+        position = 0
+        end_token = self._END
+        while position < length:
+            # a match must start where \b would: on the edge between word and non-word.
+            if _is_word(string[position]) == (position > 0 and _is_word(string[position - 1])):
+                position += 1
+                continue
+            node = self.root
+            found = None
+            cursor = position
+            while cursor < length and (node := node.get(folded[cursor], None)) is not None:
+                cursor += 1
+                if end_token in node and \
+                        _is_word(string[cursor - 1]) != (cursor < length and _is_word(string[cursor])):
+                    found = (cursor, node[end_token])
+            if found is None:
+                position += 1
+                continue
+            end, (name, value) = found
+            yield NameMatch(string, position, end, name, value)
+            position = end
+
+    def findall(self, string):
+        return [match.group() for match in self.finditer(string)]
+
+    def search(self, string):
+        return next(self.finditer(string), None)
+
+    def sub(self, repl, string):
+        """
+        Replace every name found, like re.Pattern.sub().
+
+        Args:
+            repl (callable or str): Called with each NameMatch to produce its
+                replacement, or a plain replacement string.
+            string (str): The text to search.
+
+        Returns:
+            text (str)
+        """
+        pieces = list()
+        last = 0
+        for match in self.finditer(string):
+            pieces.append(string[last:match.start()])
+            pieces.append(repl(match) if callable(repl) else repl)
+            last = match.end()
+        if not last:
+            return string
+        pieces.append(string[last:])
+        return ''.join(pieces)
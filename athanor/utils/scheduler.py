@@ -0,0 +1,185 @@
+"""
+Fair scheduling of client input.
+
+Every line a client sends is queued on its Session instead of being executed at once.
+The InputScheduler drains those queues round-robin, one line per Session per pass, and
+executes at most INPUT_TICK_BUDGET lines before handing control back to the reactor. A
+client pasting hundreds of lines therefore only delays itself.
+
+Sessions whose Account passes pperm(Admin) are queued in a priority lane that is drained
+before everyone else.
+
+A Session's lines run strictly one after another. If a command has to wait on a Deferred,
+such as one running in the command thread pool, that Session's queue is held until it
+finishes, so its next line can't run alongside it.
+
+Queues are bounded by INPUT_QUEUE_DEPTH. What happens to input past that depends on
+INPUT_QUEUE_POLICY:
+    'drop': The line is discarded and the client told so.
+    'slow': The line is kept and the client asked to slow down. Input past twice the
+        depth is discarded.
+"""
+from collections import deque
+from time import perf_counter
+
+from django.conf import settings
+from twisted.internet import reactor
+
+from evennia.utils import logger
+
+from athanor.utils.metrics import METRICS
+
+
+class SessionQueue:
+    """
+    Pending input of a single Session.
+    """
+    __slots__ = ("session", "lines", "priority", "warned", "busy")
+
+    def __init__(self, session, priority=False):
+        self.session = session
+        self.lines = deque()
+        self.priority = priority
+        self.warned = False
+        # True while a command from this queue is waiting on a Deferred.
+        self.busy = False
+
+
+class InputScheduler:
+
+    def __init__(self, depth=50, budget=20, policy='drop'):
+        if policy not in ('drop', 'slow'):
+            raise ValueError(f"Unknown input queue policy: {policy}")
+        self.depth = depth
+        self.budget = budget
+        self.policy = policy
+        self.queues = dict()
+        self.priority_ring = deque()
+        self.ring = deque()
+        self.pending = 0
+        self.scheduled = None
+
+    def is_staff(self, session):
+        if not (account := session.get_account()):
+            return False
+        return account.check_lock("pperm(Admin)")
+
+    def enqueue(self, session, txt, **kwargs):
+        """
+        Queue a line of input for execution.
+
+        Args:
+            session (ServerSession): The Session that sent it.
+            txt (str or list): The input, after nick replacement. A list of command
+                strings is run with session.cmd.execute_batch.
+            **kwargs: Passed on to session.cmd.execute.
+
+        Returns:
+            accepted (bool): False if the line was discarded.
+        """
+        if (queue := self.queues.get(session, None)) is None:
+            queue = SessionQueue(session, priority=self.is_staff(session))
+            self.queues[session] = queue
+            (self.priority_ring if queue.priority else self.ring).append(queue)
+
+        waiting = len(queue.lines)
+        if waiting >= self.depth and not queue.priority:
+            if self.policy == 'drop' or waiting >= self.depth * 2:
+                METRICS.incr("input", "dropped")
+                discarded = txt if isinstance(txt, str) else settings.INPUT_COMMAND_SEPARATOR.join(txt)
+                session.msg(text="|rInput queue full. Discarded:|n " + discarded)
+                return False
+            if not queue.warned:
+                queue.warned = True
+                METRICS.incr("input", "throttled")
+                session.msg(text="|rYou are sending commands too quickly. Please slow down.|n")
+
+        queue.lines.append((perf_counter(), txt, kwargs))
+        self.pending += 1
+        METRICS.gauge("input", "pending", self.pending)
+        self.schedule()
+        return True
+
+    def discard(self, session):
+        """
+        Forget everything queued for a Session, such as on disconnect.
+        """
+        if (queue := self.queues.pop(session, None)) is None:
+            return
+        self.pending -= len(queue.lines)
+        queue.lines.clear()
+        METRICS.gauge("input", "pending", self.pending)
+
+    def schedule(self):
+        if self.scheduled is None and self.pending and (self.priority_ring or self.ring):
+            self.scheduled = reactor.callLater(0, self.drain)
+
+    def next_queue(self):
+        """
+        Pick the queue the next line comes from. Staff queues always go first.
+        Queues that have been emptied or discarded are dropped from the rings here, and
+        so are busy ones until their command finishes (see at_finished).
+        """
+        for ring in (self.priority_ring, self.ring):
+            while ring:
+                queue = ring.popleft()
+                if queue.busy:
+                    continue
+                if queue.lines:
+                    return ring, queue
+                if self.queues.get(queue.session, None) is queue:
+                    del self.queues[queue.session]
+        return None, None
+
+    def drain(self):
+        """
+        Execute up to self.budget queued lines, then reschedule if any remain.
+        """
+        self.scheduled = None
+        executed = 0
+        try:
+            while executed < self.budget:
+                ring, queue = self.next_queue()
+                if queue is None:
+                    break
+                queued_at, txt, kwargs = queue.lines.popleft()
+                self.pending -= 1
+                if len(queue.lines) < self.depth:
+                    queue.warned = False
+                ring.append(queue)
+                METRICS.observe("input", "priority_wait" if queue.priority else "wait", perf_counter() - queued_at)
+                try:
+                    if isinstance(txt, str):
+                        executed += 1
+                        deferred = queue.session.cmd.execute(txt, session=queue.session, **kwargs)
+                    else:
+                        # a batch counts against the budget for every command in it.
+                        executed += len(txt)
+                        deferred = queue.session.cmd.execute_batch(txt, session=queue.session, **kwargs)
+                    if not deferred.called:
+                        queue.busy = True
+                        ring.remove(queue)
+                        deferred.addBoth(self.at_finished, queue)
+                except Exception:
+                    logger.log_trace()
+        finally:
+            METRICS.incr("input", "executed", executed)
+            METRICS.gauge("input", "pending", self.pending)
+            self.schedule()
+
+    def at_finished(self, result, queue):
+        """
+        Called when a command that had to wait finishes. Puts its queue back in rotation.
+        """
+        queue.busy = False
+        if self.queues.get(queue.session, None) is queue:
+            if queue.lines:
+                (self.priority_ring if queue.priority else self.ring).append(queue)
+                self.schedule()
+            else:
+                del self.queues[queue.session]
+        return result
+
+
+INPUT_SCHEDULER = InputScheduler(depth=settings.INPUT_QUEUE_DEPTH, budget=settings.INPUT_TICK_BUDGET,
+                                 policy=settings.INPUT_QUEUE_POLICY)
@@ -0,0 +1,680 @@
+import threading
+import time
+from unittest import TestCase, mock
+
+from django.db import connection
+from twisted.internet import task
+from twisted.internet.defer import Deferred, succeed, fail
+
+from evennia.commands.cmdset import CmdSet
+from evennia.commands.command import Command
+from evennia.utils.utils import string_suggestions
+
+from athanor.utils.cmdhandler import CmdHandler
+from athanor.utils.cmdparser import suggestions
+from athanor.utils.coalesce import OutputCoalescer
+from athanor.utils.controllers import ControllerManager, AthanorController, AthanorControllerBackend
+from athanor.utils.fastpath import maybe_inline_callbacks, fast_inline_callbacks
+from athanor.utils.metrics import MetricRegistry
+from athanor.utils.mixins import HasCoalescedOutput
+from athanor.utils.namematcher import NameMatcher
+from athanor.utils.scheduler import InputScheduler
+from athanor.utils.threads import CommandThreadPool
+
+
+def result_of(deferred):
+    """
+    Returns:
+        outcome (tuple): ('result', value) or ('error', Failure) if deferred has fired,
+            otherwise None.
+    """
+    outcome = list()
+
+    def got_result(value):
+        outcome.append(('result', value))
+        # passed on, so this can be called again once the Deferred fires.
+        return value
+
+    def got_error(failure):
+        outcome.append(('error', failure))
+
+    deferred.addCallbacks(got_result, got_error)
+    return outcome[0] if outcome else None
+
+
+@maybe_inline_callbacks
+def doubled(value):
+    value = yield value
+    return value * 2
+
+
+class TestFastPath(TestCase):
+
+    def test_maybe_sync(self):
+        @maybe_inline_callbacks
+        def outer():
+            first = yield doubled(2)
+            second = yield succeed(3)
+            return first + second
+        self.assertEqual(outer(), 7)
+
+    def test_maybe_sync_error(self):
+        @maybe_inline_callbacks
+        def outer():
+            try:
+                yield fail(KeyError('caught'))
+            except KeyError:
+                pass
+            yield 1
+            raise ValueError('raised')
+        with self.assertRaises(ValueError):
+            outer()
+
+    def test_maybe_async(self):
+        waiting = Deferred()
+        deferred = doubled(waiting)
+        self.assertIsInstance(deferred, Deferred)
+        self.assertIsNone(result_of(deferred))
+        waiting.callback(5)
+        self.assertEqual(result_of(deferred), ('result', 10))
+
+    def test_fast_sync(self):
+        deferred = fast_inline_callbacks(doubled.__wrapped__)(4)
+        self.assertIsInstance(deferred, Deferred)
+        self.assertEqual(result_of(deferred), ('result', 8))
+
+    def test_fast_sync_error(self):
+        @fast_inline_callbacks
+        def raises():
+            yield 1
+            raise ValueError('raised')
+        kind, failure = result_of(raises())
+        self.assertEqual(kind, 'error')
+        self.assertTrue(failure.check(ValueError))
+
+    def test_fast_async(self):
+        waiting = Deferred()
+
+        @fast_inline_callbacks
+        def waits():
+            value = yield waiting
+            value = yield doubled(value)
+            if value > 10:
+                raise ValueError('too big')
+            return value
+
+        deferred = waits()
+        self.assertIsNone(result_of(deferred))
+        waiting.callback(3)
+        self.assertEqual(result_of(deferred), ('result', 6))
+
+        waiting = Deferred()
+        deferred = waits()
+        waiting.callback(6)
+        kind, failure = result_of(deferred)
+        self.assertEqual(kind, 'error')
+        self.assertTrue(failure.check(ValueError))
+
+
+class StubCaller:
+    _cmd_sort = 0
+
+    def __init__(self):
+        self.ndb = mock.Mock()
+        self.msg = mock.Mock()
+
+
+class CmdReturns(Command):
+    key = "returns"
+    returned = "done"
+
+    def func(self):
+        return self.returned
+
+
+class CmdRaises(Command):
+    key = "raises"
+
+    def func(self):
+        raise ValueError("broken")
+
+
+class TestExecute(TestCase):
+
+    def setUp(self):
+        self.caller = StubCaller()
+        self.handler = CmdHandler(self.caller)
+        self.handler.get_cmdobjects = lambda session=None: {'caller': self.caller}
+
+    def execute(self, cmdclass, **kwargs):
+        deferred = self.handler.execute(" args", cmdclass=cmdclass, **kwargs)
+        self.assertIsInstance(deferred, Deferred)
+        return deferred
+
+    def test_sync(self):
+        self.assertEqual(result_of(self.execute(CmdReturns)), ('result', "done"))
+
+    def test_async(self):
+        waiting = Deferred()
+        cmd = CmdReturns()
+        cmd.returned = waiting
+        deferred = self.execute(cmd)
+        self.assertIsNone(result_of(deferred))
+        waiting.callback("later")
+        self.assertEqual(result_of(deferred), ('result', "later"))
+
+    def test_error(self):
+        with mock.patch("athanor.utils.cmdhandler.logger"):
+            self.assertEqual(result_of(self.execute(CmdRaises)), ('result', None))
+        self.caller.msg.assert_called()
+
+    def test_copies_shared_command(self):
+        cmd = CmdReturns()
+        kind, ran = result_of(self.execute(cmd, testing=True))
+        self.assertIsNot(ran, cmd)
+        self.assertIs(ran.caller, self.caller)
+        self.assertNotIn("caller", vars(cmd))
+
+    def test_testing(self):
+        kind, cmd = result_of(self.execute(CmdReturns, testing=True))
+        self.assertEqual(kind, 'result')
+        self.assertIsInstance(cmd, CmdReturns)
+        self.assertEqual(cmd.args, " args")
+        self.assertIs(cmd.caller, self.caller)
+
+
+class SuggestedCommand(Command):
+    locked = False
+
+    def access(self, srcobj, access_type="cmd", default=False):
+        return not self.locked
+
+
+class TestSuggestions(TestCase):
+    names = ("look", "@look", "loot", "lock", "@lock", "@unlock", "say", "pose", "emote", "@emit",
+             "who", "whisper", "@who", "home", "help", "@help", "page", "ooc", "ic", "inventory")
+
+    def setUp(self):
+        self.cmdset = CmdSet()
+        for number, key in enumerate(self.names[::2]):
+            cmd = SuggestedCommand(key=key, aliases=list(self.names[number * 2 + 1:number * 2 + 2]))
+            # every third command is locked away from callers.
+            cmd.locked = not number % 3
+            self.cmdset.add(cmd)
+        self.caller = StubCaller()
+
+    def assertSameSuggestions(self, string, cutoff=0.7, maxnum=3):
+        for caller in (None, self.caller):
+            expected = string_suggestions(string, self.cmdset.get_all_cmd_keys_and_aliases(caller),
+                                          cutoff=cutoff, maxnum=maxnum)
+            self.assertEqual(suggestions(string, self.cmdset, caller, cutoff=cutoff, maxnum=maxnum), expected,
+                             f"{string!r}, caller={caller}, cutoff={cutoff}, maxnum={maxnum}")
+
+    def test_matches_string_suggestions(self):
+        for string in ("lok", "looc", "@lok", "wo", "whispr", "hlep", "invetory", "xyz", "", "l", "@",
+                       "pse", "emot", "ooo"):
+            for cutoff in (0.0, 0.5, 0.7, 0.9):
+                for maxnum in (1, 3, 10):
+                    self.assertSameSuggestions(string, cutoff=cutoff, maxnum=maxnum)
+
+    def test_access_is_checked_each_call(self):
+        self.assertSameSuggestions("lok")
+        for cmd in self.cmdset.commands:
+            cmd.locked = not cmd.locked
+        self.assertSameSuggestions("lok")
+
+
+class StubAccount:
+
+    def __init__(self, staff=False):
+        self.staff = staff
+
+    def check_lock(self, lock):
+        return self.staff
+
+
+class StubSession:
+    """
+    Stands in for a ServerSession, and for its CmdHandler. Records every line it runs.
+    """
+
+    def __init__(self, name, ran, staff=False):
+        self.name = name
+        self.ran = ran
+        self.account = StubAccount(staff)
+        self.cmd = self
+        self.msg = mock.Mock()
+        # lines whose execute() returns this Deferred instead of a fired one.
+        self.waits = dict()
+
+    def get_account(self):
+        return self.account
+
+    def execute(self, txt, session=None, **kwargs):
+        self.ran.append((self.name, txt))
+        return self.waits.get(txt, None) or succeed(None)
+
+    def execute_batch(self, txts, session=None, **kwargs):
+        self.ran.append((self.name, tuple(txts)))
+        return succeed(None)
+
+
+class TestInputScheduler(TestCase):
+
+    def setUp(self):
+        self.clock = task.Clock()
+        patcher = mock.patch("athanor.utils.scheduler.reactor", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.ran = list()
+
+    def session(self, name, staff=False):
+        return StubSession(name, self.ran, staff=staff)
+
+    def test_round_robin(self):
+        scheduler = InputScheduler(depth=10, budget=4)
+        first, second = self.session("first"), self.session("second")
+        for number in range(3):
+            scheduler.enqueue(first, f"f{number}")
+        scheduler.enqueue(second, "s0")
+        self.assertEqual(self.ran, [])
+        self.clock.advance(0)
+        self.assertEqual(self.ran, [("first", "f0"), ("second", "s0"), ("first", "f1"), ("first", "f2")])
+        self.assertEqual(scheduler.pending, 0)
+
+    def test_budget(self):
+        scheduler = InputScheduler(depth=10, budget=2)
+        first = self.session("first")
+        for number in range(3):
+            scheduler.enqueue(first, f"f{number}")
+        scheduler.enqueue(first, ["b0", "b1"])
+        scheduler.drain()
+        self.assertEqual(self.ran, [("first", "f0"), ("first", "f1")])
+        # the rest waits for the next reactor tick.
+        self.assertTrue(self.clock.getDelayedCalls())
+        scheduler.drain()
+        # a batch counts for every command in it, even past the budget.
+        self.assertEqual(self.ran[2:], [("first", "f2"), ("first", ("b0", "b1"))])
+
+    def test_priority(self):
+        scheduler = InputScheduler(depth=10, budget=10)
+        player, staff = self.session("player"), self.session("staff", staff=True)
+        scheduler.enqueue(player, "p0")
+        scheduler.enqueue(player, "p1")
+        scheduler.enqueue(staff, "s0")
+        scheduler.enqueue(staff, "s1")
+        self.clock.advance(0)
+        self.assertEqual(self.ran, [("staff", "s0"), ("staff", "s1"), ("player", "p0"), ("player", "p1")])
+
+    def test_drop(self):
+        scheduler = InputScheduler(depth=2, budget=10, policy='drop')
+        player, staff = self.session("player"), self.session("staff", staff=True)
+        self.assertTrue(scheduler.enqueue(player, "p0"))
+        self.assertTrue(scheduler.enqueue(player, "p1"))
+        self.assertFalse(scheduler.enqueue(player, "p2"))
+        player.msg.assert_called_once()
+        for number in range(3):
+            # staff are never limited.
+            self.assertTrue(scheduler.enqueue(staff, f"s{number}"))
+        self.clock.advance(0)
+        self.assertNotIn(("player", "p2"), self.ran)
+        self.assertEqual(len(self.ran), 5)
+
+    def test_slow(self):
+        scheduler = InputScheduler(depth=2, budget=10, policy='slow')
+        player = self.session("player")
+        accepted = [scheduler.enqueue(player, f"p{number}") for number in range(5)]
+        self.assertEqual(accepted, [True, True, True, True, False])
+        # warned once when passing the depth, then told of the discarded line.
+        self.assertEqual(player.msg.call_count, 2)
+        self.clock.advance(0)
+        self.assertEqual([txt for name, txt in self.ran], ["p0", "p1", "p2", "p3"])
+
+    def test_hold_while_busy(self):
+        scheduler = InputScheduler(depth=10, budget=10)
+        first, second = self.session("first"), self.session("second")
+        waiting = first.waits["wait"] = Deferred()
+        for txt in ("f0", "wait", "f2"):
+            scheduler.enqueue(first, txt)
+        scheduler.enqueue(second, "s0")
+        scheduler.enqueue(second, "s1")
+        self.clock.advance(0)
+        self.assertEqual(self.ran, [("first", "f0"), ("second", "s0"), ("first", "wait"), ("second", "s1")])
+        scheduler.enqueue(first, "f3")
+        self.clock.advance(0)
+        self.assertEqual(len(self.ran), 4)
+        waiting.callback(None)
+        self.clock.advance(0)
+        self.assertEqual(self.ran[4:], [("first", "f2"), ("first", "f3")])
+        self.assertEqual(scheduler.pending, 0)
+
+    def test_discard(self):
+        scheduler = InputScheduler(depth=10, budget=10)
+        first = self.session("first")
+        scheduler.enqueue(first, "f0")
+        scheduler.discard(first)
+        self.clock.advance(0)
+        self.assertEqual(self.ran, [])
+        self.assertEqual(scheduler.pending, 0)
+
+
+class CmdSingle(Command):
+    key = "single"
+
+
+class CmdLimited(Command):
+    key = "limited"
+    thread_limit = 2
+
+
+class TestCommandThreads(TestCase):
+
+    def setUp(self):
+        self.pool = CommandThreadPool(size=2)
+        self.pool.start = mock.Mock()
+        # each call handed to the pool, as (func, args, kwargs, Deferred).
+        self.calls = list()
+        patcher = mock.patch("athanor.utils.threads.deferToThreadPool", self.to_thread)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch("athanor.utils.threads.METRICS")
+        self.metrics = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def to_thread(self, reactor, pool, call, func, args, kwargs):
+        self.assertIs(pool, self.pool.pool)
+        deferred = Deferred()
+        self.calls.append((func, args, kwargs, deferred))
+        return deferred
+
+    def finish(self, index, value):
+        func, args, kwargs, deferred = self.calls[index]
+        deferred.callback(value)
+
+    def test_result(self):
+        deferred = self.pool.run(CmdReturns(), len, "abc")
+        func, args, kwargs, waiting = self.calls[0]
+        self.assertEqual((func, args, kwargs), (len, ("abc",), {}))
+        self.assertIsNone(result_of(deferred))
+        waiting.callback(3)
+        self.assertEqual(result_of(deferred), ('result', 3))
+        self.assertEqual((self.pool.active, self.pool.waiting), (0, 0))
+
+    def test_error(self):
+        deferred = self.pool.run(CmdReturns(), len, 5)
+        self.calls[0][3].errback(TypeError("no len"))
+        kind, failure = result_of(deferred)
+        self.assertEqual(kind, 'error')
+        self.assertTrue(failure.check(TypeError))
+        self.assertEqual(self.pool.active, 0)
+
+    def test_thread_limit(self):
+        deferreds = [self.pool.run(CmdSingle(), str, number) for number in range(3)]
+        # commands without a thread_limit get one call at a time.
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual((self.pool.active, self.pool.waiting), (1, 2))
+        limited = [self.pool.run(CmdLimited(), str, number) for number in range(3)]
+        self.assertEqual(len(self.calls), 3)
+        self.finish(0, "0")
+        self.assertEqual(result_of(deferreds[0]), ('result', "0"))
+        self.assertEqual(len(self.calls), 4)
+        self.assertEqual(self.calls[3][1], (1,))
+        # four calls for two threads.
+        self.metrics.incr.assert_any_call("threads", "saturated")
+        for index in range(1, 4):
+            self.finish(index, index)
+        self.assertEqual(len(self.calls), 6)
+        for index in range(4, 6):
+            self.finish(index, index)
+        self.assertTrue(all(result_of(deferred) for deferred in deferreds + limited))
+        self.assertEqual((self.pool.active, self.pool.waiting), (0, 0))
+
+
+class WarmupController(AthanorController):
+    loads = None
+
+    def do_load(self):
+        self.loads.append((self.key, threading.current_thread() is threading.main_thread()))
+
+
+class TestWarmup(TestCase):
+
+    def setUp(self):
+        self.loads = list()
+        self.manager = ControllerManager()
+        # (key, dependencies, load_in_thread)
+        for key, dependencies, in_thread in (('accounts', (), False), ('assets', (), True),
+                                             ('channels', ('accounts',), False), ('themes', ('assets',), True)):
+            controller = WarmupController(key, self.manager, AthanorControllerBackend)
+            controller.loads, controller.dependencies, controller.load_in_thread = self.loads, dependencies, in_thread
+            self.manager.controllers[key] = controller
+
+    def warmup(self, threads):
+        with mock.patch("athanor.utils.controllers.settings.CONTROLLER_LOAD_THREADS", threads), \
+                mock.patch("athanor.utils.controllers.logger"):
+            self.manager.warmup()
+        self.assertEqual(set(self.manager.load_times.keys()), set(self.manager.controllers.keys()))
+        keys = [key for key, on_main in self.loads]
+        self.assertLess(keys.index('accounts'), keys.index('channels'))
+        self.assertLess(keys.index('assets'), keys.index('themes'))
+        return dict(self.loads)
+
+    def test_serial(self):
+        self.assertEqual(self.warmup(1), {'accounts': True, 'assets': True, 'channels': True, 'themes': True})
+
+    def test_parallel(self):
+        # only the controllers marked load_in_thread leave the main thread.
+        self.assertEqual(self.warmup(4), {'accounts': True, 'assets': False, 'channels': True, 'themes': False})
+
+    def test_cycle(self):
+        self.manager.controllers['accounts'].dependencies = ('channels',)
+        with self.assertRaises(ValueError):
+            self.manager.dependency_graph()
+
+
+class TestNameMatcher(TestCase):
+
+    def setUp(self):
+        self.matcher = NameMatcher({name: name.lower() for name in ("Bob", "Bobby", "Al", "Al_Capone", "Zoë", "O")})
+
+    def test_word_boundaries(self):
+        self.assertEqual(self.matcher.findall("bob, BOBBY and bobcat"), ["bob", "BOBBY"])
+        # \b never falls inside a word, on either side.
+        self.assertEqual(self.matcher.findall("Alice Sal al"), ["al"])
+        self.assertEqual(self.matcher.findall("Al_Capone al_capones"), ["Al_Capone"])
+        self.assertEqual(self.matcher.findall("o'zoë, O."), ["o", "zoë", "O"])
+        self.assertEqual(self.matcher.findall(""), [])
+
+    def test_longest_match(self):
+        match = self.matcher.search("hi Bobby!")
+        self.assertEqual((match.span(), match.group('found'), match.value), ((3, 8), "Bobby", "bobby"))
+        # the longer name only counts if it ends on a boundary too.
+        self.assertEqual(self.matcher.search("Bobbyx Bob").group(), "Bob")
+        self.assertEqual(self.matcher.search("Bobbyx Bob").start(), 7)
+
+    def test_sub(self):
+        self.assertEqual(self.matcher.sub(lambda match: f"<{match.value}>", "Bob met BOBBY, not Bobcat."),
+                         "<bob> met <bobby>, not Bobcat.")
+        self.assertEqual(self.matcher.sub("X", "al and al_capone"), "X and X")
+        self.assertEqual(self.matcher.sub("X", "nobody here"), "nobody here")
+
+    def test_changes(self):
+        self.assertEqual(len(self.matcher), 6)
+        self.matcher.rename("Bobby", "Robert")
+        self.assertNotIn("bobby", self.matcher)
+        self.assertEqual(self.matcher.get("ROBERT"), "bobby")
+        self.assertEqual(self.matcher.findall("Bobby Robert"), ["Robert"])
+        self.assertTrue(self.matcher.remove("bob"))
+        self.assertFalse(self.matcher.remove("bob"))
+        self.assertEqual(self.matcher.findall("Bob Bobby Robert"), ["Robert"])
+        self.assertEqual(len(self.matcher), 5)
+
+
+class CountedController(AthanorController):
+    loads = 0
+
+    @property
+    def never_read(self):
+        raise AssertionError("instrument() evaluated a property")
+
+    def do_load(self):
+        self.loads += 1
+        # give other threads the chance to call load() meanwhile.
+        time.sleep(0.01)
+
+    def query(self, times=1):
+        with connection.cursor() as cursor:
+            for number in range(times):
+                cursor.execute("SELECT 1")
+        return times
+
+    def nested(self):
+        return self.query(2) + self.query()
+
+    def refuse(self):
+        raise ValueError("refused")
+
+    def break_down(self):
+        raise KeyError("broken")
+
+
+class TestInstrument(TestCase):
+
+    def setUp(self):
+        patcher = mock.patch("athanor.utils.controllers.METRICS", MetricRegistry())
+        self.metrics = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.controller = CountedController('counted', ControllerManager(), AthanorControllerBackend)
+
+    def counter(self, method, kind):
+        return self.metrics.counters["controller"].get(('counted', method, kind), 0)
+
+    def test_counts(self):
+        self.controller.instrument()
+        self.assertEqual(sorted(self.controller.instrumented), ['break_down', 'nested', 'query', 'refuse'])
+        self.controller.query(3)
+        self.controller.nested()
+        with self.assertRaises(ValueError):
+            self.controller.refuse()
+        with self.assertRaises(KeyError):
+            self.controller.break_down()
+        self.assertEqual(self.counter('query', 'calls'), 3)
+        self.assertEqual(self.counter('query', 'queries'), 6)
+        # a nested controller call's queries count towards its caller too.
+        self.assertEqual((self.counter('nested', 'calls'), self.counter('nested', 'queries')), (1, 3))
+        self.assertEqual((self.counter('refuse', 'rejected'), self.counter('refuse', 'errors')), (1, 0))
+        self.assertEqual((self.counter('break_down', 'rejected'), self.counter('break_down', 'errors')), (0, 1))
+        self.assertEqual(self.metrics.histogram("controller", ('counted', 'query')).count, 3)
+        self.assertIn("controller counted/query/queries 6", self.metrics.export_text("controller").split('\n'))
+
+    def test_uninstrument(self):
+        self.controller.instrument()
+        self.controller.uninstrument()
+        self.assertEqual(self.controller.instrumented, [])
+        self.controller.query()
+        self.controller.load()
+        self.assertFalse(self.metrics.counters)
+        self.assertFalse(self.metrics.histograms)
+
+    def test_load_once(self):
+        self.controller.instrument()
+        loaders = [threading.Thread(target=self.controller.load) for number in range(4)]
+        for loader in loaders:
+            loader.start()
+        self.controller.load()
+        for loader in loaders:
+            loader.join()
+        self.assertEqual(self.controller.loads, 1)
+        self.assertTrue(self.controller.loaded)
+
+
+class Recipient:
+    """
+    Records every msg() call, in order, into a log shared between recipients.
+    """
+
+    def __init__(self, name, log):
+        self.name = name
+        self.log = log
+
+    def msg(self, text=None, **kwargs):
+        self.log.append((self.name, text, kwargs))
+
+
+class CoalescedRecipient(HasCoalescedOutput, Recipient):
+    pass
+
+
+class TestOutputCoalescer(TestCase):
+
+    def setUp(self):
+        self.clock = task.Clock()
+        self.output = OutputCoalescer(max_size=50)
+        for target, replacement in (("athanor.utils.coalesce.reactor", self.clock),
+                                    ("athanor.utils.coalesce.isInIOThread", lambda: True),
+                                    ("athanor.utils.mixins.OUTPUT", self.output),
+                                    ("athanor.utils.mixins.isInIOThread", lambda: True)):
+            patcher = mock.patch(target, replacement)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.log = list()
+
+    def test_coalesce(self):
+        first, second = Recipient("first", self.log), Recipient("second", self.log)
+        self.output.send(first, "one")
+        self.output.send(second, "two")
+        self.output.send(first, "three")
+        self.output.send(first, "alert", system_name="SYS", original_text="alert")
+        self.output.send(first, "again", system_name="SYS", original_text="again")
+        self.output.send(first, "other", system_name="ELSE", original_text="other")
+        self.assertEqual(self.log, [])
+        self.clock.advance(0)
+        self.assertEqual(self.log, [("first", "one\nthree", {}),
+                                    ("first", "alert\nagain", {'system_name': "SYS", 'original_text': "alert\nagain"}),
+                                    ("first", "other", {'system_name': "ELSE", 'original_text': "other"}),
+                                    ("second", "two", {})])
+        self.assertEqual(self.output.buffers, dict())
+
+    def test_max_size(self):
+        first = Recipient("first", self.log)
+        self.output.send(first, "x" * 30)
+        self.output.send(first, "y" * 30)
+        self.assertEqual(self.log, [("first", f"{'x' * 30}\n{'y' * 30}", {})])
+        self.clock.advance(0)
+        self.assertEqual(len(self.log), 1)
+
+    def test_immediate(self):
+        first = Recipient("first", self.log)
+        self.output.send(first, "buffered")
+        self.output.send(first, "> ", prompt="> ")
+        self.output.send(first, "now", immediate=True)
+        self.assertEqual([text for name, text, kwargs in self.log], ["buffered", "> ", "now"])
+
+    def test_direct_msg(self):
+        first = CoalescedRecipient("first", self.log)
+        self.output.send(first, "buffered")
+        self.output.send(first, "more")
+        first.msg("direct")
+        self.assertEqual([text for name, text, kwargs in self.log], ["buffered\nmore", "direct"])
+        self.clock.advance(0)
+        self.assertEqual(len(self.log), 2)
+
+    def test_targets(self):
+        account, session = CoalescedRecipient("account", self.log), CoalescedRecipient("session", self.log)
+        self.output.send(account, "a1")
+        self.output.send(session, "s1")
+        self.output.send(account, "a2")
+        self.clock.advance(0)
+        # flushed in the order targets first had output buffered.
+        self.assertEqual([(name, text) for name, text, kwargs in self.log], [("account", "a1\na2"), ("session", "s1")])
+        del self.log[:]
+        self.output.send(account, "a3")
+        session.msg("direct")
+        self.clock.advance(0)
+        # a direct msg() only flushes its own target's buffer, so it overtakes the Account's.
+        self.assertEqual([(name, text) for name, text, kwargs in self.log], [("session", "direct"), ("account", "a3")])
+
+    def test_disabled(self):
+        self.output.enabled = False
+        self.output.send(Recipient("first", self.log), "now")
+        self.assertEqual(self.log, [("first", "now", {})])
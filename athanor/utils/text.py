@@ -136,6 +136,7 @@ class Speech(object):
     re_speech = re.compile(r'(?s)"(?P<found>.*?)"')
     re_name = re.compile(r"\^\^\^(?P<thing_id>\d+)\:(?P<thing_name>[^^]+)\^\^\^")
     speech_dict = {':': 1, ';': 2, '^': 3, '"': 0, "'": 0}
+    color_options = ("quotes", "speech", "speaker", "self", 'other')
 
     def __init__(self, speaker=None, speech_text=None, alternate_name=None, title=None, mode='ooc', targets=None,
                  rendered_text=None, action_string="says", controller="character", color_mode='channel'):
@@ -170,6 +171,7 @@ class Speech(object):
 
         self.special_format = special_format
         self.speech_string = speech_string
+        self.named = None
 
         if rendered_text:
             self.markup_string = rendered_text
@@ -205,6 +207,37 @@ class Speech(object):
     def render(self, viewer=None):
         if not viewer:
             return ANSIString(self.demarkup())
+        return self.colorize(self.template(), viewer)
+
+    def render_key(self, viewer=None):
+        """
+        Sums up everything about a viewer that render() depends on: their color options
+        and how they color each name in the speech. Viewers with equal keys see identical
+        output, so a broadcast only has to render once per key.
+        """
+        if not viewer:
+            return None
+        if not (viewer := viewer.get_account() if hasattr(viewer, 'get_account') else None):
+            return ()
+        options = viewer.styler.options
+        colorizer = viewer.colorizer
+        return (tuple(options.get(f"{op}_{self.color_mode}", '') for op in self.color_options),
+                tuple((colorizer.get(obj, None), obj == viewer) for obj in self.named_objects()))
+
+    def named_objects(self):
+        """
+        The entities whose names are marked up in this speech.
+        """
+        if self.named is None:
+            id_map = self.controller.id_map
+            self.named = tuple(obj for found in self.re_name.finditer(self.template())
+                               if (obj := id_map.get(int(found.group('thing_id')), None)))
+        return self.named
+
+    def template(self):
+        """
+        The marked-up speech, before it's colorized for a viewer.
+        """
         return_string = None
         if self.special_format == 0:
             return_string = f'{self.markup_name} {self.action_string}, "{self.markup_string}|n"'
@@ -219,8 +252,7 @@ class Speech(object):
         if self.mode == 'page' and len(self.targets) > 1:
             pref = f'(To {", ".join(self.targets)})'
             return_string = f'{pref} {return_string}'
-
-        return self.colorize(return_string, viewer)
+        return return_string
 
     def log(self):
         return_string = None
@@ -257,7 +289,7 @@ class Speech(object):
         viewer = viewer.get_account() if viewer and hasattr(viewer, 'get_account') else None
         colors = dict()
         styler = viewer.styler if viewer else athanor.STYLER(None)
-        for op in ("quotes", "speech", "speaker", "self", 'other'):
+        for op in self.color_options:
             colors[op] = styler.options.get(f"{op}_{self.color_mode}", '')
             if colors[op] == 'n':
                 colors[op] = ''
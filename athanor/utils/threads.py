@@ -0,0 +1,101 @@
+"""
+A bounded thread pool for the blocking parts of AthanorCommands.
+
+A command hands a blocking call, such as reading files, to COMMAND_THREADS.run() and
+returns the Deferred it gets back from its switch. The cmdhandler waits on that Deferred
+like any other, and whatever the command does with the result runs on the reactor thread
+again, so only the call itself is ever in a thread.
+
+That call must stay clear of sessions, the reactor, typeclassed objects, the idmapper
+caches, Attribute and Tag handlers and ndb, none of which are thread-safe. Gather what it
+needs on the reactor thread first and pass it in.
+
+Each command class may only run `thread_limit` calls at once. Extra calls wait their turn
+without taking a thread.
+"""
+from time import perf_counter
+
+from django.conf import settings
+from django.db import close_old_connections
+from twisted.internet import reactor
+from twisted.internet.defer import DeferredSemaphore
+from twisted.internet.threads import deferToThreadPool
+from twisted.python.threadpool import ThreadPool
+
+from athanor.utils.metrics import METRICS
+
+
+class CommandThreadPool:
+
+    def __init__(self, size=4):
+        self.size = size
+        self.pool = ThreadPool(minthreads=0, maxthreads=size, name="AthanorCommands")
+        self.limits = dict()
+        self.active = 0
+        self.waiting = 0
+
+    def start(self):
+        if self.pool.started:
+            return
+        self.pool.start()
+        reactor.addSystemEventTrigger("during", "shutdown", self.pool.stop)
+
+    def limit(self, cmd_class):
+        """
+        Retrieve the semaphore limiting a command class's concurrency.
+        """
+        if (found := self.limits.get(cmd_class, None)) is None:
+            found = DeferredSemaphore(max(1, getattr(cmd_class, "thread_limit", 1)))
+            self.limits[cmd_class] = found
+        return found
+
+    def run(self, cmd, func, *args, **kwargs):
+        """
+        Call func in the pool on behalf of a command.
+
+        Args:
+            cmd (AthanorCommand): The command. Its class decides the concurrency limit and
+                the metrics key.
+            func (callable): The blocking call.
+            *args, **kwargs: Passed on to func.
+
+        Returns:
+            deferred (Deferred): Fires on the reactor thread with func's return value,
+                or errbacks with its exception.
+        """
+        self.start()
+        self.waiting += 1
+        METRICS.gauge("threads", "waiting", self.waiting)
+        return self.limit(cmd.__class__).run(self.dispatch, cmd, perf_counter(), func, args, kwargs)
+
+    def dispatch(self, cmd, queued_at, func, args, kwargs):
+        self.waiting -= 1
+        self.active += 1
+        cmd_path = f"{cmd.__class__.__module__}.{cmd.__class__.__name__}"
+        METRICS.observe("threads", (cmd_path, "wait"), perf_counter() - queued_at)
+        METRICS.gauge("threads", "waiting", self.waiting)
+        METRICS.gauge("threads", "active", self.active)
+        if self.active > self.size:
+            # every thread is busy, so this call queues inside the pool itself.
+            METRICS.incr("threads", "saturated")
+        started = perf_counter()
+
+        def finished(result):
+            self.active -= 1
+            METRICS.gauge("threads", "active", self.active)
+            METRICS.observe("threads", (cmd_path, "run"), perf_counter() - started)
+            return result
+
+        return deferToThreadPool(reactor, self.pool, self.call, func, args, kwargs).addBoth(finished)
+
+    def call(self, func, args, kwargs):
+        """
+        Runs in a pool thread.
+        """
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+
+COMMAND_THREADS = CommandThreadPool(settings.COMMAND_THREAD_POOL_SIZE)
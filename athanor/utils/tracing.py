@@ -0,0 +1,123 @@
+"""
+Sampled tracing of the command pipeline.
+
+A sampled command carries a Trace instead of a plain StageTimer. Every stage mark then
+also becomes a span (gather, merge, match, suggest, pre, parse, func, post) with its
+offset and duration. Finished traces go to an in-memory ring buffer, readable with
+@cmdtrace, and optionally to a JSON-lines file that is written in batches from a thread.
+
+At a sample rate of 0 (COMMAND_TRACE_RATE, the default) the cmdhandler never calls into
+this module, so tracing costs nothing until it is switched on with @cmdtrace/rate.
+"""
+import json
+from collections import deque
+from random import random
+from threading import Lock
+from time import time
+
+from django.conf import settings
+from twisted.internet import reactor
+from twisted.internet.task import LoopingCall
+from twisted.internet.threads import deferToThread
+
+from evennia.utils import logger
+
+from athanor.utils.metrics import StageTimer
+
+
+class Trace(StageTimer):
+    """
+    A StageTimer that also remembers each stage as a span.
+    """
+    __slots__ = ("started_at", "raw_string", "spans")
+
+    def __init__(self, raw_string):
+        super().__init__()
+        self.started_at = time()
+        self.raw_string = raw_string
+        self.spans = list()
+
+    def mark(self, stage):
+        began = self.last
+        super().mark(stage)
+        self.spans.append((stage, began - self.start, self.last - began))
+
+    def export(self, caller, cmd_path):
+        return {
+            "time": self.started_at,
+            "caller": str(caller),
+            "input": self.raw_string,
+            "command": cmd_path,
+            "total_ms": self.total * 1000,
+            "spans": [{"name": name, "start_ms": start * 1000, "ms": duration * 1000}
+                      for name, start, duration in self.spans],
+        }
+
+
+class TraceFileWriter:
+    """
+    Appends trace records to a JSON-lines file. Records are buffered and written out
+    every `interval` seconds, or as soon as `batch` are waiting, in a worker thread.
+    """
+
+    def __init__(self, path, interval=5.0, batch=500):
+        self.path = path
+        self.interval = interval
+        self.batch = batch
+        self.pending = list()
+        self.lock = Lock()
+        self.loop = LoopingCall(self.flush)
+        reactor.addSystemEventTrigger("before", "shutdown", self.flush)
+
+    def write(self, record):
+        self.pending.append(json.dumps(record))
+        if len(self.pending) >= self.batch:
+            self.flush()
+        elif not self.loop.running:
+            self.loop.start(self.interval, now=False)
+
+    def flush(self):
+        if not self.pending:
+            return None
+        lines, self.pending = self.pending, list()
+        return deferToThread(self.append, lines).addErrback(
+            lambda failure: logger.log_err(f"Could not write command traces to {self.path}: "
+                                           f"{failure.getErrorMessage()}"))
+
+    def append(self, lines):
+        with self.lock, open(self.path, "a") as trace_file:
+            trace_file.write('\n'.join(lines) + '\n')
+
+
+class Tracer:
+
+    def __init__(self, rate=0.0, buffer_size=1000, path=None, interval=5.0):
+        self.rate = rate
+        self.traces = deque(maxlen=buffer_size)
+        self.writer = TraceFileWriter(path, interval=interval) if path else None
+
+    def set_rate(self, rate):
+        if not 0.0 <= rate <= 1.0:
+            raise ValueError("Sample rate must be between 0 and 1.")
+        self.rate = rate
+
+    def sample(self, raw_string):
+        """
+        Decide whether to trace a command.
+
+        Returns:
+            trace (Trace or None)
+        """
+        if random() >= self.rate:
+            return None
+        return Trace(raw_string)
+
+    def finish(self, trace, caller, cmd_path):
+        record = trace.export(caller, cmd_path)
+        self.traces.append(record)
+        if self.writer:
+            self.writer.write(record)
+
+
+TRACER = Tracer(rate=settings.COMMAND_TRACE_RATE, buffer_size=settings.COMMAND_TRACE_BUFFER,
+                path=settings.COMMAND_TRACE_FILE)
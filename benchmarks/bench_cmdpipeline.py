@@ -0,0 +1,181 @@
+"""
+Offline benchmark and replay harness for CmdHandler.execute.
+
+Replays a corpus of input lines through the full command pipeline: cmdset gathering and
+merging, matching, AthanorCommand.parse and switch dispatch, and the command hooks. The
+callers are the stub Session/Account/Puppet from pipeline_stubs.py, and the database is
+in-memory SQLite, so no server or game directory is needed.
+
+It reports throughput, the per-line latency distribution, per-command stage percentiles
+(from the 'command' metrics), and allocation figures from a second, traced pass.
+
+Usage:
+    python benchmarks/bench_cmdpipeline.py [--corpus FILE] [--rounds N] [--aliases N]
+                                           [--json FILE] [--compare FILE] [--tolerance PCT]
+
+With --compare, the run exits non-zero if throughput dropped or p99 latency rose by more
+than --tolerance percent against the saved --json results of an earlier run.
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import tracemalloc
+from time import perf_counter
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+os.environ["DJANGO_SETTINGS_MODULE"] = "bench_settings"
+
+
+def setup_django():
+    """
+    Apply Athanor's settings, start Django and build the in-memory database.
+    """
+    import django
+    from django.conf import settings
+    from django.core.management import call_command
+
+    import athanor
+    athanor.load(settings, [])
+    settings.COMMAND_TIMING_ENABLED = True
+    # 0 disables the slow-command log, which would otherwise flood the output.
+    settings.SLOW_COMMAND_THRESHOLD = 0
+    django.setup()
+    call_command("migrate", run_syncdb=True, verbosity=0, interactive=False)
+
+
+def load_corpus(path):
+    with open(path, "r") as corpus_file:
+        return [line.rstrip("\n") for line in corpus_file if not line.startswith("#")]
+
+
+def percentile(ordered, pct):
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def replay(session, lines, rounds):
+    """
+    Run every line of the corpus through session.cmd.execute, `rounds` times.
+
+    Returns:
+        samples (list): Per-line latencies in seconds.
+        elapsed (float): Total wall time.
+    """
+    samples = list()
+    execute = session.cmd.execute
+    start = perf_counter()
+    for _ in range(rounds):
+        for line in lines:
+            line_start = perf_counter()
+            execute(line, session=session)
+            samples.append(perf_counter() - line_start)
+    return samples, perf_counter() - start
+
+
+def measure_allocations(session, lines, rounds):
+    """
+    Replay again with tracemalloc and gc statistics enabled. This is kept separate
+    from the timed pass because tracing skews timings.
+    """
+    gc.collect()
+    gen0_before = gc.get_stats()[0]["collections"]
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    replay(session, lines, rounds)
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    retained = sum(stat.count_diff for stat in after.compare_to(before, "filename"))
+    return {
+        "peak_traced_kib": peak / 1024.0,
+        "retained_blocks": retained,
+        "gen0_collections": gc.get_stats()[0]["collections"] - gen0_before,
+    }
+
+
+def command_stages():
+    from athanor.utils.metrics import METRICS
+    results = dict()
+    for (cmd_path, stage), histogram in METRICS.histograms.get("command", dict()).items():
+        results.setdefault(cmd_path.rsplit(".", 1)[-1], dict())[stage] = {
+            "count": histogram.count,
+            "p50_ms": histogram.percentile(50) * 1000,
+            "p99_ms": histogram.percentile(99) * 1000,
+        }
+    return results
+
+
+def compare(results, baseline, tolerance):
+    failures = list()
+    throughput_change = (results["lines_per_sec"] - baseline["lines_per_sec"]) / baseline["lines_per_sec"] * 100
+    p99_change = (results["latency_ms"]["p99"] - baseline["latency_ms"]["p99"]) / \
+        max(baseline["latency_ms"]["p99"], 1e-9) * 100
+    print(f"throughput change: {throughput_change:+.1f}%  p99 change: {p99_change:+.1f}%")
+    if throughput_change < -tolerance:
+        failures.append(f"throughput dropped {-throughput_change:.1f}%")
+    if p99_change > tolerance:
+        failures.append(f"p99 latency rose {p99_change:.1f}%")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=os.path.join(BENCH_DIR, "corpus", "default.txt"))
+    parser.add_argument("--rounds", type=int, default=200, help="times the corpus is replayed")
+    parser.add_argument("--aliases", type=int, default=200, help="channel alias commands on the account")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--compare", help="compare against results previously written with --json")
+    parser.add_argument("--tolerance", type=float, default=10.0, help="allowed regression, in percent")
+    args = parser.parse_args()
+
+    setup_django()
+    from pipeline_stubs import build_stack
+    from athanor.utils.metrics import METRICS
+
+    lines = load_corpus(args.corpus)
+    session, account, puppet = build_stack(channel_aliases=args.aliases)
+
+    # warm up caches (merges, tries, imports) so the timed pass sees steady state.
+    replay(session, lines, 1)
+    METRICS.reset("command")
+
+    samples, elapsed = replay(session, lines, args.rounds)
+    ordered = sorted(samples)
+    results = {
+        "corpus": os.path.basename(args.corpus),
+        "lines": len(samples),
+        "lines_per_sec": len(samples) / elapsed,
+        "latency_ms": {pct: percentile(ordered, float(pct[1:])) * 1000 for pct in ("p50", "p90", "p99")},
+        "stages": command_stages(),
+    }
+    results["latency_ms"]["max"] = ordered[-1] * 1000
+    results["allocations"] = measure_allocations(session, lines, max(1, args.rounds // 10))
+
+    print(f"corpus {results['corpus']}: {results['lines']} lines, {results['lines_per_sec']:.0f} lines/sec")
+    print("latency (ms): " + "  ".join(f"{key}={value:.3f}" for key, value in results["latency_ms"].items()))
+    print("allocations: " + "  ".join(f"{key}={value:.0f}" for key, value in results["allocations"].items()))
+    print(f"{'command':<24}{'stage':<10}{'count':>8}{'p50 ms':>10}{'p99 ms':>10}")
+    for command, stages in sorted(results["stages"].items()):
+        for stage, data in stages.items():
+            print(f"{command:<24}{stage:<10}{data['count']:>8}{data['p50_ms']:>10.3f}{data['p99_ms']:>10.3f}")
+
+    if args.json:
+        with open(args.json, "w") as out:
+            json.dump(results, out, indent=2)
+
+    if args.compare:
+        with open(args.compare, "r") as baseline_file:
+            failures = compare(results, json.load(baseline_file), args.tolerance)
+        if failures:
+            print("REGRESSION: " + "; ".join(failures))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
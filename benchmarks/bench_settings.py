@@ -0,0 +1,13 @@
+"""
+Django settings for the offline benchmarks: Evennia's defaults backed by an in-memory
+SQLite database, so no game directory or live server is needed. Athanor's own settings
+are applied on top by the benchmark before django.setup() runs.
+"""
+from evennia.settings_default import *  # noqa: F401,F403
+
+DATABASES = {
+    "default": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": ":memory:",
+    }
+}
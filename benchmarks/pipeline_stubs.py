@@ -0,0 +1,187 @@
+"""
+Stub cmdobjects and commands for replaying input through the command pipeline offline.
+
+StubSession, StubAccount and StubPuppet implement just enough of what CmdHandler uses
+(_cmd_sort, cmd, cmdset, at_cmdset_get, ndb, msg, and what locks look at) to run
+execute() end to end without a server, sessions or typeclassed database objects.
+
+This module must only be imported after django.setup().
+"""
+from types import SimpleNamespace
+
+from evennia.commands.cmdset import CmdSet
+
+from athanor.utils.cmdhandler import CmdHandler
+from athanor.utils.cmdsethandler import AthanorCmdSetHandler
+from athanor.utils.command import AthanorCommand
+
+
+class CmdBenchLook(AthanorCommand):
+    key = "look"
+    aliases = ["l"]
+
+    def switch_main(self):
+        self.msg(f"You look at {self.args or 'nothing in particular'}.")
+
+
+class CmdBenchSay(AthanorCommand):
+    key = "say"
+    aliases = ['"']
+
+    def switch_main(self):
+        self.msg(f'You say, "{self.args}"')
+
+
+class CmdBenchAdmin(AthanorCommand):
+    """
+    Exercises AthanorCommand.parse and switch dispatch.
+    """
+    key = "@bench"
+    args_delim = ","
+    switch_options = ("echo", "stat", "set", "list", "count")
+
+    def switch_main(self):
+        self.msg("Bench main.")
+
+    def switch_echo(self):
+        self.msg(self.args)
+
+    def switch_stat(self):
+        self.msg(f"{self.lhs}: {', '.join(self.rhslist)}")
+
+    def switch_set(self):
+        if not self.rhs:
+            self.syntax_error()
+        self.msg(f"Set {self.lhs} to {self.rhs}")
+
+    def switch_list(self):
+        self.msg('\n'.join(f"Entry {i}" for i in range(20)))
+
+    def switch_count(self):
+        from evennia.accounts.models import AccountDB
+        self.msg(f"Accounts: {AccountDB.objects.count()}")
+
+
+class CmdBenchChannel(AthanorCommand):
+    """
+    Stands in for the per-subscription channel alias commands.
+    """
+    switch_options = ("who", "leave", "title", "mute", "on", "off")
+
+    def switch_main(self):
+        self.msg(f"<{self.key}> {self.args}")
+
+
+class BenchSessionCmdSet(CmdSet):
+    key = "BenchSessionCmdSet"
+    priority = -20
+
+    def at_cmdset_creation(self):
+        self.add(CmdBenchLook)
+
+
+class BenchAccountCmdSet(CmdSet):
+    key = "BenchAccountCmdSet"
+    priority = -10
+
+    def at_cmdset_creation(self):
+        self.add(CmdBenchAdmin)
+
+
+class BenchPuppetCmdSet(CmdSet):
+    key = "BenchPuppetCmdSet"
+    priority = 0
+
+    def at_cmdset_creation(self):
+        self.add(CmdBenchLook)
+        self.add(CmdBenchSay)
+
+
+class BenchChannelCmdSet(CmdSet):
+    key = "ChannelCmdSet"
+    priority = 101
+    duplicates = True
+    aliases = 200
+
+    def at_cmdset_creation(self):
+        for num in range(1, self.aliases + 1):
+            self.add(CmdBenchChannel(key=f"chan{num:03d}", locks="cmd:all();listen:all()"))
+
+
+class StubCmdHandler(CmdHandler):
+
+    def get_cmdobjects(self, session=None):
+        return self.cmdobj.cmdobjects
+
+
+class StubCmdObject:
+    """
+    Base for the stubs. Output is counted rather than kept, so long replays stay flat
+    in memory.
+    """
+    _cmd_sort = 0
+    cmdset_classes = ()
+    is_superuser = False
+
+    def __init__(self, key):
+        self.key = key
+        self.ndb = SimpleNamespace()
+        self.cmdset_storage = list()
+        self.cmdobjects = dict()
+        self.account = None
+        self.received = 0
+        self.last_output = None
+        self.cmdset = AthanorCmdSetHandler(self, True)
+        for num, cmdset_class in enumerate(self.cmdset_classes):
+            if num:
+                self.cmdset.add(cmdset_class)
+            else:
+                self.cmdset.add_default(cmdset_class)
+        self.cmd = StubCmdHandler(self)
+
+    def __str__(self):
+        return self.key
+
+    def at_cmdset_get(self, **kwargs):
+        pass
+
+    def get_account(self):
+        return self.account
+
+    def msg(self, text=None, **kwargs):
+        self.received += 1
+        self.last_output = text
+
+
+class StubSession(StubCmdObject):
+    _cmd_sort = -1000
+    cmdset_classes = (BenchSessionCmdSet,)
+
+
+class StubAccount(StubCmdObject):
+    _cmd_sort = -1100
+    cmdset_classes = (BenchAccountCmdSet, BenchChannelCmdSet)
+
+
+class StubPuppet(StubCmdObject):
+    _cmd_sort = 0
+    cmdset_classes = (BenchPuppetCmdSet,)
+
+
+def build_stack(channel_aliases=200):
+    """
+    Create a linked Session, Account and Puppet.
+
+    Args:
+        channel_aliases (int): How many channel alias commands the Account carries.
+
+    Returns:
+        session, account, puppet
+    """
+    BenchChannelCmdSet.aliases = channel_aliases
+    session, account, puppet = StubSession("BenchSession"), StubAccount("BenchAccount"), StubPuppet("BenchPuppet")
+    cmdobjects = {'session': session, 'account': account, 'puppet': puppet}
+    for obj in cmdobjects.values():
+        obj.account = account
+        obj.cmdobjects = cmdobjects
+    return session, account, puppet